@@ -0,0 +1,24 @@
+import hashlib
+from calendar import timegm
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+def make_etag(*parts):
+    """Strong ETag over the given version parts (timestamps, ids, cache versions)."""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def not_modified_response(request, etag, last_modified):
+    """
+    Return a 304 (or 412) response if the request's If-None-Match /
+    If-Modified-Since validators still match, otherwise None.
+    """
+    return get_conditional_response(request, etag=etag, last_modified=timegm(last_modified.utctimetuple()))
+
+
+def set_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(timegm(last_modified.utctimetuple()))
+    return response
@@ -0,0 +1,43 @@
+from functools import cached_property
+
+
+class Principal:
+    """
+    The authenticated user of one request, with role lookups done at most once.
+
+    The user itself comes from the authentication class; the Owner profile is
+    only queried if a view asks for it, then reused for the rest of the request.
+    """
+
+    def __init__(self, user):
+        self.user = user
+
+    @property
+    def id(self):
+        return self.user.pk
+
+    @property
+    def is_customer(self):
+        return self.user.user_type == 'customer'
+
+    @property
+    def is_car_owner(self):
+        return self.user.user_type == 'car_owner'
+
+    @property
+    def is_staff_member(self):
+        return self.user.user_type == 'staff'
+
+    @cached_property
+    def owner(self):
+        from fleet_management.models import Owner
+        return Owner.objects.filter(user_id=self.user.pk).order_by('pk').first()
+
+
+def get_principal(request):
+    """The Principal for request.user, created once per HTTP request."""
+    http_request = getattr(request, '_request', request)
+    principal = getattr(http_request, '_principal', None)
+    if principal is None or principal.user is not request.user:
+        principal = http_request._principal = Principal(request.user)
+    return principal
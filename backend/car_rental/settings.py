@@ -92,6 +92,20 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# Use a shared backend (Redis/Memcached) in production so catalogue version bumps reach every worker
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CATALOGUE_CACHE_TTL = 60  # Seconds a cached car list/detail response is fresh
+CATALOGUE_CACHE_STALE_TTL = 300  # Seconds a stale response may be served while one request refreshes it
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -160,20 +174,81 @@ PAYMENT_METHOD_CHOICES = [
     ('cash', 'Cash')
 ]
 
+# Payments run on a per-process thread pool after the request returns 202, see payment.worker
+PAYMENT_ASYNC = True  # False runs them in the request thread once it commits
+PAYMENT_WORKER_THREADS = 8
+PAYMENT_STATUS_MAX_WAIT = 25  # Longest ?wait= a status request may long-poll for, in seconds
+
+# Local stand-in provider for load testing, offered as the 'fake' method only while load_test_payments
+# overrides this with its {'latency': seconds, 'failure_rate': 0..1} options
+PAYMENT_FAKE_PROVIDER = None
+
 # Stripe Configuration
 STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
 STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
+STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')  # The endpoint's whsec_... signing secret
 # PayPal Configuration
 PAYPAL_BASE_URL = 'https://api-m.sandbox.paypal.com'  # Use 'https://api.paypal.com' for live
 PAYPAL_CLIENT_ID = os.environ.get('PAYPAL_CLIENT_ID')
 PAYPAL_SECRET = os.environ.get('PAYPAL_SECRET')
+PAYPAL_WEBHOOK_ID = os.environ.get('PAYPAL_WEBHOOK_ID')  # Id of the webhook registered in the PayPal app
 PAYPAL_MODE = os.environ.get('PAYPAL_MODE')  # 'sandbox' for testing, 'live' for production
 PAYPAL_RETURN_URL = 'http://example.com/api/payments/paypal-return/'
 PAYPAL_CANCEL_URL = 'http://example.com/api/payments/paypal-cancel/'
 
+# Pooled HTTP client shared by the payment provider services, see payment.services.http_client
+PAYMENT_HTTP = {
+    'pool_size': 10,  # Kept-alive connections per provider host
+    'connect_timeout': 3.05,
+    'read_timeout': 30,
+    'retries': 2,  # Only for calls that are safe to repeat, e.g. carrying PayPal-Request-Id
+    'backoff': 0.5,  # Seconds; retries sleep a random time up to backoff * 2 ** attempt
+    'max_backoff': 5,
+}
+
+# Nightly check of payments against their providers, see payment.reconciliation and reconcile_payments
+RECONCILIATION = {
+    'lookback_hours': 48,  # Settled payments updated this recently are checked too
+    'threads': 10,  # Concurrent lookups; more than PAYMENT_HTTP's pool_size would open throwaway connections
+    'chunk_size': 1000,  # Payments read, looked up and corrected together
+    'rates': {'stripe': 50, 'paypal': 20},  # Lookups per second, kept under each provider's rate limit
+}
+
+# OAuth access tokens are cached in the default cache, see payment.services.token_provider
+OAUTH_TOKEN_EXPIRY_MARGIN = 60  # Seconds before expiry a token stops being used
+OAUTH_TOKEN_REFRESH_AHEAD = 300  # Seconds before that a background refresh starts
+
+
+# Booking price calculation, see overdrive.pricing.PricingPolicy
+BOOKING_PRICING = {
+    'billing_increment_minutes': None,  # Round durations up to this many minutes, None bills to the second
+    'minimum_hours': None,
+    'daily_cap_hours': None,  # Charge at most this many hours per 24 hour block
+}
+
+# Process-local interval index of active bookings, see overdrive.occupancy
+BOOKING_OCCUPANCY_INDEX = False
+BOOKING_OCCUPANCY_MAX_VEHICLES = 10000
+BOOKING_OCCUPANCY_TTL = 300  # Seconds before a vehicle is reloaded to pick up other processes' writes
+
+# Idempotency-Key handling for booking creation and payments, see overdrive.idempotency
+IDEMPOTENCY_KEY_TTL = 86400  # Seconds a stored response is replayed; purge_idempotency_keys removes older keys
+IDEMPOTENCY_WAIT = 10  # Seconds a duplicate waits for the first request with its key to finish
+IDEMPOTENCY_CLAIM_LEASE = 60  # Seconds after which an unfinished claim is presumed dead and a retry takes it over
+
+# Provider webhooks, see payment.webhooks
+WEBHOOK_TOLERANCE = 300  # Seconds a Stripe signature timestamp may be off, against replayed deliveries
+WEBHOOK_EVENT_RETENTION = 30 * 86400  # Seconds processed events are kept to recognise redeliveries
+
+# Requested bookings the owner has not answered are canceled by expire_booking_requests, see overdrive.expiry
+BOOKING_REQUEST_TTL = 172800  # Seconds after creation; None only expires requests whose start_time has passed
+
+# archive_bookings moves returned and canceled bookings older than this to the archive tables, see overdrive.archive
+BOOKING_ARCHIVE_AFTER_DAYS = 365
 
 MEDIA_URL = '/media/' # URL that will serve the media files
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') # The directory where media files will be stored
+THUMBNAIL_WORKERS = 2  # Background threads rendering Vehicle.image variants
 
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'smtp.mail.com'
@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin for pinning the number of queries an endpoint may run.
+
+    Unlike assertNumQueries, the budget is an upper bound, and
+    assertConstantQueries checks that the count does not grow with the
+    number of rows rendered (the usual symptom of an N+1).
+    """
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        executed = len(context.captured_queries)
+        if executed > budget:
+            queries = '\n'.join(f"{i}. {query['sql']}" for i, query in enumerate(context.captured_queries, start=1))
+            self.fail(f"{executed} queries executed, budget is {budget}:\n{queries}")
+
+    def count_queries(self, func, *args, **kwargs):
+        with CaptureQueriesContext(connection) as context:
+            func(*args, **kwargs)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, func, grow):
+        """Run func, call grow() to add more rows, and require the same query count."""
+        before = self.count_queries(func)
+        grow()
+        after = self.count_queries(func)
+        self.assertEqual(before, after, f"Query count grew from {before} to {after} as rows were added")
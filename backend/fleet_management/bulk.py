@@ -0,0 +1,46 @@
+from django.db import connection
+from .models import Car, Vehicle
+
+
+def bulk_create_cars(cars):
+    """
+    Insert unsaved Car instances with two multi-row statements.
+
+    QuerySet.bulk_create() refuses multi-table models, so the parent Vehicle
+    rows are bulk created first (reading their ids back with RETURNING) and
+    the Car rows are then written with a single executemany. Like
+    bulk_create(), this skips save() and the post_save signals; callers are
+    responsible for the derived spatial fields and cache invalidation.
+    Databases that cannot return ids from a bulk insert (e.g. MySQL) get
+    one INSERT per Vehicle instead, which does send Vehicle's post_save.
+    Must be called inside a transaction.
+    """
+    if not cars:
+        return cars
+
+    parent_fields = [field for field in Vehicle._meta.concrete_fields if not field.primary_key]
+    vehicles = [Vehicle(**{field.attname: getattr(car, field.attname) for field in parent_fields}) for car in cars]
+    if connection.features.can_return_rows_from_bulk_insert:
+        Vehicle.objects.bulk_create(vehicles)
+    else:
+        for vehicle in vehicles:
+            vehicle.save(force_insert=True)
+
+    for car, vehicle in zip(cars, vehicles):
+        for field in parent_fields:
+            setattr(car, field.attname, getattr(vehicle, field.attname))
+        car.id = car.vehicle_ptr_id = vehicle.pk
+        car._state.adding = False
+        car._state.db = vehicle._state.db
+
+    local_fields = Car._meta.local_concrete_fields
+    table = connection.ops.quote_name(Car._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in local_fields)
+    placeholders = ', '.join(['%s'] * len(local_fields))
+    rows = [
+        [field.get_db_prep_save(getattr(car, field.attname), connection) for field in local_fields]
+        for car in cars
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+    return cars
@@ -0,0 +1,91 @@
+import hashlib
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+
+CATALOGUE_VERSION_KEY = 'catalogue:version'
+VEHICLE_VERSION_KEY = 'catalogue:vehicle:{}:version'
+
+FRESH_TTL = getattr(settings, 'CATALOGUE_CACHE_TTL', 60)
+STALE_TTL = getattr(settings, 'CATALOGUE_CACHE_STALE_TTL', 300)
+LOCK_TTL = 10
+WAIT_TIMEOUT = 2.0
+WAIT_INTERVAL = 0.05
+
+
+def _new_version():
+    return uuid.uuid4().hex
+
+
+def _get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # add() keeps concurrent first readers from minting different versions
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def get_catalogue_version():
+    return _get_version(CATALOGUE_VERSION_KEY)
+
+
+def get_vehicle_version(vehicle_id):
+    return _get_version(VEHICLE_VERSION_KEY.format(vehicle_id))
+
+
+def bump_catalogue_version():
+    cache.set(CATALOGUE_VERSION_KEY, _new_version(), None)
+
+
+def bump_vehicle_versions(vehicle_ids):
+    cache.set_many({VEHICLE_VERSION_KEY.format(vehicle_id): _new_version() for vehicle_id in vehicle_ids}, None)
+
+
+def response_cache_key(prefix, request, *versions):
+    # Serialized payloads embed absolute image URLs, so the host and query are part of the key
+    uri = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return ':'.join(['catalogue', prefix, *versions, uri])
+
+
+def _store(key, data):
+    cache.set(key, (time.time() + FRESH_TTL, data), FRESH_TTL + STALE_TTL)
+    return data
+
+
+def _rebuild(key, lock_key, build):
+    try:
+        return _store(key, build())
+    finally:
+        cache.delete(lock_key)
+
+
+def cached_response_data(key, build):
+    """
+    Return cached response data for key, calling build() to produce it.
+
+    Entries stay servable for STALE_TTL after they go stale. Only the request
+    that wins the refresh lock rebuilds; everyone else keeps getting the stale
+    copy, or on a cold key waits briefly for the winner instead of piling onto
+    the database.
+    """
+    lock_key = f'{key}:lock'
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, data = entry
+        if time.time() < fresh_until or not cache.add(lock_key, 1, LOCK_TTL):
+            return data
+        return _rebuild(key, lock_key, build)
+
+    if cache.add(lock_key, 1, LOCK_TTL):
+        return _rebuild(key, lock_key, build)
+
+    deadline = time.time() + WAIT_TIMEOUT
+    while time.time() < deadline:
+        time.sleep(WAIT_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+    # The winner is taking too long; build our own copy rather than fail the request
+    return _store(key, build())
@@ -0,0 +1,65 @@
+from django.db.models import CharField, Count, Value
+from django.db.models.functions import Cast
+from rest_framework import serializers
+from .models import Car
+
+# Facet name -> model field it groups on
+FACET_FIELDS = {
+    'fuel_type': 'fuel_type',
+    'passenger_capacity': 'passenger_capacity',
+    'year': 'year',
+    'make': 'make_id',
+    'owner': 'owner_id',
+}
+
+
+class CarFilterSerializer(serializers.Serializer):
+    price_min = serializers.DecimalField(max_digits=6, decimal_places=2, required=False, min_value=0)
+    price_max = serializers.DecimalField(max_digits=6, decimal_places=2, required=False, min_value=0)
+    passenger_capacity = serializers.IntegerField(required=False, min_value=1)
+    fuel_type = serializers.ChoiceField(choices=Car._meta.get_field('fuel_type').choices, required=False)
+    year = serializers.IntegerField(required=False)
+    make = serializers.IntegerField(required=False)
+    owner = serializers.IntegerField(required=False)
+
+    def validate(self, data):
+        if 'price_min' in data and 'price_max' in data and data['price_min'] > data['price_max']:
+            raise serializers.ValidationError("price_min cannot be greater than price_max")
+        return data
+
+
+def apply_filters(queryset, filters, exclude=None):
+    """Filter a Car queryset by validated CarFilterSerializer data, optionally skipping one facet."""
+    if 'price_min' in filters:
+        queryset = queryset.filter(price_per_hour__gte=filters['price_min'])
+    if 'price_max' in filters:
+        queryset = queryset.filter(price_per_hour__lte=filters['price_max'])
+    lookups = {
+        FACET_FIELDS[name]: filters[name]
+        for name in FACET_FIELDS
+        if name in filters and name != exclude
+    }
+    return queryset.filter(**lookups)
+
+
+def facet_counts(queryset, filters):
+    """
+    Count cars per value of every facet in one round trip.
+
+    Each facet is counted with every other active filter applied but not its
+    own, so the client can still see the alternatives to what it selected.
+    The per-facet GROUP BYs are sent as a single UNION ALL statement.
+    """
+    grouped = [
+        apply_filters(queryset, filters, exclude=name)
+        .order_by()
+        .annotate(facet=Value(name, output_field=CharField()), value=Cast(field, CharField()))
+        .values('facet', 'value')
+        .annotate(count=Count('pk'))
+        for name, field in FACET_FIELDS.items()
+    ]
+    facets = {name: {} for name in FACET_FIELDS}
+    for row in grouped[0].union(*grouped[1:], all=True):
+        if row['value'] is not None:
+            facets[row['facet']][row['value']] = row['count']
+    return facets
@@ -0,0 +1,105 @@
+import json
+import math
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+
+def parse_location(location):
+    """Return the location as a Python object, decoding JSON stored as text."""
+    if isinstance(location, str):
+        try:
+            return json.loads(location)
+        except ValueError:
+            return None
+    return location
+
+
+def extract_coordinates(location):
+    """Collect every (lat, lon) pair found in a GeoJSON object or a {lat, lng} dict."""
+    location = parse_location(location)
+    points = []
+
+    def walk(node):
+        if isinstance(node, dict):
+            lat = node.get('lat', node.get('latitude'))
+            lon = node.get('lng', node.get('lon', node.get('longitude')))
+            if lat is not None and lon is not None:
+                points.append((float(lat), float(lon)))
+                return
+            if node.get('type') == 'FeatureCollection':
+                for feature in node.get('features') or []:
+                    walk(feature)
+            elif node.get('type') == 'Feature':
+                walk(node.get('geometry'))
+            elif node.get('type') == 'GeometryCollection':
+                for geometry in node.get('geometries') or []:
+                    walk(geometry)
+            elif 'coordinates' in node:
+                walk_positions(node['coordinates'])
+
+    def walk_positions(positions):
+        # GeoJSON positions are [lon, lat], nested to any depth by geometry type
+        if not isinstance(positions, (list, tuple)) or not positions:
+            return
+        if isinstance(positions[0], (int, float)):
+            if len(positions) >= 2:
+                points.append((float(positions[1]), float(positions[0])))
+            return
+        for position in positions:
+            walk_positions(position)
+
+    try:
+        walk(location)
+    except (TypeError, ValueError):
+        return []
+    return [(lat, lon) for lat, lon in points if -90 <= lat <= 90 and -180 <= lon <= 180]
+
+
+def spatial_fields(location):
+    """Derive the indexed centroid and bounding box columns for a Vehicle location."""
+    points = extract_coordinates(location)
+    if not points:
+        return {
+            'centroid_lat': None, 'centroid_lon': None,
+            'bbox_min_lat': None, 'bbox_min_lon': None,
+            'bbox_max_lat': None, 'bbox_max_lon': None,
+        }
+    lats = [lat for lat, _ in points]
+    lons = [lon for _, lon in points]
+    min_lat, max_lat = min(lats), max(lats)
+    min_lon, max_lon = min(lons), max(lons)
+    return {
+        'centroid_lat': (min_lat + max_lat) / 2,
+        'centroid_lon': (min_lon + max_lon) / 2,
+        'bbox_min_lat': min_lat, 'bbox_min_lon': min_lon,
+        'bbox_max_lat': max_lat, 'bbox_max_lon': max_lon,
+    }
+
+
+def radius_bounds(lat, lon, radius_km):
+    """
+    Return (min_lat, max_lat, lon_ranges) enclosing a circle of radius_km.
+    lon_ranges holds two ranges when the box wraps across the antimeridian.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    cos_lat = math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if cos_lat <= 0 or radius_km / (KM_PER_DEGREE_LAT * cos_lat) >= 180:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+    min_lon, max_lon = lon - dlon, lon + dlon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
@@ -0,0 +1,215 @@
+import csv
+import json
+from django.db import IntegrityError, transaction
+from rest_framework import serializers
+from .bulk import bulk_create_cars
+from .cache import bump_catalogue_version
+from .geo import parse_location
+from .models import Car, Manufacturer, Owner, current_year
+
+MAX_REPORTED_ERRORS = 1000
+FORMATS = ('csv', 'ndjson')
+
+
+class CarImportRowSerializer(serializers.Serializer):
+    # Uniqueness and foreign keys are checked per batch by CarImporter, not per row
+    license_plate = serializers.CharField(max_length=20)
+    name = serializers.CharField(max_length=100, required=False, default='', allow_blank=True)
+    passenger_capacity = serializers.IntegerField(min_value=1, max_value=32767)
+    make = serializers.CharField(max_length=100, required=False, help_text="Manufacturer name")
+    make_id = serializers.IntegerField(required=False)
+    owner_id = serializers.IntegerField(required=False)
+    model = serializers.CharField(max_length=100)
+    year = serializers.IntegerField(min_value=1978, max_value=current_year)
+    fuel_type = serializers.ChoiceField(choices=Car._meta.get_field('fuel_type').choices)
+    price_per_hour = serializers.DecimalField(max_digits=6, decimal_places=2)
+    is_available = serializers.BooleanField(required=False, default=True)
+    location = serializers.JSONField(required=False, allow_null=True)
+
+    def validate_price_per_hour(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("Price per hour must be greater than 0")
+        return value
+
+    def validate_location(self, value):
+        # CSV cells carry GeoJSON as text; plain place names are kept as they are
+        parsed = parse_location(value)
+        return value if parsed is None else parsed
+
+    def validate(self, data):
+        if 'make' not in data and 'make_id' not in data:
+            raise serializers.ValidationError("Either make or make_id is required")
+        return data
+
+
+def iter_records(stream, file_format):
+    """
+    Yield (row_number, record) pairs from a binary CSV or NDJSON stream, one line at a time.
+
+    A record that cannot be parsed is yielded as its exception. Bytes that
+    are not UTF-8, or CSV the csv module rejects, end the stream with one such
+    record, since nothing after them can be read reliably.
+    """
+    text = _decoded_lines(stream)
+    if file_format == 'csv':
+        reader = csv.DictReader(text)
+        try:
+            for record in reader:
+                # Empty cells mean "not provided" so serializer defaults apply
+                yield reader.line_num, {key: value for key, value in record.items() if key and value not in ('', None)}
+        except (UnicodeDecodeError, csv.Error) as e:
+            yield reader.line_num + 1, e
+    elif file_format == 'ndjson':
+        row_number = 0
+        try:
+            for row_number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as e:
+                    record = e
+                yield row_number, record
+        except UnicodeDecodeError as e:
+            yield row_number + 1, e
+    else:
+        raise ValueError(f"Unsupported format {file_format!r}, expected one of {', '.join(FORMATS)}")
+
+
+def _decoded_lines(stream):
+    # Decoded line by line rather than in TextIOWrapper's chunks, so rows before bad bytes still import
+    for line_number, line in enumerate(stream):
+        yield line.decode('utf-8-sig' if line_number == 0 else 'utf-8')
+
+
+class CarImporter:
+    """
+    Import cars from an iterable of records in fixed-size batches.
+
+    Memory stays bounded by the batch size: each batch is validated, its
+    manufacturers/owners/plates are resolved with one query each, and the
+    valid rows are written with bulk_create_cars() in their own transaction.
+    Only the first MAX_REPORTED_ERRORS row errors are kept.
+    """
+
+    def __init__(self, owner=None, batch_size=500):
+        self.owner = owner
+        self.batch_size = batch_size
+        self.makes_by_name = {}
+        self.makes_by_id = {}
+        self.owners_by_id = {owner.pk: owner} if owner else {}
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def run(self, records):
+        batch = []
+        for row_number, record in records:
+            batch.append((row_number, record))
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+        if batch:
+            self.import_batch(batch)
+        return self.summary()
+
+    def summary(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors),
+        }
+
+    def add_error(self, row_number, errors):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'errors': errors})
+
+    def import_batch(self, batch):
+        valid = []
+        for row_number, record in batch:
+            if not isinstance(record, dict):
+                self.add_error(row_number, {'non_field_errors': [f"Invalid record: {record}"]})
+                continue
+            serializer = CarImportRowSerializer(data=record)
+            if serializer.is_valid():
+                valid.append((row_number, serializer.validated_data))
+            else:
+                self.add_error(row_number, serializer.errors)
+
+        self.load_lookups([data for _, data in valid])
+        existing_plates = set(Car.objects.filter(
+            license_plate__in=[data['license_plate'] for _, data in valid]
+        ).values_list('license_plate', flat=True))
+
+        cars = []
+        for row_number, data in valid:
+            car, errors = self.build_car(data, existing_plates)
+            if errors:
+                self.add_error(row_number, errors)
+            else:
+                existing_plates.add(car.license_plate)
+                cars.append((row_number, car))
+        self.write(cars)
+
+    def load_lookups(self, rows):
+        names = {data['make'] for data in rows if 'make' in data} - set(self.makes_by_name)
+        make_ids = {data['make_id'] for data in rows if 'make_id' in data} - set(self.makes_by_id)
+        if names or make_ids:
+            for make in Manufacturer.objects.filter(name__in=names) | Manufacturer.objects.filter(pk__in=make_ids):
+                self.makes_by_name.setdefault(make.name, make)
+                self.makes_by_id[make.pk] = make
+        if self.owner is None:
+            owner_ids = {data['owner_id'] for data in rows if 'owner_id' in data} - set(self.owners_by_id)
+            if owner_ids:
+                self.owners_by_id.update(Owner.objects.in_bulk(owner_ids))
+
+    def build_car(self, data, existing_plates):
+        errors = {}
+        make = self.makes_by_id.get(data['make_id']) if 'make_id' in data else self.makes_by_name.get(data['make'])
+        if make is None:
+            errors['make'] = ["Unknown manufacturer"]
+        owner = self.owner
+        if owner is None:
+            owner = self.owners_by_id.get(data.get('owner_id'))
+            if owner is None:
+                errors['owner_id'] = ["Unknown owner" if 'owner_id' in data else "This field is required."]
+        if data['license_plate'] in existing_plates:
+            errors['license_plate'] = ["car with this license plate already exists."]
+        if errors:
+            return None, errors
+
+        car = Car(
+            license_plate=data['license_plate'],
+            name=data['name'] or owner.name,
+            owner=owner,
+            passenger_capacity=data['passenger_capacity'],
+            make=make,
+            model=data['model'],
+            year=data['year'],
+            fuel_type=data['fuel_type'],
+            price_per_hour=data['price_per_hour'],
+            is_available=data['is_available'],
+            location=data.get('location'),
+        )
+        car.update_spatial_fields()
+        return car, None
+
+    def write(self, cars):
+        if not cars:
+            return
+        try:
+            with transaction.atomic():
+                bulk_create_cars([car for _, car in cars])
+            self.created += len(cars)
+        except IntegrityError:
+            # A concurrent writer took one of the plates; isolate the offending rows
+            for row_number, car in cars:
+                try:
+                    with transaction.atomic():
+                        bulk_create_cars([car])
+                    self.created += 1
+                except IntegrityError as e:
+                    self.add_error(row_number, {'non_field_errors': [str(e)]})
+        bump_catalogue_version()
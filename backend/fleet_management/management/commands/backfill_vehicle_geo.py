@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from fleet_management.geo import parse_location, spatial_fields
+from fleet_management.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = 'Populate the indexed centroid and bounding box columns from Vehicle.location'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows written per transaction')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fields = ['location'] + Vehicle.SPATIAL_FIELDS
+        vehicles = Vehicle.objects.only('id', *fields).order_by('pk')
+
+        batch = []
+        updated = 0
+        for vehicle in vehicles.iterator(chunk_size=batch_size):
+            # Older rows may hold GeoJSON as a JSON-encoded string; store it as an object
+            if isinstance(vehicle.location, str):
+                parsed = parse_location(vehicle.location)
+                if parsed is not None:
+                    vehicle.location = parsed
+            for field, value in spatial_fields(vehicle.location).items():
+                setattr(vehicle, field, value)
+            batch.append(vehicle)
+            if len(batch) >= batch_size:
+                updated += self.flush(batch, fields)
+        updated += self.flush(batch, fields)
+
+        self.stdout.write(self.style.SUCCESS(f'Backfilled spatial columns for {updated} vehicles.'))
+
+    def flush(self, batch, fields):
+        count = len(batch)
+        if count:
+            with transaction.atomic():
+                Vehicle.objects.bulk_update(batch, fields)
+            batch.clear()
+        return count
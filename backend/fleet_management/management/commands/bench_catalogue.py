@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIRequestFactory
+from fleet_management.bulk import bulk_create_cars
+from fleet_management.models import Car, Manufacturer, Owner
+from fleet_management.views import CarListAPI
+
+
+class Command(BaseCommand):
+    help = 'Seed cars and report p50/p95 latency of filtered, faceted catalogue requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Insert benchmark cars first')
+        parser.add_argument('--cars', type=int, default=200000)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            if not settings.DEBUG:
+                self.stdout.write(self.style.ERROR('Seeding can only be run in DEBUG mode.'))
+                return
+            self.seed(options['cars'], options['batch_size'])
+
+        make_ids = list(Manufacturer.objects.values_list('id', flat=True))
+        owner_ids = list(Owner.objects.values_list('id', flat=True))
+        if not make_ids or not owner_ids:
+            self.stdout.write(self.style.ERROR('No catalogue data found, run with --seed first.'))
+            return
+
+        rng = random.Random(42)
+        factory = APIRequestFactory()
+        view = CarListAPI.as_view()
+        timings = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for _ in range(options['requests']):
+                params = self.random_filters(rng, make_ids, owner_ids)
+                # Measure the database path, not the response cache
+                cache.clear()
+                began = time.perf_counter()
+                response = view(factory.get('/api/cars/', params))
+                response.render()
+                timings.append(time.perf_counter() - began)
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{len(timings)} requests over {Car.objects.count()} cars: '
+            f'p50 {statistics.median(timings) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms, '
+            f'max {timings[-1] * 1000:.1f} ms'
+        )
+
+    def random_filters(self, rng, make_ids, owner_ids):
+        params = {}
+        if rng.random() < 0.5:
+            low = rng.randint(50, 400)
+            params.update(price_min=low, price_max=low + rng.randint(50, 400))
+        if rng.random() < 0.4:
+            params['fuel_type'] = rng.choice(['gasoline', 'diesel', 'electric'])
+        if rng.random() < 0.4:
+            params['passenger_capacity'] = rng.choice([2, 4, 5, 7, 8])
+        if rng.random() < 0.3:
+            params['year'] = rng.randint(2005, 2024)
+        if rng.random() < 0.3:
+            params['make'] = rng.choice(make_ids)
+        if rng.random() < 0.1:
+            params['owner'] = rng.choice(owner_ids)
+        return params
+
+    def seed(self, car_count, batch_size):
+        rng = random.Random(7)
+        makes = Manufacturer.objects.bulk_create(
+            [Manufacturer(name=f'Bench Make {i}', country='Philippines') for i in range(40)]
+        )
+        owners = Owner.objects.bulk_create([Owner(name=f'Bench Owner {i}') for i in range(2000)])
+
+        created = 0
+        while created < car_count:
+            size = min(batch_size, car_count - created)
+            with transaction.atomic():
+                bulk_create_cars([
+                    Car(
+                        name=f'Bench {created + i}',
+                        owner=rng.choice(owners),
+                        passenger_capacity=rng.choice([2, 4, 5, 7, 8]),
+                        price_per_hour=rng.randint(50, 900),
+                        is_available=rng.random() < 0.9,
+                        license_plate=f'BENCH{created + i:08d}',
+                        make=rng.choice(makes),
+                        model='Bench',
+                        year=rng.randint(2005, 2024),
+                        fuel_type=rng.choice(['gasoline', 'diesel', 'electric']),
+                    )
+                    for i in range(size)
+                ])
+            created += size
+        with connection.cursor() as cursor:
+            if connection.vendor in ('sqlite', 'postgresql'):
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f'Seeded {created} cars.'))
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+import os
+import django
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from fleet_management.cache import bump_catalogue_version, bump_vehicle_versions
+from fleet_management.models import Vehicle
+from fleet_management.thumbnails import generate_variants, variants_outdated
+
+
+def _render(source_name):
+    # Runs in a worker process: report failures instead of aborting the whole pool
+    try:
+        return source_name, generate_variants(source_name), None
+    except Exception as e:
+        return source_name, None, str(e)
+
+
+class Command(BaseCommand):
+    help = 'Generate resized image variants for vehicles that are missing them, using a process pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=200, help='Images rendered between database writes')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that are already up to date')
+
+    def handle(self, *args, **options):
+        vehicles = Vehicle.objects.exclude(image='').exclude(image__isnull=True).only('id', 'image', 'image_variants')
+        batch = []
+        done = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=django.setup) as pool:
+            for vehicle in vehicles.order_by('pk').iterator(chunk_size=options['batch_size']):
+                if options['force'] or variants_outdated(vehicle):
+                    batch.append((vehicle.pk, vehicle.image.name))
+                if len(batch) >= options['batch_size']:
+                    ok, errors = self.render_batch(pool, batch)
+                    done, failed = done + ok, failed + errors
+                    batch = []
+            if batch:
+                ok, errors = self.render_batch(pool, batch)
+                done, failed = done + ok, failed + errors
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} vehicles ({failed} failed).'))
+
+    def render_batch(self, pool, batch):
+        results = {}
+        failed = 0
+        for source_name, variants, error in pool.map(_render, [name for _, name in batch]):
+            if error:
+                failed += 1
+                self.stderr.write(f'{source_name}: {error}')
+            else:
+                results[source_name] = variants
+
+        updated = []
+        with transaction.atomic():
+            for vehicle_id, source_name in batch:
+                if source_name in results and Vehicle.objects.filter(pk=vehicle_id, image=source_name).update(
+                        image_variants=results[source_name]):
+                    updated.append(vehicle_id)
+        if updated:
+            bump_vehicle_versions(updated)
+            bump_catalogue_version()
+        return len(updated), failed
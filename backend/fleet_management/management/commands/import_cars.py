@@ -0,0 +1,37 @@
+import json
+import os
+from django.core.management.base import BaseCommand, CommandError
+from fleet_management.importer import CarImporter, FORMATS, iter_records
+from fleet_management.models import Owner
+
+
+class Command(BaseCommand):
+    help = 'Stream cars from a CSV or NDJSON file into the catalogue in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--owner', type=int, help='Owner id for every row; otherwise rows need an owner_id column')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            raise CommandError(f"Cannot infer the format of {path}, pass --format")
+
+        owner = None
+        if options['owner'] is not None:
+            owner = Owner.objects.filter(pk=options['owner']).first()
+            if owner is None:
+                raise CommandError(f"Owner {options['owner']} does not exist")
+
+        importer = CarImporter(owner=owner, batch_size=options['batch_size'])
+        with open(path, 'rb') as stream:
+            summary = importer.run(iter_records(stream, file_format))
+
+        for error in summary['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        if summary['errors_truncated']:
+            self.stderr.write(f"... only the first {len(summary['errors'])} errors are shown")
+        self.stdout.write(self.style.SUCCESS(f"Imported {summary['created']} cars, {summary['failed']} rows failed."))
@@ -3,6 +3,7 @@ from django.contrib.auth import get_user_model
 from django.core.validators import MinValueValidator, MaxValueValidator
 import datetime
 from django.utils import timezone
+from .geo import spatial_fields
 
 User = get_user_model()
 current_year = datetime.datetime.now().year
@@ -31,10 +32,43 @@ class Vehicle(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     location = models.JSONField(blank=True, null=True)
     image = models.ImageField(upload_to='cars/', blank=True, null=True, help_text="Image of vehicle")
+    # Storage names of the resized renditions of image, filled in by fleet_management.thumbnails
+    image_variants = models.JSONField(blank=True, null=True, editable=False)
+
+    # Derived from location on save so proximity searches can use an index
+    centroid_lat = models.FloatField(blank=True, null=True, editable=False)
+    centroid_lon = models.FloatField(blank=True, null=True, editable=False)
+    bbox_min_lat = models.FloatField(blank=True, null=True, editable=False)
+    bbox_min_lon = models.FloatField(blank=True, null=True, editable=False)
+    bbox_max_lat = models.FloatField(blank=True, null=True, editable=False)
+    bbox_max_lon = models.FloatField(blank=True, null=True, editable=False)
+
+    SPATIAL_FIELDS = ['centroid_lat', 'centroid_lon', 'bbox_min_lat', 'bbox_min_lon', 'bbox_max_lat', 'bbox_max_lon']
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['centroid_lat', 'centroid_lon'], name='vehicle_centroid_idx'),
+            # Catalogue filters always include is_available; these also cover the price/capacity facets
+            models.Index(fields=['is_available', 'price_per_hour'], name='vehicle_avail_price_idx'),
+            models.Index(fields=['is_available', 'passenger_capacity', 'price_per_hour'], name='vehicle_avail_capacity_idx'),
+            models.Index(fields=['is_available', 'owner'], name='vehicle_avail_owner_idx'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.__class__.__name__})"
 
+    def update_spatial_fields(self):
+        for field, value in spatial_fields(self.location).items():
+            setattr(self, field, value)
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'location' in update_fields:
+            self.update_spatial_fields()
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | set(self.SPATIAL_FIELDS)
+        super().save(*args, **kwargs)
+
 class Car(Vehicle):  # Separate table for Cars
     license_plate = models.CharField(max_length=20, unique=True)
     make = models.ForeignKey(Manufacturer, on_delete=models.CASCADE)
@@ -48,6 +82,14 @@ class Car(Vehicle):  # Separate table for Cars
     )
     fuel_type = models.CharField(max_length=50, choices=[("gasoline", "Gasoline"), ("diesel", "Diesel"), ("electric", "Electric")])
 
+    class Meta:
+        indexes = [
+            # Cover the catalogue facet GROUP BYs without touching the table
+            models.Index(fields=['fuel_type', 'year'], name='car_fuel_year_idx'),
+            models.Index(fields=['make', 'year'], name='car_make_year_idx'),
+            models.Index(fields=['year', 'fuel_type'], name='car_year_fuel_idx'),
+        ]
+
     def __str__(self):
         return f"{self.make.name} {self.model} {self.year}"
 
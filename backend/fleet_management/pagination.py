@@ -0,0 +1,11 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CarCursorPagination(CursorPagination):
+    # Keyset pagination on the primary key: every page is an index range scan
+    # (WHERE id > cursor ORDER BY id LIMIT n), so cost does not grow with depth
+    # and cars inserted while a client is paging never shift earlier pages.
+    ordering = 'pk'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
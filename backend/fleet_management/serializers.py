@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from .models import Car, Manufacturer, Owner
 from django.core.exceptions import ValidationError
+from django.core.files.storage import default_storage
 
 class ManufacturerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -21,21 +22,29 @@ class CarSerializer(serializers.ModelSerializer):
     )
 
     owner = OwnerSerializer(read_only=True)
+    # CarCreateAPI sets the owner from the request, so the id is only needed elsewhere
     owner_id = serializers.PrimaryKeyRelatedField(
         queryset=Owner.objects.all(),
         source='owner',
-        write_only=True
+        write_only=True,
+        required=False
     )
 
     image_url = serializers.SerializerMethodField() # Add this field
+    image_variants = serializers.SerializerMethodField()
     vehicle_id = serializers.IntegerField(source='vehicle_ptr_id', read_only=True)
 
 
     class Meta:
         model = Car
         fields = ['id', 'vehicle_id', 'license_plate', 'passenger_capacity', 'make', 'make_id', 'model', 'year',
-                 'price_per_hour', 'location', 'is_available', 'owner', 'owner_id', 'image_url']
-        read_only_fields = ['image_url', 'vehicle_id']
+                 'price_per_hour', 'location', 'is_available', 'owner', 'owner_id', 'image_url', 'image_variants']
+        read_only_fields = ['image_url', 'image_variants', 'vehicle_id']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        # Load nested make/owner in the same query instead of one query per car
+        return queryset.select_related('make', 'owner')
 
     def validate(self, data):
         # Additional validation if needed
@@ -49,3 +58,18 @@ class CarSerializer(serializers.ModelSerializer):
             if request:
                 return request.build_absolute_uri(car.image.url) # Build full URL
         return None # Or return a default image URL or empty string
+
+    def get_image_variants(self, car):
+        # {"160": {"webp": url, "jpeg": url}, ...}, or None until the variants are generated
+        variants = car.image_variants
+        request = self.context.get('request')
+        if not car.image or not variants or not request or variants.get('source') != car.image.name:
+            return None
+        return {
+            width: {
+                extension: request.build_absolute_uri(default_storage.url(name))
+                for extension, name in formats.items()
+            }
+            for width, formats in variants.items()
+            if width != 'source'
+        }
@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .cache import bump_catalogue_version, bump_vehicle_versions
+from .thumbnails import schedule_variants, variants_outdated
+from .models import Vehicle, Car, MotorizedBanca, PassengerVessel, Manufacturer, Owner
+
+
+def vehicle_changed(sender, instance, **kwargs):
+    bump_vehicle_versions([instance.pk])
+    bump_catalogue_version()
+
+
+def vehicle_image_saved(sender, instance, **kwargs):
+    if variants_outdated(instance):
+        schedule_variants(instance)
+    elif not instance.image and instance.image_variants:
+        Vehicle.objects.filter(pk=instance.pk).update(image_variants=None)
+        instance.image_variants = None
+
+
+# Child model saves only signal with the child as sender, so connect each concrete class
+for model in (Vehicle, Car, MotorizedBanca, PassengerVessel):
+    post_save.connect(vehicle_image_saved, sender=model, dispatch_uid=f'thumbnails_{model.__name__}_saved')
+    post_save.connect(vehicle_changed, sender=model, dispatch_uid=f'catalogue_{model.__name__}_saved')
+    post_delete.connect(vehicle_changed, sender=model, dispatch_uid=f'catalogue_{model.__name__}_deleted')
+
+
+@receiver([post_save, post_delete], sender=Manufacturer)
+def manufacturer_changed(sender, instance, **kwargs):
+    # Nested make data is part of every car payload
+    bump_vehicle_versions(Car.objects.filter(make_id=instance.pk).values_list('pk', flat=True))
+    bump_catalogue_version()
+
+
+@receiver([post_save, post_delete], sender=Owner)
+def owner_changed(sender, instance, **kwargs):
+    bump_vehicle_versions(Vehicle.objects.filter(owner_id=instance.pk).values_list('pk', flat=True))
+    bump_catalogue_version()
@@ -1,3 +1,7 @@
 from .test_models import *
 from .test_serializers import *
 from .test_views import *
+from .test_cache import *
+from .test_queries import *
+from .test_thumbnails import *
+from .test_import import *
@@ -0,0 +1,119 @@
+from django.test import TestCase
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from unittest.mock import patch, Mock
+import datetime
+import time
+from fleet_management.models import Manufacturer, Owner, Car
+from fleet_management import cache as catalogue_cache
+from overdrive.models import Booking
+from overdrive.utils import update_booking_status
+
+User = get_user_model()
+
+
+class CatalogueResponseCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manufacturer = Manufacturer.objects.create(name="Honda", country="Japan")
+        self.user = User.objects.create_user(email='cacheowner@mail.com', password='testpass123')
+        self.owner = Owner.objects.create(user=self.user, name="Cache Owner")
+        self.car = Car.objects.create(
+            owner=self.owner,
+            passenger_capacity=5,
+            license_plate="CACHE1",
+            make=self.manufacturer,
+            model="Civic",
+            year=2021,
+            price_per_hour=15.00,
+        )
+
+    def test_list_served_from_cache(self):
+        self.client.get('/api/cars/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/api/cars/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_detail_served_from_cache(self):
+        self.client.get(f'/api/cars/{self.car.id}/')
+        # Only the freshness check behind the ETag reaches the database
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/cars/{self.car.id}/')
+        self.assertEqual(response.data['model'], 'Civic')
+
+    def test_vehicle_save_invalidates(self):
+        self.client.get('/api/cars/')
+        self.client.get(f'/api/cars/{self.car.id}/')
+        self.car.model = "Accord"
+        self.car.save()
+
+        response = self.client.get('/api/cars/')
+        self.assertEqual(response.data['results'][0]['model'], 'Accord')
+        response = self.client.get(f'/api/cars/{self.car.id}/')
+        self.assertEqual(response.data['model'], 'Accord')
+
+    def test_manufacturer_rename_invalidates_detail(self):
+        self.client.get(f'/api/cars/{self.car.id}/')
+        self.manufacturer.name = "Honda Motor"
+        self.manufacturer.save()
+        response = self.client.get(f'/api/cars/{self.car.id}/')
+        self.assertEqual(response.data['make']['name'], 'Honda Motor')
+
+    def test_booking_confirmation_invalidates(self):
+        customer = User.objects.create_user(email='cachecustomer@mail.com', password='testpass123')
+        booking = Booking.objects.create(
+            user=customer,
+            vehicle=self.car,
+            start_time=timezone.now(),
+            end_time=timezone.now() + datetime.timedelta(hours=1),
+            total_price=15.0,
+        )
+        self.client.get('/api/cars/')
+        update_booking_status(booking, 'confirmed', user=self.user)
+
+        response = self.client.get('/api/cars/')
+        self.assertEqual(len(response.data['results']), 0)
+        response = self.client.get(f'/api/cars/{self.car.id}/')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class CachedResponseDataTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.key = 'catalogue:test:key'
+
+    def test_stale_entry_served_while_another_request_refreshes(self):
+        cache.set(self.key, (time.time() - 1, 'stale'), 60)
+        cache.add(f'{self.key}:lock', 1, 10)
+        build = Mock(return_value='fresh')
+
+        self.assertEqual(catalogue_cache.cached_response_data(self.key, build), 'stale')
+        build.assert_not_called()
+
+    def test_stale_entry_refreshed_by_lock_winner(self):
+        cache.set(self.key, (time.time() - 1, 'stale'), 60)
+        build = Mock(return_value='fresh')
+
+        self.assertEqual(catalogue_cache.cached_response_data(self.key, build), 'fresh')
+        self.assertEqual(catalogue_cache.cached_response_data(self.key, build), 'fresh')
+        build.assert_called_once()
+        self.assertIsNone(cache.get(f'{self.key}:lock'))
+
+    def test_cold_key_waits_for_lock_winner(self):
+        cache.add(f'{self.key}:lock', 1, 10)
+        build = Mock(return_value='fresh')
+
+        with patch.object(catalogue_cache, 'WAIT_TIMEOUT', 0.1):
+            self.assertEqual(catalogue_cache.cached_response_data(self.key, build), 'fresh')
+        build.assert_called_once()
+
+    def test_failed_build_releases_lock(self):
+        build = Mock(side_effect=RuntimeError)
+        with self.assertRaises(RuntimeError):
+            catalogue_cache.cached_response_data(self.key, build)
+        self.assertIsNone(cache.get(f'{self.key}:lock'))
@@ -0,0 +1,165 @@
+from django.test import TestCase
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth import get_user_model
+from io import BytesIO, StringIO
+import json
+import tempfile
+from unittest.mock import patch
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from fleet_management.models import Manufacturer, Owner, Car
+from fleet_management.importer import CarImporter, iter_records
+
+User = get_user_model()
+
+CSV_HEADER = "license_plate,make,model,year,fuel_type,passenger_capacity,price_per_hour,location\n"
+
+
+def csv_rows(count, start=0, make="Toyota"):
+    return "".join(
+        f'IMP{start + i:05d},{make},Vios,2021,gasoline,5,12.50,"{{""lat"": 13.1, ""lng"": 123.7}}"\n'
+        for i in range(count)
+    )
+
+
+class CarImporterTest(TestCase):
+    def setUp(self):
+        self.toyota = Manufacturer.objects.create(name="Toyota", country="Japan")
+        self.owner = Owner.objects.create(name="Fleet Partner")
+
+    def run_csv(self, text, batch_size=500):
+        importer = CarImporter(owner=self.owner, batch_size=batch_size)
+        return importer.run(iter_records(BytesIO(text.encode()), 'csv'))
+
+    def test_csv_import(self):
+        summary = self.run_csv(CSV_HEADER + csv_rows(3))
+        self.assertEqual(summary['created'], 3)
+        self.assertEqual(summary['failed'], 0)
+        car = Car.objects.get(license_plate='IMP00001')
+        self.assertEqual(car.make, self.toyota)
+        self.assertEqual(car.owner, self.owner)
+        self.assertEqual(car.name, 'Fleet Partner')
+        self.assertEqual(car.location, {"lat": 13.1, "lng": 123.7})
+        self.assertAlmostEqual(car.centroid_lat, 13.1)
+
+    def test_ndjson_import(self):
+        lines = [
+            {"license_plate": "ND1", "make_id": self.toyota.id, "model": "Vios", "year": 2020,
+             "fuel_type": "diesel", "passenger_capacity": 7, "price_per_hour": 20},
+            "not json",
+        ]
+        text = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        importer = CarImporter(owner=self.owner)
+        summary = importer.run(iter_records(BytesIO(text.encode()), 'ndjson'))
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(summary['failed'], 1)
+        self.assertEqual(summary['errors'][0]['row'], 2)
+        self.assertEqual(Car.objects.get(license_plate='ND1').fuel_type, 'diesel')
+
+    def test_row_errors_are_reported(self):
+        Car.objects.create(license_plate="IMP00000", passenger_capacity=5, make=self.toyota,
+                           model="Vios", year=2021, price_per_hour=10)
+        text = CSV_HEADER + csv_rows(1) + csv_rows(1, start=1, make="Unknown") + csv_rows(1, start=2) + \
+            "IMP00002,Toyota,Vios,1900,steam,5,-1,\n"
+        summary = self.run_csv(text)
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(summary['failed'], 3)
+        errors = {error['row']: error['errors'] for error in summary['errors']}
+        self.assertIn('license_plate', errors[2])
+        self.assertIn('make', errors[3])
+        self.assertEqual(set(errors[5]), {'year', 'fuel_type', 'price_per_hour'})
+
+    def test_duplicate_plates_within_file(self):
+        summary = self.run_csv(CSV_HEADER + csv_rows(2) + csv_rows(1))
+        self.assertEqual(summary['created'], 2)
+        self.assertEqual(summary['errors'][0]['row'], 4)
+
+    def test_queries_do_not_grow_with_rows(self):
+        # Lookups are per batch, not per row: manufacturers once, plates once
+        def lookups(text):
+            with CaptureQueriesContext(connection) as context:
+                self.run_csv(text)
+            return [query for query in context.captured_queries if query['sql'].startswith('SELECT')]
+
+        self.assertEqual(len(lookups(CSV_HEADER + csv_rows(5))), 2)
+        self.assertEqual(len(lookups(CSV_HEADER + csv_rows(400, start=100))), 2)
+
+    def test_batches(self):
+        summary = self.run_csv(CSV_HEADER + csv_rows(25), batch_size=10)
+        self.assertEqual(summary['created'], 25)
+        self.assertEqual(Car.objects.count(), 25)
+
+    def test_unreadable_file_is_a_row_error(self):
+        text = (CSV_HEADER + csv_rows(2)).encode() + b'IMP\xff\xfe,Toyota\n'
+        importer = CarImporter(owner=self.owner)
+        summary = importer.run(iter_records(BytesIO(text), 'csv'))
+        self.assertEqual((summary['created'], summary['failed']), (2, 1))
+        self.assertIn("can't decode", summary['errors'][0]['errors']['non_field_errors'][0])
+
+        text = json.dumps({"license_plate": "ND1"}).encode() + b'\n\xff\n'
+        summary = CarImporter(owner=self.owner).run(iter_records(BytesIO(text), 'ndjson'))
+        self.assertEqual(summary['failed'], 2)
+        self.assertEqual(summary['errors'][1]['row'], 2)
+
+    def test_malformed_csv_is_a_row_error(self):
+        # Longer than csv.field_size_limit()
+        summary = self.run_csv(CSV_HEADER + csv_rows(1) + 'IMP9,"' + 'x' * 200000 + '",Vios\n')
+        self.assertEqual((summary['created'], summary['failed']), (1, 1))
+        self.assertEqual(summary['errors'][0]['row'], 3)
+
+    def test_database_without_bulk_returning(self):
+        with patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False):
+            summary = self.run_csv(CSV_HEADER + csv_rows(3))
+        self.assertEqual(summary['created'], 3)
+        self.assertEqual(set(Car.objects.values_list('license_plate', flat=True)), {'IMP00000', 'IMP00001', 'IMP00002'})
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv') as f:
+            f.write("owner_id," + CSV_HEADER + "".join(f"{self.owner.id},{row}\n" for row in csv_rows(2).splitlines()))
+            f.flush()
+            out = StringIO()
+            call_command('import_cars', f.name, stdout=out, stderr=StringIO())
+        self.assertIn('Imported 2 cars', out.getvalue())
+        self.assertEqual(Car.objects.filter(owner=self.owner).count(), 2)
+
+
+class CarImportAPITest(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        Manufacturer.objects.create(name="Toyota", country="Japan")
+        self.user = User.objects.create_user(email='partner@mail.com', password='testpass123')
+        self.user.is_active = True
+        self.user.save()
+        self.owner = Owner.objects.create(user=self.user, name="Partner")
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+
+    def test_upload_csv(self):
+        upload = SimpleUploadedFile('fleet.csv', (CSV_HEADER + csv_rows(3)).encode(), content_type='text/csv')
+        response = self.client.post('/api/cars/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(Car.objects.filter(owner=self.owner).count(), 3)
+
+    def test_non_owner_forbidden(self):
+        other = User.objects.create_user(email='notpartner@mail.com', password='testpass123')
+        other.is_active = True
+        other.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        upload = SimpleUploadedFile('fleet.csv', CSV_HEADER.encode())
+        response = self.client.post('/api/cars/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_upload_not_utf8(self):
+        upload = SimpleUploadedFile('fleet.csv', CSV_HEADER.encode() + b'\xff\xfe\n', content_type='text/csv')
+        response = self.client.post('/api/cars/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['created'], response.data['failed']), (0, 1))
+
+    def test_unknown_format(self):
+        upload = SimpleUploadedFile('fleet.xlsx', b'PK')
+        response = self.client.post('/api/cars/import/', {'file': upload}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
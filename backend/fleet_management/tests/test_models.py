@@ -7,7 +7,9 @@ from django.contrib.auth import get_user_model
 from django.core.exceptions import ValidationError
 from rest_framework_simplejwt.tokens import RefreshToken
 import json
-from fleet_management.models import Manufacturer, Owner, Car
+from fleet_management.models import Manufacturer, Owner, Car, Vehicle
+from django.core.management import call_command
+from io import StringIO
 from fleet_management.serializers import CarSerializer
 
 User = get_user_model()
@@ -56,3 +58,66 @@ class CarModelTest(TestCase):
         car = Car.objects.get(id=1)
         self.assertEqual(str(car), "Toyota Corolla 2022")
 
+
+
+class VehicleSpatialFieldsTest(TestCase):
+
+    def setUp(self):
+        self.toyota = Manufacturer.objects.create(name="Toyota", country="Philippines")
+
+    def make_car(self, plate, location):
+        return Car.objects.create(
+            license_plate=plate,
+            passenger_capacity=5,
+            make=self.toyota,
+            model="Corolla",
+            year=2022,
+            price_per_hour=10.00,
+            location=location,
+        )
+
+    def test_point_location(self):
+        car = self.make_car("GEO1", {"type": "Point", "coordinates": [123.75, 13.14]})
+        self.assertAlmostEqual(car.centroid_lat, 13.14)
+        self.assertAlmostEqual(car.centroid_lon, 123.75)
+
+    def test_polygon_location_sets_bbox(self):
+        polygon = {
+            "type": "Feature",
+            "geometry": {
+                "type": "Polygon",
+                "coordinates": [[[123.0, 13.0], [124.0, 13.0], [124.0, 14.0], [123.0, 13.0]]],
+            },
+        }
+        car = self.make_car("GEO2", json.dumps(polygon))
+        self.assertEqual((car.bbox_min_lat, car.bbox_max_lat), (13.0, 14.0))
+        self.assertEqual((car.bbox_min_lon, car.bbox_max_lon), (123.0, 124.0))
+        self.assertAlmostEqual(car.centroid_lat, 13.5)
+        self.assertAlmostEqual(car.centroid_lon, 123.5)
+
+    def test_lat_lng_location(self):
+        car = self.make_car("GEO3", {"lat": 40.7128, "lng": -74.0060})
+        self.assertAlmostEqual(car.centroid_lat, 40.7128)
+        self.assertAlmostEqual(car.centroid_lon, -74.0060)
+
+    def test_unparseable_location(self):
+        car = self.make_car("GEO4", "Manila")
+        self.assertIsNone(car.centroid_lat)
+        self.assertIsNone(car.bbox_max_lon)
+
+    def test_location_change_updates_fields(self):
+        car = self.make_car("GEO5", {"lat": 1.0, "lng": 2.0})
+        car.location = {"lat": 3.0, "lng": 4.0}
+        car.save(update_fields=['location'])
+        car.refresh_from_db()
+        self.assertEqual((car.centroid_lat, car.centroid_lon), (3.0, 4.0))
+
+    def test_backfill_command(self):
+        car = self.make_car("GEO6", None)
+        Vehicle.objects.filter(pk=car.pk).update(location=json.dumps({"lat": 5.0, "lng": 6.0}))
+
+        call_command('backfill_vehicle_geo', stdout=StringIO())
+
+        car.refresh_from_db()
+        self.assertEqual(car.location, {"lat": 5.0, "lng": 6.0})
+        self.assertEqual((car.centroid_lat, car.centroid_lon), (5.0, 6.0))
@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth import get_user_model
+from car_rental.testing import QueryBudgetMixin
+from fleet_management.models import Manufacturer, Owner, Car
+
+User = get_user_model()
+
+
+class CarQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='budgetowner@mail.com', password='testpass123')
+        self.user.is_active = True
+        self.user.save()
+        self.token = str(RefreshToken.for_user(self.user).access_token)
+        self.cars = [self.add_car() for _ in range(2)]
+
+    def add_car(self):
+        # A fresh manufacturer and owner per car makes an N+1 on either relation visible
+        index = Car.objects.count()
+        return Car.objects.create(
+            owner=Owner.objects.create(user=self.user, name=f"Owner {index}"),
+            passenger_capacity=5,
+            license_plate=f"BUDGET{index}",
+            make=Manufacturer.objects.create(name=f"Make {index}", country="Japan"),
+            model="Civic",
+            year=2021,
+            price_per_hour=15.00,
+            location={"lat": 13.14, "lng": 123.74},
+        )
+
+    def get_uncached(self, url, params=None):
+        cache.clear()
+        return self.client.get(url, params)
+
+    def test_car_list_budget(self):
+        # One page query plus one UNION ALL for every facet
+        with self.assertQueryBudget(2):
+            self.get_uncached('/api/cars/')
+        self.assertConstantQueries(lambda: self.get_uncached('/api/cars/'), lambda: [self.add_car() for _ in range(5)])
+
+    def test_car_detail_budget(self):
+        # Freshness check, then the car with its relations
+        with self.assertQueryBudget(2):
+            self.get_uncached(f'/api/cars/{self.cars[0].id}/')
+
+    def test_car_nearby_budget(self):
+        params = {'lat': 13.14, 'lon': 123.74, 'radius_km': 5}
+        with self.assertQueryBudget(1):
+            self.client.get('/api/cars/nearby/', params)
+        self.assertConstantQueries(
+            lambda: self.client.get('/api/cars/nearby/', params),
+            lambda: [self.add_car() for _ in range(5)],
+        )
+
+    def test_car_update_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        # JWT user, car with its relations, then one UPDATE per inherited table
+        with self.assertQueryBudget(4):
+            self.client.put(f'/api/cars/{self.cars[0].id}/update/', {'price_per_hour': 18.50}, format='json')
+
+    def test_car_create_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+        other_owner = Owner.objects.create(name="Someone else")
+        data = {
+            'license_plate': 'BUDGETNEW', 'passenger_capacity': 5, 'make_id': self.cars[0].make_id,
+            'owner_id': other_owner.id, 'model': 'Civic', 'year': 2021, 'price_per_hour': 15.00,
+        }
+        # JWT user, owner profile, plate uniqueness, make, then one INSERT per inherited table
+        with self.assertQueryBudget(6):
+            response = self.client.post('/api/cars/create/', data, format='json')
+        self.assertEqual(response.status_code, 201)
+        # The owner comes from the request, never from the payload
+        self.assertEqual(Car.objects.get(license_plate='BUDGETNEW').owner.user_id, self.user.id)
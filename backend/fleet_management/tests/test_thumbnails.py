@@ -0,0 +1,111 @@
+from django.test import TestCase, override_settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from rest_framework.test import APIClient
+from unittest.mock import patch
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, StringIO
+from PIL import Image
+import shutil
+import tempfile
+from fleet_management.models import Manufacturer, Car
+from fleet_management import thumbnails
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def make_image(width=2000, height=1000):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+    return ContentFile(buffer.getvalue(), name='car.jpg')
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, ALLOWED_HOSTS=['testserver'])
+class ThumbnailTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.toyota = Manufacturer.objects.create(name="Toyota", country="Philippines")
+        self.car = Car.objects.create(
+            license_plate="IMG1234",
+            passenger_capacity=5,
+            make=self.toyota,
+            model="Corolla",
+            year=2022,
+            price_per_hour=10.00,
+            is_available=True,
+        )
+
+    def attach_image(self, car, image):
+        with patch.object(thumbnails, 'get_executor') as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                car.image.save('car.jpg', image)
+        return get_executor
+
+    def test_generate_variants(self):
+        name = default_storage.save('cars/source.jpg', make_image(2000, 1000))
+        variants = thumbnails.generate_variants(name)
+
+        self.assertEqual(variants['source'], name)
+        for width in thumbnails.VARIANT_WIDTHS:
+            for extension in ('webp', 'jpeg'):
+                with default_storage.open(variants[str(width)][extension]) as f:
+                    image = Image.open(f)
+                    self.assertEqual(image.size, (width, width // 2))
+
+    def test_small_images_are_not_upscaled(self):
+        name = default_storage.save('cars/small.jpg', make_image(300, 200))
+        variants = thumbnails.generate_variants(name)
+        with default_storage.open(variants['1080']['jpeg']) as f:
+            self.assertEqual(Image.open(f).size, (300, 200))
+
+    def test_image_save_schedules_background_render(self):
+        get_executor = self.attach_image(self.car, make_image())
+        get_executor.return_value.submit.assert_called_once_with(thumbnails._process_in_worker, self.car.pk)
+
+        thumbnails.process_vehicle_image(self.car.pk)
+        self.car.refresh_from_db()
+        self.assertEqual(self.car.image_variants['source'], self.car.image.name)
+        self.assertFalse(thumbnails.variants_outdated(self.car))
+
+    def test_failed_render_is_logged(self):
+        executor = ThreadPoolExecutor(max_workers=1)
+        with patch.object(thumbnails, 'get_executor', return_value=executor), \
+                patch.object(thumbnails, 'process_vehicle_image', side_effect=OSError('disk full')), \
+                self.assertLogs('fleet_management.thumbnails', 'ERROR') as logs:
+            thumbnails._submit(self.car.pk)
+            executor.shutdown(wait=True)  # Done callbacks run on the worker thread
+        self.assertIn(f'vehicle {self.car.pk} failed', logs.output[0])
+        self.assertIn('disk full', logs.output[0])
+
+    def test_one_executor_per_process(self):
+        executor = thumbnails.get_executor()
+        self.assertIs(thumbnails.get_executor(), executor)
+        with patch.object(thumbnails, '_executor_pid', -1):  # As seen from a forked worker
+            self.assertIsNot(thumbnails.get_executor(), executor)
+
+    def test_serializer_exposes_variant_urls(self):
+        self.attach_image(self.car, make_image())
+        response = APIClient().get(f'/api/cars/{self.car.id}/')
+        self.assertIsNone(response.data['image_variants'])
+
+        thumbnails.process_vehicle_image(self.car.pk)
+        response = APIClient().get(f'/api/cars/{self.car.id}/')
+        variants = response.data['image_variants']
+        self.assertEqual(set(variants), {'160', '480', '1080'})
+        self.assertTrue(variants['160']['webp'].startswith('http://testserver/media/cars/variants/'))
+        self.assertTrue(variants['160']['jpeg'].endswith('-160.jpeg'))
+
+    def test_backfill_command(self):
+        self.attach_image(self.car, make_image())
+        call_command('generate_image_variants', workers=1, stdout=StringIO())
+        self.car.refresh_from_db()
+        self.assertFalse(thumbnails.variants_outdated(self.car))
+        self.assertIn('480', self.car.image_variants)
@@ -9,6 +9,10 @@ from rest_framework_simplejwt.tokens import RefreshToken
 import json
 from fleet_management.models import Manufacturer, Owner, Car
 from fleet_management.serializers import CarSerializer
+from fleet_management.pagination import CarCursorPagination
+from fleet_management.views import CarDetailAPI
+from unittest.mock import patch
+from django.core.cache import cache
 
 User = get_user_model()
 
@@ -53,8 +57,68 @@ class CarAPITestCase(APITestCase):
         """Test retrieving list of available cars without authentication"""
         response = self.client.get('/api/cars/')
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['license_plate'], 'XYZ789')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['license_plate'], 'XYZ789')
+        self.assertIsNone(response.data['next'])
+
+    def test_get_car_list_cursor_pagination(self):
+        """Test walking the car list page by page with the opaque cursor"""
+        for i in range(4):
+            Car.objects.create(
+                owner=self.owner,
+                passenger_capacity=5,
+                license_plate=f"PAGE{i}",
+                make=self.manufacturer,
+                model="Jazz",
+                year=2020,
+                price_per_hour=10.00,
+            )
+
+        response = self.client.get('/api/cars/', {'page_size': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        seen = [car['id'] for car in response.data['results']]
+
+        # A car inserted mid-walk lands after the cursor and does not shift pages
+        Car.objects.create(
+            owner=self.owner,
+            passenger_capacity=5,
+            license_plate="LATE1",
+            make=self.manufacturer,
+            model="Jazz",
+            year=2020,
+            price_per_hour=10.00,
+        )
+
+        next_url = response.data['next']
+        while next_url:
+            response = self.client.get(next_url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(car['id'] for car in response.data['results'])
+            next_url = response.data['next']
+
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Car.objects.filter(is_available=True).count())
+
+    def test_get_car_list_page_size_is_bounded(self):
+        """Test that the requested page size is capped"""
+        for i in range(3):
+            Car.objects.create(
+                owner=self.owner,
+                passenger_capacity=5,
+                license_plate=f"CAP{i}",
+                make=self.manufacturer,
+                model="Jazz",
+                year=2020,
+                price_per_hour=10.00,
+            )
+        with patch.object(CarCursorPagination, 'max_page_size', 2):
+            response = self.client.get('/api/cars/', {'page_size': 100000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
 
     def test_get_car_detail_public(self):
         """Test retrieving car details without authentication"""
@@ -139,3 +203,170 @@ class CarAPITestCase(APITestCase):
         response = self.client.post('/api/cars/create/', data, format='json')
         print(f"Response data: {json.dumps(response.data, indent=2)}")
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CarNearbyAPITestCase(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.manufacturer = Manufacturer.objects.create(name="Toyota", country="Japan")
+        # Legazpi, Daraga (~10 km away) and Manila (~330 km away)
+        self.legazpi = self.make_car("NEAR1", {"type": "Point", "coordinates": [123.7438, 13.1391]})
+        self.daraga = self.make_car("NEAR2", {"type": "Point", "coordinates": [123.6931, 13.1488]})
+        self.manila = self.make_car("FAR1", {"lat": 14.5995, "lng": 120.9842})
+        self.hidden = self.make_car("NEAR3", {"type": "Point", "coordinates": [123.7438, 13.1391]}, is_available=False)
+
+    def make_car(self, plate, location, is_available=True):
+        return Car.objects.create(
+            license_plate=plate,
+            passenger_capacity=5,
+            make=self.manufacturer,
+            model="Vios",
+            year=2021,
+            price_per_hour=10.00,
+            location=location,
+            is_available=is_available,
+        )
+
+    def test_nearby_orders_by_distance(self):
+        response = self.client.get('/api/cars/nearby/', {'lat': 13.1391, 'lon': 123.7438, 'radius_km': 20})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([car['license_plate'] for car in response.data], ['NEAR1', 'NEAR2'])
+        self.assertEqual(response.data[0]['distance_km'], 0)
+        self.assertLess(response.data[1]['distance_km'], 20)
+
+    def test_nearby_radius_excludes_far_cars(self):
+        response = self.client.get('/api/cars/nearby/', {'lat': 13.1391, 'lon': 123.7438, 'radius_km': 1})
+        self.assertEqual([car['license_plate'] for car in response.data], ['NEAR1'])
+
+    def test_nearby_requires_coordinates(self):
+        response = self.client.get('/api/cars/nearby/', {'lat': 13.1391})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_nearby_rejects_invalid_radius(self):
+        response = self.client.get('/api/cars/nearby/', {'lat': 13.1391, 'lon': 123.7438, 'radius_km': 5000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/cars/nearby/', {'lat': 'north', 'lon': 123.7438})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CarFacetedListAPITestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.honda = Manufacturer.objects.create(name="Honda", country="Japan")
+        self.toyota = Manufacturer.objects.create(name="Toyota", country="Japan")
+        self.owner = Owner.objects.create(name="Fleet Owner")
+        self.make_car("F1", self.honda, 2020, "gasoline", 5, 10)
+        self.make_car("F2", self.honda, 2021, "diesel", 7, 20)
+        self.make_car("F3", self.toyota, 2021, "gasoline", 5, 30)
+        self.make_car("F4", self.toyota, 2022, "electric", 4, 40)
+        self.make_car("F5", self.toyota, 2022, "electric", 4, 50, is_available=False)
+
+    def make_car(self, plate, make, year, fuel_type, capacity, price, is_available=True):
+        return Car.objects.create(
+            owner=self.owner,
+            license_plate=plate,
+            passenger_capacity=capacity,
+            make=make,
+            model="Model",
+            year=year,
+            fuel_type=fuel_type,
+            price_per_hour=price,
+            is_available=is_available,
+        )
+
+    def plates(self, response):
+        return [car['license_plate'] for car in response.data['results']]
+
+    def test_filter_by_price_range(self):
+        response = self.client.get('/api/cars/', {'price_min': 15, 'price_max': 35})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.plates(response), ['F2', 'F3'])
+
+    def test_filter_by_fields(self):
+        response = self.client.get('/api/cars/', {'make': self.toyota.id, 'year': 2021})
+        self.assertEqual(self.plates(response), ['F3'])
+        response = self.client.get('/api/cars/', {'fuel_type': 'gasoline', 'passenger_capacity': 5})
+        self.assertEqual(self.plates(response), ['F1', 'F3'])
+        response = self.client.get('/api/cars/', {'owner': self.owner.id + 1})
+        self.assertEqual(self.plates(response), [])
+
+    def test_facet_counts(self):
+        response = self.client.get('/api/cars/')
+        facets = response.data['facets']
+        self.assertEqual(facets['fuel_type'], {'gasoline': 2, 'diesel': 1, 'electric': 1})
+        self.assertEqual(facets['year'], {'2020': 1, '2021': 2, '2022': 1})
+        self.assertEqual(facets['make'], {str(self.honda.id): 2, str(self.toyota.id): 2})
+        self.assertEqual(facets['owner'], {str(self.owner.id): 4})
+
+    def test_facet_ignores_its_own_filter(self):
+        response = self.client.get('/api/cars/', {'fuel_type': 'gasoline'})
+        facets = response.data['facets']
+        # Other fuel types stay visible; other facets narrow to gasoline cars
+        self.assertEqual(facets['fuel_type'], {'gasoline': 2, 'diesel': 1, 'electric': 1})
+        self.assertEqual(facets['make'], {str(self.honda.id): 1, str(self.toyota.id): 1})
+        self.assertEqual(facets['passenger_capacity'], {'5': 2})
+
+    def test_facets_only_on_first_page(self):
+        response = self.client.get('/api/cars/', {'page_size': 2})
+        self.assertIn('facets', response.data)
+        response = self.client.get(response.data['next'])
+        self.assertNotIn('facets', response.data)
+
+    def test_invalid_filters(self):
+        response = self.client.get('/api/cars/', {'fuel_type': 'steam'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fuel_type', response.data)
+        response = self.client.get('/api/cars/', {'price_min': 50, 'price_max': 10})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CarDetailConditionalGetTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.manufacturer = Manufacturer.objects.create(name="Honda", country="Japan")
+        self.car = Car.objects.create(
+            passenger_capacity=5,
+            license_plate="ETAG1",
+            make=self.manufacturer,
+            model="Civic",
+            year=2021,
+            price_per_hour=15.00,
+        )
+        self.url = f'/api/cars/{self.car.id}/'
+
+    def test_detail_sets_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+
+    def test_if_none_match_returns_304_without_serializing(self):
+        etag = self.client.get(self.url)['ETag']
+        with patch.object(CarDetailAPI, 'build_detail') as build_detail:
+            with self.assertNumQueries(1):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        build_detail.assert_not_called()
+
+    def test_if_modified_since_returns_304(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_change_produces_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.car.price_per_hour = 20
+        self.car.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_related_change_produces_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.manufacturer.name = "Honda Motor"
+        self.manufacturer.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['make']['name'], "Honda Motor")
@@ -0,0 +1,118 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image, ImageOps
+
+VARIANT_WIDTHS = (160, 480, 1080)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'cars/variants'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """The process's thumbnail thread pool; forked workers start their own."""
+    global _executor, _executor_pid
+    if _executor is None or _executor_pid != os.getpid():
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+                    thread_name_prefix='thumbnails',
+                )
+                _executor_pid = os.getpid()
+    return _executor
+
+
+def variant_name(source_name, width, extension):
+    stem = os.path.splitext(os.path.basename(source_name))[0]
+    return f'{VARIANT_DIR}/{stem}-{width}.{extension}'
+
+
+def generate_variants(source_name):
+    """
+    Render every width/format variant of a stored image and return their storage names.
+
+    Only touches storage, never the database, so it is safe to run in a
+    process pool. Images are never upscaled: widths larger than the original
+    reuse the original size.
+    """
+    with default_storage.open(source_name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+    variants = {'source': source_name}
+    for width in VARIANT_WIDTHS:
+        resized = image
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+        variants[str(width)] = {}
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = BytesIO()
+            resized.save(buffer, image_format, **options)
+            name = variant_name(source_name, width, extension)
+            if default_storage.exists(name):
+                default_storage.delete(name)
+            variants[str(width)][extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+    return variants
+
+
+def process_vehicle_image(vehicle_id):
+    from .cache import bump_catalogue_version, bump_vehicle_versions
+    from .models import Vehicle
+
+    image_name = Vehicle.objects.filter(pk=vehicle_id).values_list('image', flat=True).first()
+    if not image_name:
+        return
+    variants = generate_variants(image_name)
+    # Only record the variants if the image was not replaced while we were rendering
+    updated = Vehicle.objects.filter(pk=vehicle_id, image=image_name).update(image_variants=variants)
+    if updated:
+        bump_vehicle_versions([vehicle_id])
+        bump_catalogue_version()
+
+
+def _process_in_worker(vehicle_id):
+    try:
+        process_vehicle_image(vehicle_id)
+    finally:
+        # Worker threads get their own connections; don't leave them open
+        connections.close_all()
+
+
+def _log_failure(future, vehicle_id):
+    # Nobody waits on the future, so its exception would otherwise be dropped with it
+    error = future.exception()
+    if error is not None:
+        logger.error("Rendering image variants of vehicle %s failed", vehicle_id, exc_info=error)
+
+
+def _submit(vehicle_id):
+    future = get_executor().submit(_process_in_worker, vehicle_id)
+    future.add_done_callback(lambda future: _log_failure(future, vehicle_id))
+    return future
+
+
+def schedule_variants(vehicle):
+    """Render image variants in the background once the current transaction commits."""
+    vehicle_id = vehicle.pk
+    transaction.on_commit(lambda: _submit(vehicle_id))
+
+
+def variants_outdated(vehicle):
+    variants = vehicle.image_variants or {}
+    return bool(vehicle.image) and variants.get('source') != vehicle.image.name
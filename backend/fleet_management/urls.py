@@ -1,9 +1,11 @@
 from django.urls import path
-from .views import CarListAPI, CarCreateAPI, CarDetailAPI, CarUpdateAPI
+from .views import CarListAPI, CarCreateAPI, CarDetailAPI, CarUpdateAPI, CarNearbyAPI, CarImportAPI
 
 urlpatterns = [
     path('api/cars/', CarListAPI.as_view(), name='car-list'),
+    path('api/cars/nearby/', CarNearbyAPI.as_view(), name='car-nearby'),
     path('api/cars/create/', CarCreateAPI.as_view(), name='car-create'),
+    path('api/cars/import/', CarImportAPI.as_view(), name='car-import'),
     path('api/cars/<int:pk>/update/', CarUpdateAPI.as_view(), name='car-update'),
     path('api/cars/<int:pk>/', CarDetailAPI.as_view(), name='car-detail'),
 ]
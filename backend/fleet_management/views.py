@@ -3,20 +3,96 @@ from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from .models import Car, Owner
+from .models import Car
 from .serializers import CarSerializer
+from .pagination import CarCursorPagination
+from .cache import cached_response_data, response_cache_key, get_catalogue_version, get_vehicle_version
 from django.shortcuts import get_object_or_404
+from django.http import Http404
+from car_rental.conditional import make_etag, not_modified_response, set_validators
+from car_rental.principal import get_principal
+from django.db.models import Q
+from .geo import radius_bounds, haversine_km
+from .filters import CarFilterSerializer, apply_filters, facet_counts
+from .importer import CarImporter, FORMATS, iter_records
+from rest_framework.parsers import MultiPartParser
+import os
 
 
-# Public endpoint to list all available cars
+# Public endpoint to list and filter available cars, one cursor page at a time
 class CarListAPI(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []  # No authentication required
+    pagination_class = CarCursorPagination
 
     def get(self, request):
-        cars = Car.objects.filter(is_available=True)
-        serializer = CarSerializer(cars, many=True, context={'request': request}) # Pass request in context
-        return Response(serializer.data)
+        filters = CarFilterSerializer(data=request.query_params)
+        if not filters.is_valid():
+            return Response(filters.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        key = response_cache_key('car-list', request, get_catalogue_version())
+        return Response(cached_response_data(key, lambda: self.build_page(request, filters.validated_data)))
+
+    def build_page(self, request, filters):
+        available = Car.objects.filter(is_available=True)
+        cars = CarSerializer.setup_eager_loading(apply_filters(available, filters))
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(cars, request, view=self)
+        serializer = CarSerializer(page, many=True, context={'request': request}) # Pass request in context
+        data = paginator.get_paginated_response(serializer.data).data
+        # Facets do not change between pages, so only the first page carries them
+        if paginator.cursor_query_param not in request.query_params:
+            data['facets'] = facet_counts(available, filters)
+        return data
+
+# Public endpoint to list available cars near a point, closest first
+class CarNearbyAPI(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []  # No authentication required
+    default_radius_km = 10
+    max_radius_km = 200
+    max_results = 100
+
+    def get(self, request):
+        try:
+            lat = float(request.query_params['lat'])
+            lon = float(request.query_params['lon'])
+            radius_km = float(request.query_params.get('radius_km', self.default_radius_km))
+        except KeyError:
+            return Response({"detail": "lat and lon are required."}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError:
+            return Response({"detail": "lat, lon and radius_km must be numbers."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+            return Response({"detail": "lat or lon is out of range."}, status=status.HTTP_400_BAD_REQUEST)
+        if not (0 < radius_km <= self.max_radius_km):
+            return Response(
+                {"detail": f"radius_km must be greater than 0 and at most {self.max_radius_km}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Prune with the centroid index first, then do exact distance math on the survivors
+        min_lat, max_lat, lon_ranges = radius_bounds(lat, lon, radius_km)
+        lon_filter = Q()
+        for min_lon, max_lon in lon_ranges:
+            lon_filter |= Q(centroid_lon__range=(min_lon, max_lon))
+        candidates = CarSerializer.setup_eager_loading(
+            Car.objects.filter(lon_filter, is_available=True, centroid_lat__range=(min_lat, max_lat))
+        )
+
+        nearby = []
+        for car in candidates:
+            distance = haversine_km(lat, lon, car.centroid_lat, car.centroid_lon)
+            if distance <= radius_km:
+                nearby.append((distance, car))
+        nearby.sort(key=lambda item: (item[0], item[1].pk))
+        nearby = nearby[:self.max_results]
+
+        serializer = CarSerializer([car for _, car in nearby], many=True, context={'request': request})
+        data = serializer.data
+        for item, (distance, _) in zip(data, nearby):
+            item['distance_km'] = round(distance, 3)
+        return Response(data)
 
 # Authenticated endpoint to create a new car
 class CarCreateAPI(APIView):
@@ -25,32 +101,76 @@ class CarCreateAPI(APIView):
 
     def post(self, request):
 
-        try:
-            owner = Owner.objects.get(user=request.user)
-        except Owner.DoesNotExist:
+        owner = get_principal(request).owner
+        if owner is None:
             return Response(
                 {"detail": "User is not registered as an owner"},
                 status=status.HTTP_403_FORBIDDEN
             )
 
+        # Cars are always created for the requesting owner, whatever owner_id says
         data = request.data.copy()
-        data['owner'] = owner.id
+        data.pop('owner_id', None)
 
         serializer = CarSerializer(data=data, context={'request': request})
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(owner=owner)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Authenticated endpoint for owners to import many cars from a CSV or NDJSON upload
+class CarImportAPI(APIView):
+    permission_classes = [IsAuthenticated]
+    authentication_classes = [JWTAuthentication]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        owner = get_principal(request).owner
+        if owner is None:
+            return Response(
+                {"detail": "User is not registered as an owner"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"detail": "A file upload is required."}, status=status.HTTP_400_BAD_REQUEST)
+        file_format = request.data.get('format') or os.path.splitext(upload.name)[1].lstrip('.').lower()
+        if file_format not in FORMATS:
+            return Response(
+                {"detail": f"Unsupported format, expected one of: {', '.join(FORMATS)}."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Rows are always imported for the requesting owner; any owner_id column is ignored
+        importer = CarImporter(owner=owner)
+        summary = importer.run(iter_records(upload.file, file_format))
+        return Response(summary, status=status.HTTP_200_OK)
+
 # Public endpoint to get car details
 class CarDetailAPI(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []  # No authentication required
 
     def get(self, request, pk):
-        car = get_object_or_404(Car, pk=pk, is_available=True)
+        # Answer conditional requests from one narrow query, before any serialization
+        updated_at = Car.objects.filter(pk=pk, is_available=True).values_list('updated_at', flat=True).first()
+        if updated_at is None:
+            raise Http404
+        version = get_vehicle_version(pk)
+        etag = make_etag('car', pk, updated_at.isoformat(), version)
+        not_modified = not_modified_response(request, etag, updated_at)
+        if not_modified is not None:
+            return not_modified
+
+        key = response_cache_key('car-detail', request, version)
+        response = Response(cached_response_data(key, lambda: self.build_detail(request, pk)))
+        return set_validators(response, etag, updated_at)
+
+    def build_detail(self, request, pk):
+        car = get_object_or_404(CarSerializer.setup_eager_loading(Car.objects.all()), pk=pk, is_available=True)
         serializer = CarSerializer(car, context={'request': request})
-        return Response(serializer.data)
+        return serializer.data
 
 # Authenticated endpoint to update a car
 class CarUpdateAPI(APIView):
@@ -58,9 +178,9 @@ class CarUpdateAPI(APIView):
     authentication_classes = [JWTAuthentication]
 
     def put(self, request, pk):
-        car = get_object_or_404(Car, pk=pk)
+        car = get_object_or_404(CarSerializer.setup_eager_loading(Car.objects.all()), pk=pk)
 
-        if car.owner.user != request.user:
+        if car.owner is None or car.owner.user_id != get_principal(request).id:
             return Response(
                 {"detail": "You can only update your own cars"},
                 status=status.HTTP_403_FORBIDDEN
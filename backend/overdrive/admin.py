@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Booking, BookingStatusLog
+from .models import ArchivedBooking, ArchivedBookingStatusLog, Booking, BookingStatusLog
 
 
 class BookingStatusLogInline(admin.TabularInline):
@@ -15,4 +15,21 @@ class BookingAdmin(admin.ModelAdmin):
     inlines = [BookingStatusLogInline]  # Assuming you've created an inline for BookingStatusLog
 
 
+class ArchivedBookingStatusLogInline(admin.TabularInline):
+    model = ArchivedBookingStatusLog
+    extra = 0
 
+
+@admin.register(ArchivedBooking)
+class ArchivedBookingAdmin(admin.ModelAdmin):
+    # Read-only: restore a booking with the restore_bookings command to change it
+    list_display = ('id', 'user', 'vehicle', 'start_time', 'end_time', 'total_price', 'status', 'archived_at')
+    list_filter = ('status',)
+    search_fields = ('user__first_name', 'user__last_name')
+    inlines = [ArchivedBookingStatusLogInline]
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
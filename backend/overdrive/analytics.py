@@ -0,0 +1,210 @@
+from datetime import timedelta
+from itertools import islice
+import numpy as np
+from fleet_management.models import Vehicle
+from .archive import archive_cutoff
+from .models import ArchivedBooking, Booking
+
+# Bookings that held their vehicle and earn revenue
+BILLABLE_STATUSES = Booking.ACTIVE_STATUSES + ['returned']
+
+DAY_SECONDS = 86400
+# Lower edges of the idle period histogram buckets, in hours; the last bucket is open-ended
+IDLE_HOUR_BINS = [0, 1, 2, 4, 8, 24, 72, 168]
+LOAD_CHUNK_SIZE = 100000
+# Map vehicle ids to positions with a table while it needs at most this many slots per row looked up
+LOOKUP_TABLE_FACTOR = 4
+
+
+class BookingColumns:
+    """Bookings as parallel arrays: vehicle ids (int64), start and end (datetime64[s]), total price (float64)."""
+    __slots__ = ('vehicle_ids', 'starts', 'ends', 'prices')
+
+    def __init__(self, vehicle_ids, starts, ends, prices):
+        self.vehicle_ids = vehicle_ids
+        self.starts = starts
+        self.ends = ends
+        self.prices = prices
+
+    def __len__(self):
+        return len(self.vehicle_ids)
+
+
+def _seconds(datetimes, count):
+    # Going through timestamps is ~10x faster than letting NumPy convert datetime objects
+    return np.fromiter((value.timestamp() for value in datetimes), np.float64, count).astype('datetime64[s]')
+
+
+def load_columns(*querysets):
+    """Read (vehicle_id, start_time, end_time, total_price) from booking querysets into BookingColumns."""
+    chunks = []
+    for queryset in querysets:
+        rows = queryset.values_list('vehicle_id', 'start_time', 'end_time', 'total_price').iterator(
+            chunk_size=LOAD_CHUNK_SIZE)
+        # Transposing a chunk at a time keeps at most one chunk of Python row tuples alive
+        while chunk := list(islice(rows, LOAD_CHUNK_SIZE)):
+            vehicle_ids, starts, ends, prices = zip(*chunk)
+            count = len(chunk)
+            chunks.append((np.fromiter(vehicle_ids, np.int64, count), _seconds(starts, count),
+                           _seconds(ends, count), np.fromiter(prices, np.float64, count)))
+    if not chunks:
+        return BookingColumns(np.empty(0, np.int64), np.empty(0, 'datetime64[s]'),
+                              np.empty(0, 'datetime64[s]'), np.empty(0, np.float64))
+    return BookingColumns(*(np.concatenate(column) for column in zip(*chunks)))
+
+
+class FleetUsage:
+    """Per-vehicle and per-day figures for one window, see compute_usage()."""
+
+    def __init__(self, vehicle_ids, window_seconds, busy_seconds, revenue, day_revenue, idle_counts):
+        self.vehicle_ids = vehicle_ids
+        self.window_seconds = window_seconds
+        self.busy_seconds = busy_seconds
+        self.revenue = revenue
+        self.day_revenue = day_revenue
+        self.idle_counts = idle_counts
+
+    @property
+    def utilization(self):
+        return self.busy_seconds / max(self.window_seconds, 1) * 100
+
+    @property
+    def fleet_utilization(self):
+        return float(self.busy_seconds.sum()) / max(self.window_seconds * len(self.vehicle_ids), 1) * 100
+
+
+def _positions(vehicle_ids, values):
+    """Position of each value in the sorted vehicle_ids array, -1 for values not in it."""
+    if not len(vehicle_ids) or not len(values):
+        return np.full(len(values), -1, dtype=np.int64)
+    size = int(max(vehicle_ids[-1], values.max())) + 1
+    if vehicle_ids[0] >= 0 and values.min() >= 0 and size <= LOOKUP_TABLE_FACTOR * (len(values) + len(vehicle_ids)):
+        # Ids are dense enough for a direct lookup table, ~30x faster than binary search on millions of rows
+        table = np.full(size, -1, dtype=np.int64)
+        table[vehicle_ids] = np.arange(len(vehicle_ids))
+        return table[values]
+    positions = np.searchsorted(vehicle_ids, values)
+    found = positions < len(vehicle_ids)
+    found[found] = vehicle_ids[positions[found]] == values[found]
+    return np.where(found, positions, -1)
+
+
+def _revenue_per_day(starts, ends, rates, days):
+    """Revenue of bookings clipped to [starts, ends) in each DAY_SECONDS bucket, as bincounts instead of a loop over days."""
+    first_day = starts // DAY_SECONDS
+    last_day = (ends - 1) // DAY_SECONDS
+    # The part in the first day, the part in the last day, and full days in between via a difference array
+    revenue = np.bincount(first_day, weights=rates * (np.minimum(ends, (first_day + 1) * DAY_SECONDS) - starts),
+                          minlength=days)
+    spans = last_day > first_day
+    revenue += np.bincount(last_day[spans], weights=rates[spans] * (ends[spans] - last_day[spans] * DAY_SECONDS),
+                           minlength=days)
+    middle = last_day - first_day > 1
+    full_days = np.bincount(first_day[middle] + 1, weights=rates[middle] * DAY_SECONDS, minlength=days + 1)
+    full_days -= np.bincount(last_day[middle], weights=rates[middle] * DAY_SECONDS, minlength=days + 1)
+    return revenue + np.cumsum(full_days)[:days]
+
+
+def compute_usage(columns, vehicle_ids, start, end):
+    """
+    Utilization, revenue and idle periods of vehicle_ids over [start, end), with no Python loops over bookings.
+
+    Bookings are clipped to the window in one vectorized pass. Busy time is
+    the union of a vehicle's clipped bookings, found with a grouped running
+    maximum of end times after sorting by (vehicle, start), so overlapping
+    bookings are not counted twice; the same pass yields the idle gaps
+    between them. Revenue accrues evenly over each booking's full length and
+    is split into day buckets starting at start, so a booking that spans
+    days or the window edge only counts the part inside.
+    Bookings on vehicles outside vehicle_ids are ignored.
+    """
+    vehicle_ids = np.unique(np.asarray(vehicle_ids, dtype=np.int64))
+    origin = np.datetime64(int(start.timestamp()), 's')
+    length = int((np.datetime64(int(end.timestamp()), 's') - origin) / np.timedelta64(1, 's'))
+    vehicle_count = len(vehicle_ids)
+
+    index = _positions(vehicle_ids, columns.vehicle_ids)
+    known = index >= 0
+    index = index[known]
+    starts = (columns.starts[known] - origin).astype(np.int64)
+    ends = (columns.ends[known] - origin).astype(np.int64)
+    rates = columns.prices[known] / np.maximum(ends - starts, 1)
+
+    # Interval clipping to [0, length)
+    clipped_starts = np.clip(starts, 0, length)
+    clipped_ends = np.clip(ends, 0, length)
+    revenue = np.bincount(index, weights=rates * (clipped_ends - clipped_starts), minlength=vehicle_count)
+
+    inside = clipped_ends > clipped_starts
+    group, group_starts, group_ends = index[inside], clipped_starts[inside], clipped_ends[inside]
+    # One sort on a combined (vehicle, start) key is several times faster than lexsort
+    order = np.argsort(group * (length + 1) + group_starts)
+    group, group_starts, group_ends = group[order], group_starts[order], group_ends[order]
+    # Offsetting each vehicle's times past the previous vehicle's lets one accumulate() run per group
+    offset = group * (length + 1)
+    covered_until = np.maximum.accumulate(group_ends + offset) - offset
+    first = np.ones(len(group), dtype=bool)
+    first[1:] = group[1:] != group[:-1]
+    previous_end = np.empty_like(covered_until)
+    previous_end[1:] = covered_until[:-1]
+    previous_end[first] = 0
+    busy = np.bincount(group, weights=np.maximum(group_ends - np.maximum(group_starts, previous_end), 0),
+                       minlength=vehicle_count)
+
+    # Idle periods: before each booking, after each vehicle's last one, and whole windows of unbooked vehicles
+    last = np.ones(len(group), dtype=bool)
+    last[:-1] = group[1:] != group[:-1]
+    unbooked = np.ones(vehicle_count, dtype=bool)
+    unbooked[group] = False
+    gaps = np.concatenate((group_starts - previous_end, length - covered_until[last],
+                           np.full(np.count_nonzero(unbooked), length)))
+    gaps = gaps[gaps > 0] / 3600
+    idle_counts = np.bincount(np.searchsorted(IDLE_HOUR_BINS, gaps, side='right') - 1, minlength=len(IDLE_HOUR_BINS))
+
+    days = max(-(-length // DAY_SECONDS), 1)
+    day_revenue = _revenue_per_day(clipped_starts[inside], clipped_ends[inside], rates[inside], days)
+
+    return FleetUsage(vehicle_ids, length, busy, revenue, day_revenue, idle_counts)
+
+
+def _money(value):
+    # Adding 0.0 turns the -0.0 that float error can leave on an empty day into 0.0
+    return f'{round(float(value), 2) + 0.0:.2f}'
+
+
+def owner_analytics(owner, start, end):
+    """Fleet analytics for an owner's vehicles over [start, end), ready to serialize."""
+    vehicles = dict(Vehicle.objects.filter(owner=owner).values_list('id', 'name'))
+    window_filter = {'vehicle_id__in': list(vehicles), 'status__in': BILLABLE_STATUSES,
+                     'start_time__lt': end, 'end_time__gt': start}
+    querysets = [Booking.objects.filter(**window_filter)]
+    # Only bookings that ended before the archive cutoff can have been archived
+    if start < archive_cutoff():
+        querysets.append(ArchivedBooking.objects.filter(**window_filter))
+    usage = compute_usage(load_columns(*querysets), list(vehicles), start, end)
+
+    return {
+        'start_time': start,
+        'end_time': end,
+        'utilization': round(usage.fleet_utilization, 2),
+        'revenue': _money(usage.revenue.sum()),
+        'vehicles': [
+            {
+                'vehicle_id': int(vehicle_id),
+                'name': vehicles[int(vehicle_id)],
+                'booked_hours': round(float(busy) / 3600, 2),
+                'utilization': round(float(utilization), 2),
+                'revenue': _money(revenue),
+            }
+            for vehicle_id, busy, utilization, revenue in zip(
+                usage.vehicle_ids, usage.busy_seconds, usage.utilization, usage.revenue)
+        ],
+        'revenue_per_day': [
+            {'start_time': start + timedelta(seconds=day * DAY_SECONDS), 'revenue': _money(revenue)}
+            for day, revenue in enumerate(usage.day_revenue)
+        ],
+        'idle_hours_histogram': [
+            {'min_hours': low, 'max_hours': high, 'count': int(count)}
+            for low, high, count in zip(IDLE_HOUR_BINS, IDLE_HOUR_BINS[1:] + [None], usage.idle_counts)
+        ],
+    }
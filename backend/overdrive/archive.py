@@ -0,0 +1,144 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from payment.cash_payment import CashBookingPayment
+from payment.gcash_payment import GcashBookingPayment
+from payment.models import (
+    ArchivedBookingPayment, ArchivedCashBookingPayment, ArchivedGcashBookingPayment, ArchivedPayPalBookingPayment,
+    ArchivedStripeBookingPayment, BookingPayment,
+)
+from payment.paypal_payment import PayPalBookingPayment
+from payment.stripe_payment import StripeBookingPayment
+from .models import ArchivedBooking, ArchivedBookingStatusLog, Booking, BookingStatusLog
+
+# Bookings in these states never change again, so they can leave the hot tables
+FINISHED_STATUSES = ['returned', 'canceled']
+
+# (live model, archive model) pairs for the rows that belong to a booking through booking_id
+BOOKING_CHILDREN = [
+    (BookingStatusLog, ArchivedBookingStatusLog),
+    (BookingPayment, ArchivedBookingPayment),
+]
+
+# (live model, archive model) pairs for BookingPayment's multi-table subtypes, which share the payment's id.
+# Deleting a payment cascades to its subtype row, so these are copied before BOOKING_CHILDREN are deleted.
+PAYMENT_SUBTYPES = [
+    (StripeBookingPayment, ArchivedStripeBookingPayment),
+    (PayPalBookingPayment, ArchivedPayPalBookingPayment),
+    (CashBookingPayment, ArchivedCashBookingPayment),
+    (GcashBookingPayment, ArchivedGcashBookingPayment),
+]
+
+
+def archive_cutoff(days=None, now=None):
+    if days is None:
+        days = getattr(settings, 'BOOKING_ARCHIVE_AFTER_DAYS', 365)
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def archivable_bookings(cutoff):
+    """Finished bookings whose window ended, and that were last changed, before cutoff."""
+    # start_time < end_time, so the redundant start_time bound lets the (status, start_time) index drive the scan
+    return Booking.objects.filter(
+        status__in=FINISHED_STATUSES, start_time__lt=cutoff, end_time__lt=cutoff, updated_at__lt=cutoff,
+    )
+
+
+def subtype_fields(live_model):
+    """
+    The columns a payment subtype adds to BookingPayment, as attnames.
+
+    Its archive model must have every one of them; reading one it lacks
+    fails the copy instead of dropping the column.
+    """
+    return [field.attname for field in live_model._meta.local_concrete_fields]
+
+
+def copy_rows(queryset, target_model, fields=None, **extra):
+    """
+    Insert one target_model row per row of queryset, ids included.
+
+    Copies fields, or by default the fields both models have.
+    """
+    if fields is None:
+        source_fields = {field.attname for field in queryset.model._meta.concrete_fields}
+        fields = [field.attname for field in target_model._meta.concrete_fields if field.attname in source_fields]
+    rows = list(queryset.values(*fields))
+    if not rows:
+        return 0
+    if target_model._meta.parents:
+        # bulk_create refuses multi-table children; their parent rows are copied on their own
+        insert_local_rows(target_model, rows)
+        return len(rows)
+    objs = target_model.objects.bulk_create([target_model(**row, **extra) for row in rows])
+    # bulk_create stamps auto_now and auto_now_add fields with the current time; put the copied values back
+    stamped = [field.attname for field in target_model._meta.concrete_fields
+               if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    if stamped:
+        for obj, row in zip(objs, rows):
+            for name in stamped:
+                setattr(obj, name, row[name])
+        target_model.objects.bulk_update(objs, stamped)
+    return len(rows)
+
+
+def insert_local_rows(model, rows):
+    """Insert rows (dicts by attname) into a multi-table child's own table, as bulk_create_cars does for Car."""
+    fields = model._meta.local_concrete_fields
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', [
+            [field.get_db_prep_save(row[field.attname], connection) for field in fields] for row in rows
+        ])
+
+
+def archive_bookings(cutoff, batch_size=1000):
+    """
+    Move archivable bookings with their status logs and payments, provider subtypes included, to the archive tables.
+
+    Works in chunks of batch_size bookings, each copied and deleted in its
+    own transaction, so a long run never holds locks on the hot tables for
+    more than one chunk and can be interrupted safely. Returns how many
+    bookings were archived.
+    """
+    candidates = archivable_bookings(cutoff)
+    archived = 0
+    while True:
+        with transaction.atomic():
+            booking_ids = list(candidates.values_list('pk', flat=True)[:batch_size])
+            if not booking_ids:
+                break
+            # Parents first on the way in, children first on the way out
+            copy_rows(Booking.objects.filter(pk__in=booking_ids), ArchivedBooking, archived_at=timezone.now())
+            for live_model, archive_model in BOOKING_CHILDREN:
+                copy_rows(live_model.objects.filter(booking_id__in=booking_ids), archive_model)
+            for live_model, archive_model in PAYMENT_SUBTYPES:
+                copy_rows(live_model.objects.filter(booking_id__in=booking_ids), archive_model,
+                          fields=subtype_fields(live_model))
+            for live_model, _ in BOOKING_CHILDREN:
+                live_model.objects.filter(booking_id__in=booking_ids).delete()
+            Booking.objects.filter(pk__in=booking_ids).delete()
+        archived += len(booking_ids)
+    return archived
+
+
+def restore_bookings(booking_ids):
+    """Move archived bookings and their rows back to the live tables; returns the ids restored."""
+    with transaction.atomic():
+        booking_ids = list(ArchivedBooking.objects.filter(pk__in=booking_ids).values_list('pk', flat=True))
+        if booking_ids:
+            copy_rows(ArchivedBooking.objects.filter(pk__in=booking_ids), Booking)
+            for live_model, archive_model in BOOKING_CHILDREN:
+                copy_rows(archive_model.objects.filter(booking_id__in=booking_ids), live_model)
+            for live_model, archive_model in PAYMENT_SUBTYPES:
+                copy_rows(archive_model.objects.filter(bookingpayment_ptr__booking_id__in=booking_ids), live_model,
+                          fields=subtype_fields(live_model))
+            for _, archive_model in PAYMENT_SUBTYPES:
+                archive_model.objects.filter(bookingpayment_ptr__booking_id__in=booking_ids).delete()
+            for _, archive_model in BOOKING_CHILDREN:
+                archive_model.objects.filter(booking_id__in=booking_ids).delete()
+            ArchivedBooking.objects.filter(pk__in=booking_ids).delete()
+    return booking_ids
@@ -0,0 +1,64 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .locks import vehicle_locks
+from .models import Booking, BookingStatusLog
+from .states import SYSTEM, get_transition
+
+EXPIRED_STATUS = 'canceled'
+
+
+def stale_requests(now=None):
+    """Requested bookings past BOOKING_REQUEST_TTL or whose start_time has passed."""
+    now = now or timezone.now()
+    stale = Q(start_time__lte=now)
+    ttl = getattr(settings, 'BOOKING_REQUEST_TTL', None)
+    if ttl is not None:
+        stale |= Q(created_at__lt=now - timedelta(seconds=ttl))
+    # Each side of the OR is a range scan on its own (status, ...) index
+    return Booking.objects.filter(stale, status='requested')
+
+
+def still_stale(stale, booking_ids):
+    """The ids among booking_ids that stale still matches, re-read once their vehicles are locked."""
+    return list(stale.filter(pk__in=booking_ids).values_list('pk', flat=True))
+
+
+def expire_requests(now=None, batch_size=500):
+    """
+    Cancel stale requested bookings in batches and return how many were canceled.
+
+    Each batch locks its vehicles, re-reads which candidates are still
+    requested (an owner may have confirmed one meanwhile), then writes the
+    bookings with one UPDATE that only matches requested rows and logs the
+    ones it changed with one bulk INSERT.
+    A requested booking never made its vehicle unavailable or entered the
+    occupancy index, so neither is touched.
+    """
+    now = now or timezone.now()
+    transition = get_transition('requested', EXPIRED_STATUS)
+    if transition is None or SYSTEM not in transition.actors:
+        raise ValueError(f"overdrive.states does not let the system mark requested bookings as {EXPIRED_STATUS}.")
+
+    stale = stale_requests(now)
+    expired = 0
+    while True:
+        batch = list(stale.values_list('pk', 'vehicle_id')[:batch_size])
+        if not batch:
+            break
+        with vehicle_locks({vehicle_id for _, vehicle_id in batch}):
+            booking_ids = still_stale(stale, [pk for pk, _ in batch])
+            if booking_ids:
+                # The locks are process-local on SQLite, so the UPDATE re-checks the status itself, like
+                # update_booking_status; the rows it changed are the ones carrying this sweep's timestamp
+                Booking.objects.filter(pk__in=booking_ids, status='requested').update(
+                    status=EXPIRED_STATUS, updated_at=now)
+                booking_ids = list(Booking.objects.filter(
+                    pk__in=booking_ids, status=EXPIRED_STATUS, updated_at=now).values_list('pk', flat=True))
+                BookingStatusLog.objects.bulk_create([
+                    BookingStatusLog(booking_id=booking_id, status=EXPIRED_STATUS, created_at=now)
+                    for booking_id in booking_ids
+                ])
+        expired += len(booking_ids)
+    return expired
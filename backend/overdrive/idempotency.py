@@ -0,0 +1,145 @@
+import functools
+import hashlib
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.1
+CLAIM_ATTEMPTS = 3
+
+
+def key_ttl():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_KEY_TTL', 86400))
+
+
+def claim_lease():
+    return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', 60))
+
+
+def request_fingerprint(request):
+    # Reading the raw body here caches it, so the parsers can still read it afterwards
+    digest = hashlib.sha256()
+    for part in (request.method.encode(), request.get_full_path().encode(), request._request.body):
+        digest.update(part)
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def replay(record):
+    response = Response(record.response_body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def find_key(user, scope, key):
+    record = IdempotencyKey.objects.filter(user=user, scope=scope, key=key).first()
+    if record is not None and record.created_at < timezone.now() - key_ttl():
+        # Expired but not purged yet: free the key for a new request
+        IdempotencyKey.objects.filter(pk=record.pk, created_at=record.created_at).delete()
+        return None
+    return record
+
+
+def claim_key(user, scope, key, fingerprint):
+    """
+    Claim a key for this request: (record, True) if the request should run, or (record, False) for a duplicate.
+
+    A claim still unanswered after IDEMPOTENCY_CLAIM_LEASE seconds belongs to
+    a request that died, and is taken over with a compare-and-swap on its
+    claimed_at so only one retry runs. The record is None only if the key
+    kept changing hands.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        record = find_key(user, scope, key)
+        if record is None:
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(user=user, scope=scope, key=key, request_hash=fingerprint)
+                return record, True
+            except IntegrityError:
+                continue  # A concurrent duplicate claimed the key first; look again
+        now = timezone.now()
+        stale = record.status_code is None and record.claimed_at < now - claim_lease()
+        if stale and record.request_hash == fingerprint:
+            if IdempotencyKey.objects.filter(pk=record.pk, status_code__isnull=True,
+                                             claimed_at=record.claimed_at).update(claimed_at=now):
+                record.claimed_at = now
+                return record, True
+            continue
+        return record, False
+    return None, False
+
+
+def wait_for_response(record):
+    """Poll a key whose first request is still running, for up to IDEMPOTENCY_WAIT seconds."""
+    deadline = time.monotonic() + getattr(settings, 'IDEMPOTENCY_WAIT', 10)
+    while record is not None and record.status_code is None and time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def idempotent(scope):
+    """
+    Make an APIView POST handler safe to retry with an Idempotency-Key header.
+
+    The first request with a key claims a row and runs normally; its response
+    is stored and replayed for later requests with the same key, which cost
+    one indexed lookup. A duplicate arriving while the first is still running
+    waits for it, and takes over a claim older than IDEMPOTENCY_CLAIM_LEASE
+    whose request died. Reusing a key with a different request is rejected
+    (422), and 5xx responses or exceptions release the key so the client can
+    retry. Requests without the header are not affected.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(HEADER)
+            if not key:
+                return handler(view, request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response({"detail": f"{HEADER} must be at most {MAX_KEY_LENGTH} characters."},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            fingerprint = request_fingerprint(request)
+            record, claimed = claim_key(request.user, scope, key, fingerprint)
+            if not claimed and record is not None and record.request_hash == fingerprint:
+                record = wait_for_response(record)
+                if record is None or record.status_code is None:
+                    # The first request failed, or its claim lapsed while this one waited
+                    record, claimed = claim_key(request.user, scope, key, fingerprint)
+            if claimed:
+                return run_and_store(record, handler, view, request, *args, **kwargs)
+
+            if record is not None and record.request_hash != fingerprint:
+                return Response({"detail": f"{HEADER} was already used for a different request."},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+            if record is None or record.status_code is None:
+                return Response({"detail": f"A request with this {HEADER} is still being processed."},
+                                status=status.HTTP_409_CONFLICT)
+            return replay(record)
+        return wrapper
+    return decorator
+
+
+def run_and_store(record, handler, view, request, *args, **kwargs):
+    # Writes match claimed_at, so a request whose claim was taken over leaves the new holder's row alone
+    claim = IdempotencyKey.objects.filter(pk=record.pk, claimed_at=record.claimed_at)
+    try:
+        response = handler(view, request, *args, **kwargs)
+    except Exception:
+        claim.delete()
+        raise
+    # Only DRF responses carry data that can be stored; server errors are worth retrying
+    if response.status_code >= 500 or not hasattr(response, 'data'):
+        claim.delete()
+        return response
+    claim.update(status_code=response.status_code, response_body=response.data)
+    return response
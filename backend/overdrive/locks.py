@@ -0,0 +1,61 @@
+import threading
+from contextlib import contextmanager
+from django.db import connection, transaction
+from fleet_management.models import Vehicle
+
+# Process-local fallback for databases without SELECT ... FOR UPDATE (SQLite)
+LOCK_STRIPES = 256
+_stripes = [threading.RLock() for _ in range(LOCK_STRIPES)]
+_held = threading.local()
+
+
+def vehicle_lock(vehicle_id):
+    """
+    Run the block in a transaction that holds an exclusive lock on one vehicle.
+
+    Booking writes for the same vehicle are serialized while writes for
+    different vehicles proceed in parallel. The lock is the vehicle's row
+    (SELECT ... FOR UPDATE) where the database supports it, and otherwise one
+    of LOCK_STRIPES in-process locks, which only protects writers sharing
+    this process. Either way it is held until the outermost transaction opened
+    here commits, so re-entering for the same vehicle is free.
+    """
+    return vehicle_locks([vehicle_id])
+
+
+@contextmanager
+def vehicle_locks(vehicle_ids):
+    """
+    Like vehicle_lock() for several vehicles, always acquired in the same order.
+
+    Take every lock a block needs in one call: acquiring more vehicles while
+    already holding some can deadlock against another writer.
+    """
+    held = getattr(_held, 'counts', None)
+    if held is None:
+        held = _held.counts = {}
+    vehicle_ids = set(vehicle_ids)
+    new_ids = sorted(vehicle_id for vehicle_id in vehicle_ids if not held.get(vehicle_id))
+    for vehicle_id in vehicle_ids:
+        held[vehicle_id] = held.get(vehicle_id, 0) + 1
+
+    stripes = []
+    try:
+        if not new_ids:
+            yield
+            return
+        if not connection.features.has_select_for_update:
+            stripes = [_stripes[i] for i in sorted({hash(vehicle_id) % LOCK_STRIPES for vehicle_id in new_ids})]
+        for stripe in stripes:
+            stripe.acquire()
+        with transaction.atomic():
+            if not stripes:
+                list(Vehicle.objects.select_for_update().filter(pk__in=new_ids).order_by('pk').values_list('pk', flat=True))
+            yield
+    finally:
+        for stripe in reversed(stripes):
+            stripe.release()
+        for vehicle_id in vehicle_ids:
+            held[vehicle_id] -= 1
+            if not held[vehicle_id]:
+                del held[vehicle_id]
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from overdrive.archive import archive_bookings, archive_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Move finished bookings older than BOOKING_ARCHIVE_AFTER_DAYS, with their logs and payments, to the archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None, help='Override BOOKING_ARCHIVE_AFTER_DAYS')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        archived = archive_bookings(archive_cutoff(options['days']), batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Archived {archived} bookings.'))
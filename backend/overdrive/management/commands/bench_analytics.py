@@ -0,0 +1,71 @@
+import statistics
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fleet_management.models import Vehicle
+from overdrive.analytics import BILLABLE_STATUSES, DAY_SECONDS, compute_usage, load_columns
+from overdrive.models import Booking
+
+
+class Command(BaseCommand):
+    help = 'Time NumPy fleet analytics against a row-by-row Python pass over the same bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=730,
+                            help='Window length from a year ago, the range bench_availability seeds')
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--sample', type=int, default=200000,
+                            help='Bookings processed row by row for the baseline')
+
+    def handle(self, *args, **options):
+        # Seed with `bench_availability --seed --bookings 5000000` first
+        start = timezone.now() - timedelta(days=365)
+        end = start + timedelta(days=options['days'])
+        vehicle_ids = list(Vehicle.objects.values_list('id', flat=True))
+        bookings = Booking.objects.filter(status__in=BILLABLE_STATUSES, start_time__lt=end, end_time__gt=start)
+
+        began = time.perf_counter()
+        columns = load_columns(bookings)
+        load = time.perf_counter() - began
+        if not len(columns):
+            self.stdout.write(self.style.ERROR('No bookings in the window, seed with bench_availability --seed first.'))
+            return
+        self.stdout.write(f'Loaded {len(columns)} bookings on {len(vehicle_ids)} vehicles into arrays in {load:.2f} s')
+
+        timings = []
+        for _ in range(options['runs']):
+            began = time.perf_counter()
+            usage = compute_usage(columns, vehicle_ids, start, end)
+            timings.append(time.perf_counter() - began)
+        self.stdout.write(f'NumPy utilization, revenue per day and idle histogram: median '
+                          f'{statistics.median(timings) * 1000:.0f} ms over {len(columns)} bookings')
+
+        rows = list(bookings.values_list('vehicle_id', 'start_time', 'end_time', 'total_price')[:options['sample']])
+        began = time.perf_counter()
+        self.row_by_row(rows, start, end)
+        naive = time.perf_counter() - began
+        self.stdout.write(f'Row-by-row Python over {len(rows)} bookings: {naive * 1000:.0f} ms '
+                          f'(~{naive * len(columns) / len(rows):.1f} s extrapolated to {len(columns)})')
+        self.stdout.write(f'Fleet utilization {usage.fleet_utilization:.2f}%, revenue {usage.revenue.sum():.2f}')
+
+    def row_by_row(self, rows, start, end):
+        # The per-booking loop the analytics module replaces; it also skips merging overlaps and idle gaps
+        busy = defaultdict(float)
+        revenue = defaultdict(float)
+        day_revenue = defaultdict(float)
+        for vehicle_id, booking_start, booking_end, total_price in rows:
+            rate = float(total_price) / max((booking_end - booking_start).total_seconds(), 1)
+            clipped_start, clipped_end = max(booking_start, start), min(booking_end, end)
+            if clipped_end <= clipped_start:
+                continue
+            busy[vehicle_id] += (clipped_end - clipped_start).total_seconds()
+            revenue[vehicle_id] += rate * (clipped_end - clipped_start).total_seconds()
+            cursor = clipped_start
+            while cursor < clipped_end:
+                day = int((cursor - start).total_seconds() // DAY_SECONDS)
+                day_end = min(start + timedelta(seconds=(day + 1) * DAY_SECONDS), clipped_end)
+                day_revenue[day] += rate * (day_end - cursor).total_seconds()
+                cursor = day_end
+        return busy, revenue, day_revenue
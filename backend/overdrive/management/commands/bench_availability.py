@@ -0,0 +1,115 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from fleet_management.models import Vehicle
+from overdrive.models import Booking
+from overdrive.utils import available_vehicles
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Seed bookings and time the availability anti-join against per-vehicle overlap checks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Insert benchmark vehicles and bookings first')
+        parser.add_argument('--vehicles', type=int, default=10000)
+        parser.add_argument('--bookings', type=int, default=1000000)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--runs', type=int, default=20, help='Random windows to query')
+        parser.add_argument('--naive-sample', type=int, default=500,
+                            help='Vehicles checked one query at a time for the baseline')
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            if not settings.DEBUG:
+                self.stdout.write(self.style.ERROR('Seeding can only be run in DEBUG mode.'))
+                return
+            self.seed(options['vehicles'], options['bookings'], options['batch_size'])
+
+        vehicle_ids = list(Vehicle.objects.values_list('id', flat=True))
+        if not vehicle_ids:
+            self.stdout.write(self.style.ERROR('No vehicles found, run with --seed first.'))
+            return
+        window_start = timezone.now()
+        rng = random.Random(42)
+        windows = []
+        for _ in range(options['runs']):
+            start = window_start + timedelta(hours=rng.randint(0, 24 * 365))
+            windows.append((start, start + timedelta(hours=rng.randint(1, 72))))
+
+        anti_join = []
+        for start, end in windows:
+            began = time.perf_counter()
+            count = len(list(available_vehicles(Vehicle.objects.all(), start, end).values_list('id', flat=True)))
+            anti_join.append(time.perf_counter() - began)
+        self.report('anti-join (all vehicles)', anti_join, f'{count} free in last window')
+
+        sample = vehicle_ids[:options['naive_sample']]
+        naive = []
+        for start, end in windows[:5]:
+            began = time.perf_counter()
+            for vehicle_id in sample:
+                Booking.objects.filter(
+                    vehicle_id=vehicle_id,
+                    start_time__lt=end,
+                    end_time__gt=start,
+                    status__in=Booking.ACTIVE_STATUSES,
+                ).exists()
+            naive.append(time.perf_counter() - began)
+        self.report(f'per-vehicle exists() ({len(sample)} vehicles)', naive,
+                    f'~{statistics.mean(naive) * len(vehicle_ids) / len(sample):.2f}s extrapolated to all vehicles')
+
+        start, end = windows[0]
+        plan = available_vehicles(Vehicle.objects.all(), start, end).values('id').explain()
+        self.stdout.write(f'Query plan:\n{plan}')
+
+    def report(self, label, timings, note):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{label}: median {statistics.median(timings) * 1000:.1f} ms, '
+            f'p95 {p95 * 1000:.1f} ms ({note})'
+        )
+
+    def seed(self, vehicle_count, booking_count, batch_size):
+        rng = random.Random(7)
+        user, _ = User.objects.get_or_create(
+            email='bench@customer.com', defaults={'user_type': 'customer', 'is_active': True}
+        )
+        with transaction.atomic():
+            Vehicle.objects.bulk_create(
+                [Vehicle(name=f'Bench {i}', passenger_capacity=5, price_per_hour=100) for i in range(vehicle_count)],
+                batch_size=batch_size,
+            )
+        vehicle_ids = list(Vehicle.objects.values_list('id', flat=True))
+        statuses = [choice for choice, _ in Booking.STATUS_CHOICES]
+        origin = timezone.now() - timedelta(days=365)
+
+        created = 0
+        while created < booking_count:
+            batch = []
+            for _ in range(min(batch_size, booking_count - created)):
+                start = origin + timedelta(hours=rng.randint(0, 24 * 730))
+                batch.append(Booking(
+                    user=user,
+                    vehicle_id=rng.choice(vehicle_ids),
+                    start_time=start,
+                    end_time=start + timedelta(hours=rng.randint(1, 96)),
+                    total_price=100,
+                    status=rng.choice(statuses),
+                ))
+            # bulk_create skips Booking.save(), so overlap validation is not applied to seeded rows
+            with transaction.atomic():
+                Booking.objects.bulk_create(batch)
+            created += len(batch)
+        with connection.cursor() as cursor:
+            if connection.vendor in ('sqlite', 'postgresql'):
+                cursor.execute('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f'Seeded {vehicle_count} vehicles and {created} bookings.'))
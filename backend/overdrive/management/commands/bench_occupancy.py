@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fleet_management.models import Vehicle
+from overdrive.models import Booking
+from overdrive.occupancy import OccupancyIndex
+
+
+class Command(BaseCommand):
+    help = 'Time the occupancy index against ORM queries for "is free" and "next free slot" lookups'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookups', type=int, default=5000)
+        parser.add_argument('--vehicles', type=int, default=500, help='Distinct vehicles looked up')
+
+    def handle(self, *args, **options):
+        # Seed with `bench_availability --seed` first
+        vehicle_ids = list(Vehicle.objects.order_by('?').values_list('id', flat=True)[:options['vehicles']])
+        if not vehicle_ids:
+            self.stdout.write(self.style.ERROR('No vehicles found, seed with bench_availability --seed first.'))
+            return
+
+        rng = random.Random(42)
+        now = timezone.now()
+        lookups = []
+        for _ in range(options['lookups']):
+            start = now + timedelta(hours=rng.randint(-24 * 365, 24 * 365))
+            lookups.append((rng.choice(vehicle_ids), start, start + timedelta(hours=rng.randint(1, 72))))
+
+        orm = self.time_lookups(lookups, lambda vehicle_id, start, end: not Booking.objects.filter(
+            vehicle_id=vehicle_id, status__in=Booking.ACTIVE_STATUSES, start_time__lt=end, end_time__gt=start,
+        ).exists())
+
+        index = OccupancyIndex(max_vehicles=len(vehicle_ids))
+        began = time.perf_counter()
+        for vehicle_id in vehicle_ids:
+            index.get(vehicle_id)
+        warm = time.perf_counter() - began
+        indexed = self.time_lookups(lookups, index.is_free)
+
+        mismatches = sum(
+            index.is_free(vehicle_id, start, end) != (not Booking.objects.filter(
+                vehicle_id=vehicle_id, status__in=Booking.ACTIVE_STATUSES, start_time__lt=end, end_time__gt=start,
+            ).exists())
+            for vehicle_id, start, end in lookups[:200]
+        )
+        self.report('is_free via ORM exists()', orm)
+        self.report(f'is_free via index (warmed {len(vehicle_ids)} vehicles in {warm * 1000:.0f} ms)', indexed)
+
+        duration = timedelta(hours=24)
+        orm_next = self.time_lookups(lookups[:500], lambda vehicle_id, start, end: self.orm_next_free(
+            vehicle_id, start, duration))
+        index_next = self.time_lookups(lookups[:500], lambda vehicle_id, start, end: index.next_free(
+            vehicle_id, start, duration))
+        self.report('next free 24h slot via ORM', orm_next)
+        self.report('next free 24h slot via index', index_next)
+        self.stdout.write(f'{mismatches} mismatches between index and database in 200 checks')
+
+    def orm_next_free(self, vehicle_id, after, duration):
+        # What a caller without the index does: walk the active bookings from the database
+        candidate = after
+        for start, end in Booking.objects.filter(
+            vehicle_id=vehicle_id, status__in=Booking.ACTIVE_STATUSES, end_time__gt=after,
+        ).order_by('start_time').values_list('start_time', 'end_time').iterator():
+            if start >= candidate + duration:
+                break
+            candidate = max(candidate, end)
+        return candidate
+
+    def time_lookups(self, lookups, func):
+        timings = []
+        for vehicle_id, start, end in lookups:
+            began = time.perf_counter()
+            func(vehicle_id, start, end)
+            timings.append(time.perf_counter() - began)
+        return timings
+
+    def report(self, label, timings):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(
+            f'{label}: median {statistics.median(timings) * 1e6:.1f} us, p95 {p95 * 1e6:.1f} us, '
+            f'total {sum(timings) * 1000:.0f} ms'
+        )
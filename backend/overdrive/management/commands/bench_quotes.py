@@ -0,0 +1,94 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from fleet_management.models import Vehicle
+from overdrive.pricing import PricingPolicy, quote_vehicles
+from overdrive.views import QuoteAPI
+
+
+class Command(BaseCommand):
+    help = 'Time batch price quotes for many vehicles against pricing them one at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', action='store_true', help='Insert benchmark vehicles first')
+        parser.add_argument('--vehicles', type=int, default=10000, help='Vehicles priced per quote')
+        parser.add_argument('--runs', type=int, default=20)
+
+    def handle(self, *args, **options):
+        if options['seed']:
+            if not settings.DEBUG:
+                self.stdout.write(self.style.ERROR('Seeding can only be run in DEBUG mode.'))
+                return
+            self.seed(options['vehicles'])
+
+        vehicle_ids = list(Vehicle.objects.values_list('id', flat=True)[:options['vehicles']])
+        if not vehicle_ids:
+            self.stdout.write(self.style.ERROR('No vehicles found, run with --seed first.'))
+            return
+
+        rng = random.Random(42)
+        policy = PricingPolicy(billing_increment_minutes=15, minimum_hours=1, daily_cap_hours=8)
+        now = timezone.now()
+        windows = []
+        for _ in range(options['runs']):
+            start = now + timedelta(minutes=rng.randint(0, 60 * 24 * 365))
+            windows.append((start, start + timedelta(minutes=rng.randint(30, 60 * 24 * 14))))
+
+        batched = []
+        for start, end in windows:
+            began = time.perf_counter()
+            quote_vehicles(vehicle_ids, start, end, policy=policy)
+            batched.append(time.perf_counter() - began)
+        self.report(f'quote_vehicles ({len(vehicle_ids)} vehicles)', batched)
+
+        factory = APIRequestFactory()
+        view = QuoteAPI.as_view()
+        api = []
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for start, end in windows:
+                request = factory.post('/api/quotes/', {
+                    'start_time': start.isoformat(), 'end_time': end.isoformat(), 'vehicle_ids': vehicle_ids,
+                }, format='json')
+                began = time.perf_counter()
+                view(request).render()
+                api.append(time.perf_counter() - began)
+        self.report(f'POST /api/quotes/ ({len(vehicle_ids)} vehicles)', api)
+
+        # Baseline: the pre-engine approach, one vehicle fetch and float hours per price
+        sample = vehicle_ids[:500]
+        naive = []
+        for start, end in windows[:5]:
+            began = time.perf_counter()
+            for vehicle_id in sample:
+                vehicle = Vehicle.objects.get(id=vehicle_id)
+                Decimal((end - start).total_seconds() / 3600) * vehicle.price_per_hour
+            naive.append(time.perf_counter() - began)
+        self.report(f'per-vehicle get() ({len(sample)} vehicles)', naive,
+                    f'~{statistics.mean(naive) * len(vehicle_ids) / len(sample) * 1000:.0f} ms extrapolated')
+
+    def report(self, label, timings, note=None):
+        timings = sorted(timings)
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        line = f'{label}: median {statistics.median(timings) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms'
+        self.stdout.write(f'{line} ({note})' if note else line)
+
+    def seed(self, vehicle_count):
+        rng = random.Random(7)
+        with transaction.atomic():
+            Vehicle.objects.bulk_create(
+                [
+                    Vehicle(name=f'Quote bench {i}', passenger_capacity=5,
+                            price_per_hour=Decimal(rng.randint(5000, 90000)) / 100)
+                    for i in range(vehicle_count)
+                ],
+                batch_size=5000,
+            )
+        self.stdout.write(self.style.SUCCESS(f'Seeded {vehicle_count} vehicles.'))
@@ -0,0 +1,20 @@
+import time
+from django.core.management.base import BaseCommand
+from overdrive.expiry import expire_requests
+
+
+class Command(BaseCommand):
+    help = 'Cancel requested bookings past BOOKING_REQUEST_TTL or their start time'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Keep running and sweep every this many seconds instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_requests(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Expired {expired} booking requests.'))
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+import json
 from overdrive.models import Booking
 from fleet_management.models import Car, Manufacturer, Owner, Vehicle
 from datetime import datetime
@@ -101,13 +102,11 @@ class Command(BaseCommand):
             ]
 
             # Insert owners
-            for owner in owners:
-                user_owner = User.objects.get(id=owner['user_id'])
-                owner['user'] = user_owner
-                Owner.objects.create(
-                    user = owner['user'],
-                    name = owner['name']
-                )
+            users_by_id = User.objects.in_bulk([owner['user_id'] for owner in owners])
+            Owner.objects.bulk_create([
+                Owner(user=users_by_id[owner['user_id']], name=owner['name'])
+                for owner in owners
+            ])
             self.stdout.write(self.style.SUCCESS('Inserted owners.'))
 
             # Manufacturer data
@@ -118,9 +117,8 @@ class Command(BaseCommand):
                 {"name": "Chevrolet", "country": "Philippines"},
             ]
     
-            # Insert cars
-            for manufacturer in manufacturers:
-                Manufacturer.objects.create(**manufacturer)
+            # Insert manufacturers
+            Manufacturer.objects.bulk_create([Manufacturer(**manufacturer) for manufacturer in manufacturers])
             self.stdout.write(self.style.SUCCESS('Inserted manufacturers.'))
             
             # Cars data
@@ -144,11 +142,12 @@ class Command(BaseCommand):
                 },
             ]
     
-            # Insert cars
+            # Insert cars, resolving manufacturers and owners from one lookup each
+            manufacturers_by_id = Manufacturer.objects.in_bulk()
+            owners_by_id = Owner.objects.in_bulk()
             for car in cars:
-                manufacturer = Manufacturer.objects.get(id=car['make'])
-                car['make'] = manufacturer
-                owner = Owner.objects.get(id=car['owner_id'])
+                car['make'] = manufacturers_by_id[car['make']]
+                owner = owners_by_id[car['owner_id']]
                 car['owner'] = owner
                 car['name'] = owner.name
                 image_filename = car['image_filename']
@@ -159,7 +158,7 @@ class Command(BaseCommand):
                     model=car['model'],
                     year=car['year'],
                     price_per_hour=car['price_per_hour'],
-                    location=self.legazpi_geojson,
+                    location=json.loads(self.legazpi_geojson),
                     is_available=car['is_available'],
                     owner=car['owner'],
                     name=car['name'],
@@ -182,12 +181,12 @@ class Command(BaseCommand):
                  "end_time": timezone.make_aware(datetime(2025, 3, 1, 16, 0)), "user": 2, "total_price": 1200},
             ]
             # Insert bookings
+            vehicles_by_id = Vehicle.objects.in_bulk([booking['vehicle'] for booking in bookings])
+            booking_users_by_id = User.objects.in_bulk([booking['user'] for booking in bookings])
             for booking in bookings:
-                # Assuming car_id is a foreign key to Car model
-                vehicle = Vehicle.objects.get(id=booking['vehicle'])
-                booking_user = User.objects.get(id=booking['user'])
-                Booking.objects.create(vehicle=vehicle, start_time=booking['start_time'], end_time=booking['end_time'], 
-                                       user=booking_user, total_price=booking['total_price'])
+                Booking.objects.create(vehicle=vehicles_by_id[booking['vehicle']], start_time=booking['start_time'],
+                                       end_time=booking['end_time'], user=booking_users_by_id[booking['user']],
+                                       total_price=booking['total_price'])
             self.stdout.write(self.style.SUCCESS('Inserted bookings.'))
             # Output success message
             self.stdout.write(self.style.SUCCESS('Successfully inserted sample data'))
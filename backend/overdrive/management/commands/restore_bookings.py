@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from overdrive.archive import restore_bookings
+
+
+class Command(BaseCommand):
+    help = 'Move archived bookings, with their logs and payments, back to the live tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument('booking_ids', nargs='+', type=int)
+
+    def handle(self, *args, **options):
+        restored = restore_bookings(options['booking_ids'])
+        missing = sorted(set(options['booking_ids']) - set(restored))
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Not in the archive: {", ".join(map(str, missing))}'))
+        self.stdout.write(self.style.SUCCESS(f'Restored {len(restored)} bookings.'))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 # from django.contrib.auth.models import User
@@ -7,6 +8,7 @@ import datetime
 from django.utils.translation import gettext_lazy as _
 from rest_framework.exceptions import ValidationError
 from fleet_management.models import Vehicle
+from .locks import vehicle_lock
 
 
 User = get_user_model()
@@ -36,21 +38,37 @@ class Booking(models.Model):
         default='requested',
     )
 
+    # Bookings in these states hold the vehicle for their time window
+    ACTIVE_STATUSES = ["rented", "confirmed", "driving"]
+
     def clean(self):
         # Prevent overlapping bookings
+        from .occupancy import get_occupancy_index
+        index = get_occupancy_index()
+        # With the occupancy index a busy vehicle is refused without a query; a booking canceled by
+        # another process is only seen once the vehicle is reloaded (BOOKING_OCCUPANCY_TTL)
+        if index is not None and not index.is_free(self.vehicle_id, self.start_time, self.end_time, exclude=self.id):
+            raise ValidationError("This vehicle is already booked during this time.")
+
         overlapping_bookings = Booking.objects.filter(
             vehicle=self.vehicle,
             start_time__lt=self.end_time,
             end_time__gt=self.start_time,
-            status__in=["rented", "confirmed", "driving"]  # Only active bookings count
+            status__in=self.ACTIVE_STATUSES  # Only active bookings count
         ).exclude(id=self.id)  # Exclude self in case of updates
 
+        # A free answer is confirmed by the database before the write commits: other processes'
+        # bookings reach the index only on reload, so one that disagrees is dropped
         if overlapping_bookings.exists():
+            if index is not None:
+                index.invalidate(self.vehicle_id)
             raise ValidationError("This vehicle is already booked during this time.")
 
     def save(self, *args, **kwargs):
-        self.clean()  # Validate before saving
-        super().save(*args, **kwargs)
+        # The overlap check and the write must not interleave with another booking for this vehicle
+        with vehicle_lock(self.vehicle_id):
+            self.clean()  # Validate before saving
+            super().save(*args, **kwargs)
 
         # Do not update vehicle availability, it must be confirmed manually or automatically if payment is via online
         # self.vehicle.is_available = False  # Assume booked
@@ -61,6 +79,13 @@ class Booking(models.Model):
 
     class Meta:
         verbose_name_plural = "Bookings"
+        indexes = [
+            # Serves overlap checks and the availability anti-join
+            models.Index(fields=['vehicle', 'status', 'start_time', 'end_time'], name='booking_vehicle_window_idx'),
+            # Let the request sweeper (overdrive.expiry) find stale requests by age or by start time
+            models.Index(fields=['status', 'created_at'], name='booking_status_created_idx'),
+            models.Index(fields=['status', 'start_time'], name='booking_status_start_idx'),
+        ]
 
 
 class BookingStatusLog(models.Model):
@@ -78,3 +103,55 @@ class BookingStatusLog(models.Model):
         verbose_name = "Booking Status Log"
         verbose_name_plural = "Booking Status Logs"
         ordering = ['-created_at']  # Most recent first
+
+
+class ArchivedBooking(models.Model):
+    """A finished Booking moved out of the hot table by overdrive.archive, keeping its id."""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    vehicle = models.ForeignKey(Vehicle, on_delete=models.CASCADE, related_name='+')
+    start_time = models.DateTimeField()
+    end_time = models.DateTimeField()
+    total_price = models.DecimalField(max_digits=10, decimal_places=2)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Archived booking for {self.vehicle} from {self.start_time} to {self.end_time}"
+
+    class Meta:
+        verbose_name_plural = "Archived bookings"
+
+
+class ArchivedBookingStatusLog(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE, related_name='status_logs')
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    created_at = models.DateTimeField()
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class IdempotencyKey(models.Model):
+    """First response to a POST sent with an Idempotency-Key header, replayed for retries."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    scope = models.CharField(max_length=32)  # Which endpoint the key was used on
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)  # None while the first request is running
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(default=timezone.now)  # When the request producing the response took the key
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'scope', 'key'], name='idempotency_key_unique'),
+        ]
+        indexes = [
+            # Purging expired keys
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
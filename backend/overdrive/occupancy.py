@@ -0,0 +1,157 @@
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict
+from django.conf import settings
+from django.db import transaction
+from .models import Booking
+
+
+class VehicleOccupancy:
+    """
+    Active bookings of one vehicle as merged, sorted [start, end) intervals.
+
+    Bookings are kept individually so one can be removed again; the merged
+    starts/ends arrays are rebuilt on every change (bookings per vehicle are
+    few) and answer queries with a binary search.
+    """
+
+    def __init__(self, bookings=()):
+        self.bookings = {booking_id: (start, end) for booking_id, start, end in bookings}
+        self.loaded_at = time.monotonic()
+        self.rebuild()
+
+    def rebuild(self):
+        starts, ends = [], []
+        for start, end in sorted(self.bookings.values()):
+            if ends and start <= ends[-1]:
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        # Swapped in one assignment so concurrent readers never see mismatched arrays
+        self.intervals = (starts, ends)
+
+    def set(self, booking_id, start, end):
+        self.bookings[booking_id] = (start, end)
+        self.rebuild()
+
+    def discard(self, booking_id):
+        if self.bookings.pop(booking_id, None) is not None:
+            self.rebuild()
+
+    def is_free(self, start, end, exclude=None):
+        if exclude in self.bookings:
+            # Checking a booking against the others; rare enough to walk them
+            return all(end <= other_start or other_end <= start
+                       for booking_id, (other_start, other_end) in self.bookings.items() if booking_id != exclude)
+        starts, ends = self.intervals
+        # First busy interval that ends after start; free if it begins at or after end
+        i = bisect_right(ends, start)
+        return i == len(starts) or starts[i] >= end
+
+    def next_free(self, after, duration=None):
+        """
+        Earliest time >= after at which the vehicle is free for duration.
+
+        Without a duration this is a single binary search; with one, busy
+        intervals are walked until a gap is wide enough.
+        """
+        starts, ends = self.intervals
+        i = bisect_right(ends, after)
+        candidate = after
+        while i < len(starts) and starts[i] <= candidate:
+            candidate = ends[i]
+            i += 1
+        if duration is not None:
+            while i < len(starts) and starts[i] < candidate + duration:
+                candidate = ends[i]
+                i += 1
+        return candidate
+
+
+class OccupancyIndex:
+    """
+    Process-local occupancy of recently queried vehicles.
+
+    Vehicles are loaded from the database on first use and evicted least
+    recently used beyond max_vehicles, or reloaded after ttl seconds so
+    bookings written by other processes are picked up. Changes made in this
+    process are applied on commit through record().
+    """
+
+    def __init__(self, max_vehicles=10000, ttl=300):
+        self.max_vehicles = max_vehicles
+        self.ttl = ttl
+        self.vehicles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, vehicle_id):
+        with self.lock:
+            occupancy = self.vehicles.get(vehicle_id)
+            if occupancy is not None and time.monotonic() - occupancy.loaded_at < self.ttl:
+                self.vehicles.move_to_end(vehicle_id)
+                return occupancy
+        occupancy = VehicleOccupancy(Booking.objects.filter(
+            vehicle_id=vehicle_id, status__in=Booking.ACTIVE_STATUSES,
+        ).values_list('id', 'start_time', 'end_time'))
+        with self.lock:
+            self.vehicles[vehicle_id] = occupancy
+            self.vehicles.move_to_end(vehicle_id)
+            while len(self.vehicles) > self.max_vehicles:
+                self.vehicles.popitem(last=False)
+        return occupancy
+
+    def record(self, booking_id, vehicle_id, start, end, status):
+        # Vehicles nobody asked about are loaded fresh on first use instead
+        with self.lock:
+            occupancy = self.vehicles.get(vehicle_id)
+            if occupancy is None:
+                return
+            if status in Booking.ACTIVE_STATUSES:
+                occupancy.set(booking_id, start, end)
+            else:
+                occupancy.discard(booking_id)
+
+    def invalidate(self, vehicle_id=None):
+        with self.lock:
+            if vehicle_id is None:
+                self.vehicles.clear()
+            else:
+                self.vehicles.pop(vehicle_id, None)
+
+    def is_free(self, vehicle_id, start, end, exclude=None):
+        return self.get(vehicle_id).is_free(start, end, exclude)
+
+    def next_free(self, vehicle_id, after, duration=None):
+        return self.get(vehicle_id).next_free(after, duration)
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_occupancy_index():
+    """The shared index, or None unless settings.BOOKING_OCCUPANCY_INDEX is enabled."""
+    global _index
+    if not getattr(settings, 'BOOKING_OCCUPANCY_INDEX', False):
+        return None
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = OccupancyIndex(
+                    max_vehicles=getattr(settings, 'BOOKING_OCCUPANCY_MAX_VEHICLES', 10000),
+                    ttl=getattr(settings, 'BOOKING_OCCUPANCY_TTL', 300),
+                )
+    return _index
+
+
+def booking_changed(booking, deleted=False):
+    """Apply a booking write to the index once it commits; rolled back writes never reach it."""
+    index = get_occupancy_index()
+    if index is None:
+        return
+    booking_id, vehicle_id = booking.pk, booking.vehicle_id
+    start, end = booking.start_time, booking.end_time
+    status = None if deleted else booking.status
+    transaction.on_commit(lambda: index.record(booking_id, vehicle_id, start, end, status))
@@ -0,0 +1,84 @@
+from datetime import timedelta
+from decimal import Decimal, ROUND_CEILING, ROUND_HALF_UP
+from django.conf import settings
+from fleet_management.models import Vehicle
+
+CENT = Decimal('0.01')
+SECONDS_PER_HOUR = 3600
+SECONDS_PER_DAY = 86400
+
+
+class PricingPolicy:
+    """
+    How a rental window is turned into a price.
+
+    billing_increment_minutes: round the duration up to this many minutes (None bills to the second)
+    minimum_hours: never bill less than this many hours
+    daily_cap_hours: charge at most this many hours per 24 hour block
+    """
+
+    def __init__(self, billing_increment_minutes=None, minimum_hours=None, daily_cap_hours=None,
+                 rounding=ROUND_HALF_UP):
+        self.billing_increment_minutes = billing_increment_minutes
+        self.minimum_hours = minimum_hours
+        self.daily_cap_hours = daily_cap_hours
+        self.rounding = rounding
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**getattr(settings, 'BOOKING_PRICING', {}))
+
+
+class BillableWindow:
+    """The policy applied to one time window, shared by every vehicle quoted for it."""
+
+    def __init__(self, start_time, end_time, policy):
+        if end_time <= start_time:
+            raise ValueError("end_time must be after start_time")
+        # Integer microseconds keep the arithmetic exact; floats never enter the calculation
+        seconds = Decimal((end_time - start_time) // timedelta(microseconds=1)) / Decimal(1000000)
+        if policy.billing_increment_minutes:
+            increment = policy.billing_increment_minutes * 60
+            seconds = (seconds / increment).to_integral_value(ROUND_CEILING) * increment
+        if policy.minimum_hours:
+            seconds = max(seconds, Decimal(policy.minimum_hours) * SECONDS_PER_HOUR)
+
+        self.policy = policy
+        self.billable_hours = seconds / SECONDS_PER_HOUR
+        if policy.daily_cap_hours:
+            days, remainder = divmod(seconds, SECONDS_PER_DAY)
+            cap = Decimal(policy.daily_cap_hours)
+            self.charged_hours = days * min(cap, Decimal(24)) + min(remainder / SECONDS_PER_HOUR, cap)
+        else:
+            self.charged_hours = self.billable_hours
+
+    def hours(self, value):
+        return value.quantize(Decimal('0.0001'), rounding=self.policy.rounding)
+
+    def price(self, price_per_hour):
+        return (self.charged_hours * price_per_hour).quantize(CENT, rounding=self.policy.rounding)
+
+
+def quote_price(price_per_hour, start_time, end_time, policy=None):
+    return BillableWindow(start_time, end_time, policy or PricingPolicy.from_settings()).price(price_per_hour)
+
+
+def quote_vehicles(vehicle_ids, start_time, end_time, policy=None):
+    """
+    Price many vehicles for one window with a single query.
+
+    Returns (window, quotes, missing_ids), quotes in the order the ids were
+    given. The billable and charged hours are the same for every vehicle and
+    live on the returned BillableWindow.
+    """
+    window = BillableWindow(start_time, end_time, policy or PricingPolicy.from_settings())
+    rates = dict(Vehicle.objects.filter(pk__in=vehicle_ids).values_list('pk', 'price_per_hour'))
+    quotes = []
+    missing = []
+    for vehicle_id in vehicle_ids:
+        rate = rates.get(vehicle_id)
+        if rate is None:
+            missing.append(vehicle_id)
+            continue
+        quotes.append({'vehicle_id': vehicle_id, 'price_per_hour': rate, 'total_price': window.price(rate)})
+    return window, quotes, missing
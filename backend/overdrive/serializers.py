@@ -1,5 +1,8 @@
+import datetime
+from django.utils import timezone
 from rest_framework import serializers
 from .models import Booking
+from .states import OWNER_TARGET_STATUSES
 from fleet_management.models import Vehicle
 from django.contrib.auth import get_user_model
 
@@ -39,3 +42,56 @@ class BookingSerializer(serializers.ModelSerializer):
     class Meta:
         model = Booking
         fields = ['id', 'user', 'user_id', 'vehicle', 'vehicle_id', 'start_time', 'end_time', 'total_price', 'status']
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('user', 'vehicle')
+
+
+MAX_QUOTE_VEHICLES = 10000
+
+
+class QuoteRequestSerializer(serializers.Serializer):
+    start_time = serializers.DateTimeField()
+    end_time = serializers.DateTimeField()
+    vehicle_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_QUOTE_VEHICLES
+    )
+
+    def validate(self, data):
+        if data['end_time'] <= data['start_time']:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        # Duplicates would only repeat work and rows in the response
+        data['vehicle_ids'] = list(dict.fromkeys(data['vehicle_ids']))
+        return data
+
+
+
+MAX_ANALYTICS_DAYS = 366
+
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    # Defaults to the 30 days up to now
+    start_time = serializers.DateTimeField(required=False)
+    end_time = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        end = data.setdefault('end_time', timezone.now())
+        start = data.setdefault('start_time', end - datetime.timedelta(days=30))
+        if end <= start:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        if end - start > datetime.timedelta(days=MAX_ANALYTICS_DAYS):
+            raise serializers.ValidationError(f"The window can span at most {MAX_ANALYTICS_DAYS} days.")
+        return data
+
+
+MAX_BULK_TRANSITIONS = 500
+
+
+class BookingTransitionSerializer(serializers.Serializer):
+    booking_id = serializers.IntegerField(min_value=1)
+    status = serializers.ChoiceField(choices=OWNER_TARGET_STATUSES)
+
+
+class BulkBookingTransitionSerializer(serializers.Serializer):
+    transitions = BookingTransitionSerializer(many=True, allow_empty=False, max_length=MAX_BULK_TRANSITIONS)
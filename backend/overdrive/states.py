@@ -0,0 +1,88 @@
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from .models import Booking
+
+CUSTOMER = 'customer'
+OWNER = 'owner'
+STAFF = 'staff'
+SYSTEM = 'system'  # Scheduled jobs such as the request sweeper in overdrive.expiry and payment.webhooks
+
+# Legal booking transitions: (from, to, actors allowed to trigger it, vehicle is_available afterwards).
+# None leaves the vehicle's availability alone. Staff may trigger every transition.
+TRANSITIONS = [
+    ('requested', 'confirmed', {OWNER, SYSTEM}, False),  # The system confirms once an online payment completes
+    ('requested', 'canceled', {CUSTOMER, OWNER, SYSTEM}, True),
+    ('confirmed', 'canceled', {CUSTOMER, OWNER}, True),
+    ('confirmed', 'rented', {OWNER}, None),
+    ('rented', 'driving', {CUSTOMER}, None),
+    ('rented', 'returned', {OWNER}, True),
+    ('driving', 'returned', {OWNER}, True),
+]
+
+
+class Transition:
+    __slots__ = ('source', 'target', 'actors', 'is_available', 'activates')
+
+    def __init__(self, source, target, actors, is_available):
+        self.source = source
+        self.target = target
+        self.actors = frozenset(actors) | {STAFF}
+        self.is_available = is_available
+        # Entering the active set is the only move that can create an overlap
+        self.activates = target in Booking.ACTIVE_STATUSES and source not in Booking.ACTIVE_STATUSES
+
+
+def _compile(transitions):
+    statuses = {status for status, _ in Booking.STATUS_CHOICES}
+    table = {}
+    for source, target, actors, is_available in transitions:
+        if source not in statuses or target not in statuses:
+            raise ValueError(f"Unknown booking status in transition {source} -> {target}")
+        table[source, target] = Transition(source, target, actors, is_available)
+    target_actors = {}
+    for transition in table.values():
+        target_actors[transition.target] = target_actors.get(transition.target, frozenset()) | transition.actors
+    return table, target_actors
+
+
+_TABLE, _TARGET_ACTORS = _compile(TRANSITIONS)
+
+# Statuses a vehicle owner can move bookings to
+OWNER_TARGET_STATUSES = sorted(target for target, actors in _TARGET_ACTORS.items() if OWNER in actors)
+
+
+def get_transition(source, target):
+    return _TABLE.get((source, target))
+
+
+def booking_actors(booking, principal):
+    """The roles the request's principal plays for booking; booking.vehicle.owner must be loaded."""
+    actors = set()
+    if principal.is_staff_member:
+        actors.add(STAFF)
+    if booking.user_id == principal.id:
+        actors.add(CUSTOMER)
+    owner = booking.vehicle.owner
+    if owner is not None and owner.user_id == principal.id:
+        actors.add(OWNER)
+    return actors
+
+
+def check_transition(booking, target, actors, denied=None):
+    """
+    Return the Transition moving booking to target, or raise.
+
+    PermissionDenied when none of actors may move bookings to target, with
+    denied as its message if given; ValidationError when the move is not
+    legal from the booking's status. Returns None when the booking already
+    has the target status.
+    """
+    if not actors & _TARGET_ACTORS.get(target, frozenset()):
+        raise PermissionDenied(denied or f"You do not have permission to mark this booking as {target}.")
+    if booking.status == target:
+        return None
+    transition = _TABLE.get((booking.status, target))
+    if transition is None:
+        raise ValidationError({"detail": f"A {booking.status} booking cannot be marked as {target}."})
+    if not actors & transition.actors:
+        raise PermissionDenied(f"You do not have permission to mark a {booking.status} booking as {target}.")
+    return transition
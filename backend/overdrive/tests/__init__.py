@@ -2,4 +2,12 @@ from .test_models import *
 from .test_views import *
 from .test_serializers import *
 from .test_tokens import *
+from .test_queries import *
+from .test_pricing import *
+from .test_concurrency import *
+from .test_occupancy import *
+from .test_idempotency import *
+from .test_expiry import *
+from .test_archive import *
+from .test_analytics import *
 # ... other test modules
\ No newline at end of file
@@ -0,0 +1,132 @@
+import datetime
+import random
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+import numpy as np
+from fleet_management.models import Owner, Vehicle
+from overdrive.analytics import IDLE_HOUR_BINS, BookingColumns, compute_usage
+from overdrive.models import Booking
+
+User = get_user_model()
+
+
+def columns(bookings):
+    vehicle_ids, starts, ends, prices = zip(*bookings) if bookings else ((), (), (), ())
+    return BookingColumns(np.array(vehicle_ids, dtype=np.int64),
+                          np.array([int(value.timestamp()) for value in starts], dtype='datetime64[s]'),
+                          np.array([int(value.timestamp()) for value in ends], dtype='datetime64[s]'),
+                          np.array(prices, dtype=np.float64))
+
+
+class ComputeUsageTest(TestCase):
+    def setUp(self):
+        self.t0 = timezone.make_aware(datetime.datetime(2025, 5, 1))
+
+    def at(self, hours):
+        return self.t0 + datetime.timedelta(hours=hours)
+
+    def test_clips_to_window_and_merges_overlaps(self):
+        usage = compute_usage(columns([
+            (1, self.at(-12), self.at(12), 240),  # Half inside the window
+            (1, self.at(20), self.at(30), 100),
+            (1, self.at(25), self.at(34), 90),  # Overlaps the previous one
+            (2, self.at(47), self.at(60), 130),  # Runs past the window end
+            (9, self.at(0), self.at(10), 100),  # Not one of the vehicles asked for
+            (10 ** 12, self.at(0), self.at(10), 100),  # Too sparse for a lookup table
+        ]), [1, 2, 3], self.at(0), self.at(48))
+
+        self.assertEqual(list(usage.busy_seconds / 3600), [26, 1, 0])
+        self.assertEqual([round(value, 4) for value in usage.utilization], [round(26 / 48 * 100, 4), round(100 / 48, 4), 0])
+        self.assertEqual([round(value, 6) for value in usage.revenue], [120 + 100 + 90, 10, 0])
+        # Day one: half of the first booking and 4 of 10 hours of the second; day two: the rest and one hour on vehicle 2
+        self.assertEqual([round(value, 6) for value in usage.day_revenue], [160, 60 + 90 + 10])
+        # Idle: vehicle 1 for 8h then 14h, vehicle 2 for 47h, vehicle 3 for the whole 48h window
+        expected = np.zeros(len(IDLE_HOUR_BINS), dtype=int)
+        for hours in (8, 14, 47, 48):
+            expected[np.searchsorted(IDLE_HOUR_BINS, hours, side='right') - 1] += 1
+        self.assertEqual(list(usage.idle_counts), list(expected))
+
+    def test_matches_row_by_row_computation(self):
+        rng = random.Random(3)
+        bookings = []
+        for _ in range(300):
+            start = self.at(rng.randint(-100, 24 * 10))
+            bookings.append((rng.randint(1, 8), start, start + datetime.timedelta(hours=rng.randint(1, 96)),
+                             rng.randint(10, 500)))
+        window_start, window_end = self.at(0), self.at(24 * 7 + 5)
+        usage = compute_usage(columns(bookings), range(1, 9), window_start, window_end)
+
+        for position, vehicle_id in enumerate(range(1, 9)):
+            hours = set()
+            revenue = 0
+            for booking_vehicle, start, end, price in bookings:
+                if booking_vehicle != vehicle_id:
+                    continue
+                clipped_start, clipped_end = max(start, window_start), min(end, window_end)
+                for hour in range(int((clipped_start - self.t0).total_seconds() // 3600),
+                                  int((clipped_end - self.t0).total_seconds() // 3600)):
+                    hours.add(hour)
+                if clipped_end > clipped_start:
+                    revenue += price * (clipped_end - clipped_start) / (end - start)
+            self.assertEqual(usage.busy_seconds[position], len(hours) * 3600)
+            self.assertAlmostEqual(usage.revenue[position], revenue, places=6)
+        self.assertAlmostEqual(usage.day_revenue.sum(), usage.revenue.sum(), places=6)
+        self.assertEqual(len(usage.day_revenue), 8)
+
+    def test_no_bookings(self):
+        usage = compute_usage(columns([]), [4], self.at(0), self.at(5))
+        self.assertEqual(list(usage.busy_seconds), [0])
+        self.assertEqual(list(usage.day_revenue), [0])
+        self.assertEqual(usage.idle_counts[np.searchsorted(IDLE_HOUR_BINS, 5, side='right') - 1], 1)
+
+
+class OwnerAnalyticsAPITest(APITestCase):
+    def setUp(self):
+        self.owner_user = User.objects.create_user(email='fleet@mail.com', password='testpass', user_type='car_owner')
+        self.owner_user.is_active = True
+        self.owner_user.save()
+        self.owner = Owner.objects.create(user=self.owner_user, name='Fleet')
+        self.customer = User.objects.create_user(email='rider@mail.com', password='testpass', user_type='customer')
+        self.customer.is_active = True
+        self.customer.save()
+        self.vehicle = Vehicle.objects.create(name='Van', passenger_capacity=8, price_per_hour=10, owner=self.owner)
+        other = Vehicle.objects.create(name='Other', passenger_capacity=4, price_per_hour=10)
+        self.t0 = timezone.make_aware(datetime.datetime(2025, 5, 1))
+        for vehicle, offset, hours, status_value in [
+            (self.vehicle, 2, 6, 'returned'), (self.vehicle, 30, 4, 'confirmed'),
+            (self.vehicle, 40, 4, 'canceled'), (other, 2, 6, 'returned'),
+        ]:
+            Booking.objects.create(user=self.customer, vehicle=vehicle, total_price=hours * 10, status=status_value,
+                                   start_time=self.t0 + datetime.timedelta(hours=offset),
+                                   end_time=self.t0 + datetime.timedelta(hours=offset + hours))
+        self.url = '/api/owners/me/analytics/'
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    def test_owner_analytics(self):
+        self.authenticate(self.owner_user)
+        response = self.client.get(self.url, {'start_time': '2025-05-01T00:00:00Z', 'end_time': '2025-05-03T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['vehicles'], [{
+            'vehicle_id': self.vehicle.id, 'name': 'Van', 'booked_hours': 10.0, 'utilization': round(10 / 48 * 100, 2),
+            'revenue': '100.00',
+        }])
+        self.assertEqual(response.data['revenue'], '100.00')
+        self.assertEqual([day['revenue'] for day in response.data['revenue_per_day']], ['60.00', '40.00'])
+        self.assertEqual(sum(bucket['count'] for bucket in response.data['idle_hours_histogram']), 3)
+
+    def test_window_validation_and_permissions(self):
+        self.authenticate(self.owner_user)
+        response = self.client.get(self.url, {'start_time': '2025-05-03T00:00:00Z', 'end_time': '2025-05-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {'start_time': '2023-01-01T00:00:00Z', 'end_time': '2025-05-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_200_OK)
+
+        self.authenticate(self.customer)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
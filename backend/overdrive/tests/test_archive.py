@@ -0,0 +1,131 @@
+import datetime
+from io import StringIO
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from fleet_management.models import Vehicle
+from overdrive.archive import PAYMENT_SUBTYPES, archive_bookings, archive_cutoff, restore_bookings, subtype_fields
+from overdrive.models import ArchivedBooking, ArchivedBookingStatusLog, Booking, BookingStatusLog
+from payment.models import (
+    ArchivedBookingPayment, ArchivedPayPalBookingPayment, ArchivedStripeBookingPayment, BookingPayment,
+)
+from payment.paypal_payment import PayPalBookingPayment
+from payment.stripe_payment import StripeBookingPayment
+
+User = get_user_model()
+
+
+class ArchiveMixin:
+    def setUp(self):
+        self.user = User.objects.create_user(email='archive@mail.com', password='testpass', user_type='customer')
+        self.user.is_active = True
+        self.user.save()
+        self.vehicle = Vehicle.objects.create(name='Archive', passenger_capacity=4, price_per_hour=10)
+        self.now = timezone.now()
+
+    def booking(self, days_ago, status='returned'):
+        start = self.now - datetime.timedelta(days=days_ago)
+        booking = Booking.objects.create(user=self.user, vehicle=self.vehicle, start_time=start,
+                                         end_time=start + datetime.timedelta(hours=2), total_price=20, status=status)
+        BookingStatusLog.objects.create(booking=booking, status=status, user=self.user, created_at=start)
+        BookingPayment.objects.create(booking=booking, amount=20, method='cash', status='completed')
+        Booking.objects.filter(pk=booking.pk).update(created_at=start, updated_at=start)
+        BookingPayment.objects.filter(booking=booking).update(created_at=start, updated_at=start)
+        return Booking.objects.get(pk=booking.pk)
+
+
+class ArchiveBookingsTest(ArchiveMixin, TestCase):
+    def test_moves_old_finished_bookings_with_their_rows(self):
+        old = [self.booking(400), self.booking(500, status='canceled'), self.booking(600)]
+        recent = self.booking(10)
+        old_confirmed = self.booking(400, status='confirmed')
+
+        self.assertEqual(archive_bookings(archive_cutoff(365, self.now), batch_size=2), 3)
+        self.assertEqual(set(Booking.objects.values_list('pk', flat=True)), {recent.pk, old_confirmed.pk})
+        self.assertEqual(set(ArchivedBooking.objects.values_list('pk', flat=True)), {booking.pk for booking in old})
+        self.assertEqual(ArchivedBookingStatusLog.objects.count(), 3)
+        self.assertEqual(ArchivedBookingPayment.objects.count(), 3)
+        self.assertEqual(BookingStatusLog.objects.count(), 2)
+        self.assertEqual(BookingPayment.objects.count(), 2)
+
+        archived = ArchivedBooking.objects.get(pk=old[0].pk)
+        self.assertEqual((archived.created_at, archived.updated_at, archived.status, archived.total_price),
+                         (old[0].created_at, old[0].updated_at, 'returned', old[0].total_price))
+
+    def test_restore_puts_rows_back_unchanged(self):
+        booking = self.booking(400)
+        payment = BookingPayment.objects.get(booking=booking)
+        archive_bookings(archive_cutoff(365, self.now))
+
+        out = StringIO()
+        call_command('restore_bookings', str(booking.pk), '999999', stdout=out)
+        self.assertIn('Restored 1 bookings.', out.getvalue())
+        self.assertIn('Not in the archive: 999999', out.getvalue())
+        restored = Booking.objects.get(pk=booking.pk)
+        self.assertEqual((restored.created_at, restored.updated_at, restored.status),
+                         (booking.created_at, booking.updated_at, booking.status))
+        restored_payment = BookingPayment.objects.get(booking=booking)
+        self.assertEqual((restored_payment.pk, restored_payment.created_at), (payment.pk, payment.created_at))
+        self.assertEqual(BookingStatusLog.objects.filter(booking=booking).count(), 1)
+        self.assertFalse(ArchivedBooking.objects.exists())
+        self.assertFalse(ArchivedBookingPayment.objects.exists())
+        self.assertEqual(restore_bookings([booking.pk]), [])
+
+    def test_provider_payments_keep_their_details(self):
+        booking = self.booking(400)
+        stripe = StripeBookingPayment.objects.create(booking=booking, amount=20, transaction_id='pi_1',
+                                                     status='completed', client_secret='"pi_1_secret"',
+                                                     capture_method='"automatic"')
+        paypal = PayPalBookingPayment.objects.create(booking=booking, amount=20, transaction_id='order-1',
+                                                     status='completed', order_id='order-1', paypal_request_id='req-1',
+                                                     payer={'email_address': 'payer@mail.com'},
+                                                     links=[{'rel': 'self', 'href': 'https://paypal/order-1'}])
+
+        self.assertEqual(archive_bookings(archive_cutoff(365, self.now)), 1)
+        self.assertFalse(StripeBookingPayment.objects.exists())
+        self.assertFalse(PayPalBookingPayment.objects.exists())
+        self.assertEqual(ArchivedStripeBookingPayment.objects.get().client_secret, '"pi_1_secret"')
+        self.assertEqual(ArchivedPayPalBookingPayment.objects.get(bookingpayment_ptr=paypal.pk).order_id, 'order-1')
+
+        restore_bookings([booking.pk])
+        restored_stripe = StripeBookingPayment.objects.get(pk=stripe.pk)
+        self.assertEqual(
+            (restored_stripe.transaction_id, restored_stripe.client_secret, restored_stripe.capture_method),
+            ('pi_1', '"pi_1_secret"', '"automatic"'))
+        restored_paypal = PayPalBookingPayment.objects.get(pk=paypal.pk)
+        self.assertEqual((restored_paypal.order_id, restored_paypal.paypal_request_id, restored_paypal.payer,
+                          restored_paypal.links, restored_paypal.payment_source),
+                         ('order-1', 'req-1', paypal.payer, paypal.links, None))
+        self.assertEqual(BookingPayment.objects.filter(booking=booking).count(), 3)
+        self.assertFalse(ArchivedStripeBookingPayment.objects.exists())
+        self.assertFalse(ArchivedPayPalBookingPayment.objects.exists())
+
+    def test_archive_subtypes_have_the_live_columns(self):
+        for live_model, archive_model in PAYMENT_SUBTYPES:
+            with self.subTest(live_model.__name__):
+                self.assertEqual(set(subtype_fields(live_model)),
+                                 {field.attname for field in archive_model._meta.concrete_fields})
+
+    def test_command_uses_configured_age(self):
+        self.booking(40)
+        out = StringIO()
+        with self.settings(BOOKING_ARCHIVE_AFTER_DAYS=30):
+            call_command('archive_bookings', stdout=out)
+        self.assertIn('Archived 1 bookings.', out.getvalue())
+
+
+class ArchivedBookingDetailTest(ArchiveMixin, APITestCase):
+    def test_detail_reads_through_to_archive(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        booking = self.booking(400)
+        live = self.client.get(f'/api/bookings/{booking.pk}/')
+        archive_bookings(archive_cutoff(365, self.now))
+
+        response = self.client.get(f'/api/bookings/{booking.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, live.data)
+        self.assertEqual(response['ETag'], live['ETag'])
+        self.assertEqual(self.client.get('/api/bookings/999999/').status_code, 404)
@@ -0,0 +1,87 @@
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TransactionTestCase
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from fleet_management.models import Vehicle
+from overdrive.locks import vehicle_lock
+from overdrive.models import Booking
+from overdrive.utils import update_booking_status
+
+User = get_user_model()
+
+THREADS = 8
+ATTEMPTS = 40
+
+
+class BookingConcurrencyTest(TransactionTestCase):
+    """Hammer one vehicle from many threads; at most one active booking may win each window."""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(email='stress@mail.com', password='testpass', user_type='customer')
+        self.vehicle = Vehicle.objects.create(name='Stress', passenger_capacity=4, price_per_hour=10)
+        self.start = timezone.now() + datetime.timedelta(days=3)
+
+    def run_threads(self, func, items):
+        barrier = threading.Barrier(THREADS)
+
+        def work(chunk):
+            barrier.wait()
+            outcomes = []
+            try:
+                for item in chunk:
+                    try:
+                        func(item)
+                        outcomes.append(True)
+                    except ValidationError:
+                        outcomes.append(False)
+            finally:
+                connection.close()
+            return outcomes
+
+        chunks = [items[i::THREADS] for i in range(THREADS)]
+        with ThreadPoolExecutor(max_workers=THREADS) as pool:
+            return [outcome for outcomes in pool.map(work, chunks) for outcome in outcomes]
+
+    def assertNoDoubleBooking(self):
+        active = list(Booking.objects.filter(vehicle=self.vehicle, status__in=Booking.ACTIVE_STATUSES)
+                      .order_by('start_time').values_list('start_time', 'end_time'))
+        for (_, previous_end), (start, _) in zip(active, active[1:]):
+            self.assertLessEqual(previous_end, start)
+        return active
+
+    def test_concurrent_active_bookings(self):
+        # Every attempt overlaps every other: windows shift by minutes but last two hours
+        def book(offset):
+            start = self.start + datetime.timedelta(minutes=offset)
+            Booking(user=self.customer, vehicle=self.vehicle, start_time=start,
+                    end_time=start + datetime.timedelta(hours=2), total_price=20, status='confirmed').save()
+
+        outcomes = self.run_threads(book, list(range(ATTEMPTS)))
+        self.assertEqual(outcomes.count(True), 1)
+        self.assertEqual(len(self.assertNoDoubleBooking()), 1)
+
+    def test_concurrent_confirmations(self):
+        bookings = [
+            Booking.objects.create(
+                user=self.customer, vehicle=self.vehicle,
+                start_time=self.start + datetime.timedelta(hours=i % 4),
+                end_time=self.start + datetime.timedelta(hours=i % 4 + 2), total_price=20,
+            )
+            for i in range(ATTEMPTS)
+        ]
+        outcomes = self.run_threads(lambda booking: update_booking_status(booking, 'confirmed'), bookings)
+        active = self.assertNoDoubleBooking()
+        # Windows start at hours 0-3 and last two hours, so at most two can coexist
+        self.assertEqual(outcomes.count(True), len(active))
+        self.assertIn(len(active), (1, 2))
+
+    def test_lock_is_reentrant(self):
+        with vehicle_lock(self.vehicle.pk):
+            with vehicle_lock(self.vehicle.pk):
+                Booking.objects.create(user=self.customer, vehicle=self.vehicle, start_time=self.start,
+                                       end_time=self.start + datetime.timedelta(hours=1), total_price=10)
+        self.assertEqual(Booking.objects.count(), 1)
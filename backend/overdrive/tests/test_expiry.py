@@ -0,0 +1,79 @@
+import datetime
+from io import StringIO
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from fleet_management.models import Vehicle
+from overdrive.expiry import expire_requests, stale_requests, still_stale
+from overdrive.models import Booking, BookingStatusLog
+
+User = get_user_model()
+
+
+@override_settings(BOOKING_REQUEST_TTL=3600)
+class ExpireRequestsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='sweep@mail.com', password='testpass', user_type='customer')
+        self.vehicle = Vehicle.objects.create(name='Sweep', passenger_capacity=4, price_per_hour=10, is_available=False)
+        self.now = timezone.now()
+
+    def booking(self, start_in_hours, age_hours=0, status='requested'):
+        start = self.now + datetime.timedelta(hours=start_in_hours)
+        booking = Booking.objects.create(user=self.user, vehicle=self.vehicle, start_time=start,
+                                         end_time=start + datetime.timedelta(hours=1), total_price=10, status=status)
+        Booking.objects.filter(pk=booking.pk).update(created_at=self.now - datetime.timedelta(hours=age_hours))
+        return booking
+
+    def test_cancels_old_and_started_requests_only(self):
+        old = self.booking(start_in_hours=48, age_hours=2)
+        started = self.booking(start_in_hours=-1)
+        fresh = self.booking(start_in_hours=48)
+        confirmed = self.booking(start_in_hours=-1, age_hours=2, status='confirmed')
+
+        self.assertEqual(expire_requests(now=self.now), 2)
+        statuses = dict(Booking.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[old.pk], 'canceled')
+        self.assertEqual(statuses[started.pk], 'canceled')
+        self.assertEqual(statuses[fresh.pk], 'requested')
+        self.assertEqual(statuses[confirmed.pk], 'confirmed')
+        self.assertEqual(sorted(BookingStatusLog.objects.values_list('booking_id', 'status', 'user')),
+                         sorted([(old.pk, 'canceled', None), (started.pk, 'canceled', None)]))
+        # Requests never held the vehicle, so expiring them does not release it
+        self.vehicle.refresh_from_db()
+        self.assertFalse(self.vehicle.is_available)
+        self.assertEqual(expire_requests(now=self.now), 0)
+
+    def test_batches_cost_constant_queries(self):
+        for hours in range(7):
+            self.booking(start_in_hours=-hours - 1)
+        # Per batch: candidates, SAVEPOINT, re-read, UPDATE, updated ids, bulk INSERT, RELEASE; then the empty read
+        with self.assertNumQueries(4 * 7 + 1):
+            self.assertEqual(expire_requests(now=self.now, batch_size=2), 7)
+        self.assertFalse(stale_requests(self.now).exists())
+
+    def test_confirmation_after_reread_is_kept(self):
+        confirmed = self.booking(start_in_hours=-1)
+        expired = self.booking(start_in_hours=-2)
+
+        def reread_then_confirm(stale, booking_ids):
+            # The owner confirms from another process, whose lock the sweeper does not see
+            rows = still_stale(stale, booking_ids)
+            Booking.objects.filter(pk=confirmed.pk).update(status='confirmed')
+            return rows
+
+        with patch('overdrive.expiry.still_stale', side_effect=reread_then_confirm):
+            self.assertEqual(expire_requests(now=self.now), 1)
+        self.assertEqual(Booking.objects.get(pk=confirmed.pk).status, 'confirmed')
+        self.assertEqual(Booking.objects.get(pk=expired.pk).status, 'canceled')
+        self.assertEqual(list(BookingStatusLog.objects.values_list('booking_id', flat=True)), [expired.pk])
+
+    @override_settings(BOOKING_REQUEST_TTL=None)
+    def test_without_ttl_only_started_requests_expire(self):
+        old = self.booking(start_in_hours=48, age_hours=100)
+        self.booking(start_in_hours=-1)
+        out = StringIO()
+        call_command('expire_booking_requests', stdout=out)
+        self.assertIn('Expired 1 booking requests.', out.getvalue())
+        self.assertEqual(Booking.objects.get(pk=old.pk).status, 'requested')
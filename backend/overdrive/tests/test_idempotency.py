@@ -0,0 +1,141 @@
+import datetime
+from io import StringIO
+from unittest import mock
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth import get_user_model
+from fleet_management.models import Vehicle
+from overdrive.idempotency import run_and_store
+from overdrive.models import Booking, IdempotencyKey
+from payment.models import BookingPayment
+from payment.services import CashService
+
+User = get_user_model()
+
+
+class IdempotencyKeyTest(APITestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='retry@mail.com', password='testpass', user_type='customer')
+        self.customer.is_active = True
+        self.customer.save()
+        self.vehicle = Vehicle.objects.create(name='Retry', passenger_capacity=4, price_per_hour=10)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.customer).access_token}')
+        self.start = timezone.now() + datetime.timedelta(days=1)
+
+    def book(self, key, hours=2):
+        return self.client.post('/api/bookings/', {
+            'user_id': self.customer.id, 'vehicle_id': self.vehicle.id, 'start_time': self.start.isoformat(),
+            'end_time': (self.start + datetime.timedelta(hours=hours)).isoformat(),
+        }, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.book('booking-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(2):  # JWT user, then the key lookup
+            retry = self.book('booking-1')
+        self.assertEqual(retry.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(retry.data['id'], first.data['id'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_other_keys_and_no_key_are_independent(self):
+        self.book('booking-1')
+        self.book('booking-2')
+        self.book('')
+        self.assertEqual(Booking.objects.count(), 3)
+
+    def test_key_reused_for_different_request(self):
+        self.book('booking-1')
+        response = self.book('booking-1', hours=3)
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_failed_request_releases_key(self):
+        with mock.patch('overdrive.views.quote_price', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.book('booking-1')
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.book('booking-1').status_code, status.HTTP_201_CREATED)
+
+    def test_duplicate_waits_for_request_in_flight(self):
+        self.book('booking-1')
+        record = IdempotencyKey.objects.get()
+        stored = (record.status_code, record.response_body)
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None, response_body=None)
+
+        def first_request_finishes(seconds):
+            IdempotencyKey.objects.filter(pk=record.pk).update(status_code=stored[0], response_body=stored[1])
+
+        with mock.patch('overdrive.idempotency.time.sleep', side_effect=first_request_finishes) as sleep:
+            response = self.book('booking-1')
+        sleep.assert_called_once()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Booking.objects.count(), 1)
+
+        IdempotencyKey.objects.filter(pk=record.pk).update(status_code=None)
+        with override_settings(IDEMPOTENCY_WAIT=0):
+            self.assertEqual(self.book('booking-1').status_code, status.HTTP_409_CONFLICT)
+
+    def test_claim_of_a_dead_request_is_taken_over(self):
+        self.book('booking-1')
+        # As if the first request's process died after claiming the key
+        Booking.objects.all().delete()
+        IdempotencyKey.objects.update(status_code=None, response_body=None,
+                                      claimed_at=timezone.now() - datetime.timedelta(seconds=30))
+
+        with override_settings(IDEMPOTENCY_WAIT=0):
+            self.assertEqual(self.book('booking-1').status_code, status.HTTP_409_CONFLICT)
+            with override_settings(IDEMPOTENCY_CLAIM_LEASE=10):
+                response = self.book('booking-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status_code, status.HTTP_201_CREATED)
+
+    def test_request_whose_claim_was_taken_over_leaves_the_key_alone(self):
+        self.book('booking-1')
+        late = IdempotencyKey.objects.get()
+        # A retry took the claim over and is still running
+        IdempotencyKey.objects.update(status_code=None, response_body=None,
+                                      claimed_at=late.claimed_at + datetime.timedelta(seconds=61))
+        run_and_store(late, lambda view, request: Response({'late': True}, status=201), None, None)
+        run_and_store(late, lambda view, request: Response(status=503), None, None)
+        self.assertIsNone(IdempotencyKey.objects.get().status_code)
+
+    def test_claim_retried_when_the_conflicting_row_was_deleted(self):
+        # The key's expired row blocked the INSERT, then another request deleted it
+        with mock.patch.object(IdempotencyKey.objects, 'create', wraps=IdempotencyKey.objects.create,
+                               side_effect=[IntegrityError, mock.DEFAULT]) as create:
+            response = self.book('booking-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(create.call_count, 2)
+
+    def test_expired_keys_are_reused_and_purged(self):
+        self.book('booking-1')
+        IdempotencyKey.objects.update(created_at=timezone.now() - datetime.timedelta(days=2))
+        self.start += datetime.timedelta(days=1)
+        self.assertEqual(self.book('booking-1').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Booking.objects.count(), 2)
+
+        IdempotencyKey.objects.update(created_at=timezone.now() - datetime.timedelta(days=2))
+        call_command('purge_idempotency_keys', stdout=StringIO())
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    @override_settings(PAYMENT_ASYNC=False)
+    @mock.patch.object(CashService, 'process_payment', return_value=True)
+    def test_payment_charged_once(self, process_payment):
+        booking = Booking.objects.create(user=self.customer, vehicle=self.vehicle, start_time=self.start,
+                                         end_time=self.start + datetime.timedelta(hours=1), total_price=10)
+        for _ in range(3):
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(f'/api/payment/{booking.id}/', {'amount': '10.00', 'method': 'cash'},
+                                            format='json', HTTP_IDEMPOTENCY_KEY='pay-1')
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        process_payment.assert_called_once()
+        self.assertEqual(BookingPayment.objects.count(), 1)
@@ -0,0 +1,109 @@
+import datetime
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from car_rental.testing import QueryBudgetMixin
+from fleet_management.models import Vehicle
+from overdrive.models import Booking
+from overdrive.occupancy import VehicleOccupancy, get_occupancy_index
+from overdrive.utils import update_booking_status
+
+User = get_user_model()
+
+
+class VehicleOccupancyTest(TestCase):
+    def setUp(self):
+        self.t0 = timezone.make_aware(datetime.datetime(2025, 5, 1, 8, 0))
+
+    def at(self, hours):
+        return self.t0 + datetime.timedelta(hours=hours)
+
+    def test_is_free_uses_half_open_windows(self):
+        occupancy = VehicleOccupancy([(1, self.at(2), self.at(4)), (2, self.at(8), self.at(9))])
+        self.assertTrue(occupancy.is_free(self.at(0), self.at(2)))
+        self.assertTrue(occupancy.is_free(self.at(4), self.at(8)))
+        self.assertFalse(occupancy.is_free(self.at(3), self.at(5)))
+        self.assertFalse(occupancy.is_free(self.at(0), self.at(10)))
+        self.assertTrue(occupancy.is_free(self.at(9), self.at(20)))
+
+    def test_overlapping_and_touching_bookings_merge(self):
+        occupancy = VehicleOccupancy([
+            (1, self.at(0), self.at(2)), (2, self.at(1), self.at(3)), (3, self.at(3), self.at(5)),
+        ])
+        self.assertEqual(occupancy.intervals, ([self.at(0)], [self.at(5)]))
+        occupancy.discard(2)
+        self.assertTrue(occupancy.is_free(self.at(2), self.at(3)))
+
+    def test_next_free(self):
+        occupancy = VehicleOccupancy([(1, self.at(2), self.at(4)), (2, self.at(5), self.at(9))])
+        self.assertEqual(occupancy.next_free(self.at(0)), self.at(0))
+        self.assertEqual(occupancy.next_free(self.at(3)), self.at(4))
+        # The one hour gap at 4-5 is too short for two hours
+        self.assertEqual(occupancy.next_free(self.at(3), datetime.timedelta(hours=2)), self.at(9))
+        self.assertEqual(occupancy.next_free(self.at(3), datetime.timedelta(hours=1)), self.at(4))
+
+
+@override_settings(BOOKING_OCCUPANCY_INDEX=True)
+class OccupancyIndexTest(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.index = get_occupancy_index()
+        self.index.invalidate()
+        self.customer = User.objects.create_user(email='occupancy@mail.com', password='testpass', user_type='customer')
+        self.vehicle = Vehicle.objects.create(name='Occupancy', passenger_capacity=4, price_per_hour=10)
+        self.start = timezone.now() + datetime.timedelta(days=2)
+        self.booking = Booking.objects.create(
+            user=self.customer, vehicle=self.vehicle, start_time=self.start,
+            end_time=self.start + datetime.timedelta(hours=3), total_price=30,
+        )
+        self.window = (self.start + datetime.timedelta(hours=1), self.start + datetime.timedelta(hours=2))
+
+    def tearDown(self):
+        self.index.invalidate()
+
+    def test_disabled_by_default(self):
+        with override_settings(BOOKING_OCCUPANCY_INDEX=False):
+            self.assertIsNone(get_occupancy_index())
+
+    def test_lazily_loaded_once(self):
+        with self.assertQueryBudget(1):
+            self.assertTrue(self.index.is_free(self.vehicle.pk, *self.window))
+            self.assertTrue(self.index.is_free(self.vehicle.pk, *self.window))
+            self.assertEqual(self.index.next_free(self.vehicle.pk, self.start), self.start)
+
+    def test_status_changes_applied_on_commit(self):
+        self.index.get(self.vehicle.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            update_booking_status(self.booking, 'confirmed')
+        with self.assertQueryBudget(0):
+            self.assertFalse(self.index.is_free(self.vehicle.pk, *self.window))
+            self.assertEqual(self.index.next_free(self.vehicle.pk, self.start), self.booking.end_time)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_booking_status(self.booking, 'canceled')
+        self.assertTrue(self.index.is_free(self.vehicle.pk, *self.window))
+
+    def test_busy_vehicle_refused_from_the_index(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            update_booking_status(self.booking, 'confirmed')
+        self.index.get(self.vehicle.pk)
+        overlapping = Booking(user=self.customer, vehicle=self.vehicle, start_time=self.window[0],
+                              end_time=self.window[1], total_price=10)
+        with self.assertQueryBudget(0), self.assertRaises(ValidationError):
+            overlapping.clean()
+        # A booking is checked against the others, not itself
+        self.booking.end_time += datetime.timedelta(hours=1)
+        with self.assertQueryBudget(1):
+            self.booking.clean()
+
+    def test_stale_index_dropped_when_database_disagrees(self):
+        self.index.get(self.vehicle.pk)
+        # Written behind the index's back, as another process would
+        Booking.objects.filter(pk=self.booking.pk).update(status='confirmed')
+        self.assertTrue(self.index.is_free(self.vehicle.pk, *self.window))
+
+        overlapping = Booking(user=self.customer, vehicle=self.vehicle, start_time=self.window[0],
+                              end_time=self.window[1], total_price=10)
+        with self.assertRaises(ValidationError):
+            overlapping.save()
+        self.assertFalse(self.index.is_free(self.vehicle.pk, *self.window))
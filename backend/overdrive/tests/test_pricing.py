@@ -0,0 +1,91 @@
+import datetime
+from decimal import Decimal, ROUND_DOWN
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from car_rental.testing import QueryBudgetMixin
+from fleet_management.models import Car, Manufacturer
+from overdrive.pricing import PricingPolicy, quote_price
+
+
+class PricingPolicyTest(TestCase):
+    def setUp(self):
+        self.start = timezone.make_aware(datetime.datetime(2025, 3, 1, 8, 0))
+
+    def window(self, **delta):
+        return self.start, self.start + datetime.timedelta(**delta)
+
+    def test_exact_decimal_arithmetic(self):
+        # 20 minutes at 10.00/hour is 3.333..., float hours would drift on long rentals
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(minutes=20), policy=PricingPolicy()), Decimal('3.33'))
+        self.assertEqual(quote_price(Decimal('0.10'), *self.window(hours=30000), policy=PricingPolicy()), Decimal('3000.00'))
+
+    def test_rounding_mode(self):
+        policy = PricingPolicy(rounding=ROUND_DOWN)
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(minutes=40), policy=policy), Decimal('6.66'))
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(minutes=40), policy=PricingPolicy()), Decimal('6.67'))
+
+    def test_billing_increment_rounds_up(self):
+        policy = PricingPolicy(billing_increment_minutes=15)
+        self.assertEqual(quote_price(Decimal('12.00'), *self.window(minutes=61), policy=policy), Decimal('15.00'))
+        self.assertEqual(quote_price(Decimal('12.00'), *self.window(minutes=60), policy=policy), Decimal('12.00'))
+
+    def test_minimum_hours(self):
+        policy = PricingPolicy(minimum_hours=3)
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(hours=1), policy=policy), Decimal('30.00'))
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(hours=5), policy=policy), Decimal('50.00'))
+
+    def test_daily_cap(self):
+        policy = PricingPolicy(daily_cap_hours=8)
+        # Two full days at the cap plus a 10 hour remainder, also capped
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(hours=58), policy=policy), Decimal('240.00'))
+        self.assertEqual(quote_price(Decimal('10.00'), *self.window(hours=5), policy=policy), Decimal('50.00'))
+
+    def test_empty_window_rejected(self):
+        with self.assertRaises(ValueError):
+            quote_price(Decimal('10.00'), self.start, self.start)
+
+
+class QuoteAPITest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        toyota = Manufacturer.objects.create(name="Toyota", country="Philippines")
+        self.cars = [
+            Car.objects.create(
+                license_plate=f"QUOTE{i}", passenger_capacity=5, make=toyota, model="Vios",
+                year=2022, price_per_hour=price, location="Manila",
+            )
+            for i, price in enumerate([Decimal('10.00'), Decimal('12.50'), Decimal('99.99')])
+        ]
+        self.start = timezone.make_aware(datetime.datetime(2025, 3, 1, 8, 0))
+        self.url = reverse('quote-list')
+
+    def post(self, vehicle_ids, hours=3):
+        return self.client.post(self.url, {
+            'start_time': self.start.isoformat(),
+            'end_time': (self.start + datetime.timedelta(hours=hours, minutes=30)).isoformat(),
+            'vehicle_ids': vehicle_ids,
+        }, format='json')
+
+    def test_quotes_in_request_order(self):
+        response = self.post([self.cars[2].id, self.cars[0].id, 999999, self.cars[1].id])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        quotes = response.data['quotes']
+        self.assertEqual([quote['vehicle_id'] for quote in quotes], [self.cars[2].id, self.cars[0].id, self.cars[1].id])
+        self.assertEqual([quote['total_price'] for quote in quotes], ['349.97', '35.00', '43.75'])
+        self.assertEqual(quotes[0]['price_per_hour'], '99.99')
+        self.assertEqual(response.data['billable_hours'], '3.5000')
+        self.assertEqual(response.data['missing'], [999999])
+
+    def test_single_query_for_many_vehicles(self):
+        ids = [car.id for car in self.cars]
+        with self.assertQueryBudget(1):
+            response = self.post(ids * 50 + list(range(1000, 1200)))
+        self.assertEqual(len(response.data['quotes']), 3)
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.post([]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post([self.cars[0].id], hours=-2).status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {'vehicle_ids': [self.cars[0].id]}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,104 @@
+from rest_framework.test import APITestCase, APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+import datetime
+from car_rental.testing import QueryBudgetMixin
+from overdrive.models import Booking
+from fleet_management.models import Car, Manufacturer, Owner, Vehicle
+
+User = get_user_model()
+
+
+class BookingQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create_user(email='budgetcustomer@mail.com', password='testpass', user_type='customer')
+        self.customer.is_active = True
+        self.customer.save()
+        self.owner = User.objects.create_user(email='budgetowner@mail.com', password='testpass', user_type='car_owner')
+        self.owner.is_active = True
+        self.owner.save()
+        self.car = Car.objects.create(
+            owner=Owner.objects.create(user=self.owner, name='Budget Owner'),
+            license_plate="BUDGET1",
+            passenger_capacity=5,
+            make=Manufacturer.objects.create(name="Toyota", country="Philippines"),
+            model="Vios",
+            year=2020,
+            price_per_hour=10.00,
+        )
+        start = timezone.now() + datetime.timedelta(days=1)
+        self.booking = Booking.objects.create(
+            user=self.customer,
+            vehicle=self.car,
+            start_time=start,
+            end_time=start + datetime.timedelta(hours=2),
+            total_price=20.0,
+        )
+        self.customer_token = str(RefreshToken.for_user(self.customer).access_token)
+        self.owner_token = str(RefreshToken.for_user(self.owner).access_token)
+
+    def test_booking_detail_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        # JWT user, freshness check, then the booking with its user and vehicle
+        with self.assertQueryBudget(3):
+            self.client.get(f'/api/bookings/{self.booking.id}/')
+
+    def test_booking_detail_not_modified_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        etag = self.client.get(f'/api/bookings/{self.booking.id}/')['ETag']
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/bookings/{self.booking.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_confirm_booking_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
+        # JWT user, booking with vehicle and owner, overlap check, status CAS, log, vehicle,
+        # plus the vehicle lock: a savepoint pair inside the test transaction and a row lock where supported
+        with self.assertQueryBudget(9):
+            self.client.post(f'/api/bookings/confirm/{self.booking.id}/')
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+
+    def test_start_driving_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        Booking.objects.filter(pk=self.booking.pk).update(status='rented')
+        # Same as confirm without the overlap check (rented is already active) and the vehicle write
+        with self.assertQueryBudget(7):
+            response = self.client.post(f'/api/bookings/start_driving/{self.booking.id}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_bulk_transitions_constant_queries(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
+        bookings = [self.booking]
+        start = self.booking.end_time
+
+        def transition():
+            Booking.objects.filter(pk__in=[booking.pk for booking in bookings]).update(status='requested')
+            Vehicle.objects.filter(pk=self.car.pk).update(is_available=True)
+            self.client.post('/api/bookings/transitions/', {'transitions': [
+                {'booking_id': booking.pk, 'status': 'confirmed'} for booking in bookings
+            ]}, format='json')
+
+        def grow():
+            for i in range(10):
+                bookings.append(Booking.objects.create(
+                    user=self.customer, vehicle=self.car, total_price=20.0,
+                    start_time=start + datetime.timedelta(hours=i), end_time=start + datetime.timedelta(hours=i + 1),
+                ))
+
+        self.assertConstantQueries(transition, grow)
+        self.assertEqual(Booking.objects.filter(status='confirmed').count(), 11)
+
+    def test_create_booking_budget(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        start = self.booking.end_time + datetime.timedelta(days=1)
+        # JWT user, user_id and vehicle_id fields, overlap check, insert, and the vehicle lock
+        # (savepoint pair in the test transaction, a row lock where supported)
+        with self.assertQueryBudget(8):
+            response = self.client.post('/api/bookings/', {
+                'user_id': self.customer.id, 'vehicle_id': self.car.id,
+                'start_time': start.isoformat(), 'end_time': (start + datetime.timedelta(hours=2)).isoformat(),
+            }, format='json')
+        self.assertEqual(response.status_code, 201)
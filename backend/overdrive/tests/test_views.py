@@ -7,9 +7,12 @@ from rest_framework_simplejwt.tokens import RefreshToken
 import datetime
 from django.utils import timezone
 from django.contrib.auth import get_user_model
-from overdrive.models import Booking
+from overdrive.models import Booking, BookingStatusLog
+from overdrive.utils import BookingStatusConflict, update_booking_status
+from overdrive.views import BaseBookingView
 from fleet_management.models import Car, Manufacturer, Vehicle, Owner
 import json
+from unittest import mock
 
 User = get_user_model()
 
@@ -69,7 +72,7 @@ class CarViewTest(APITestCase):
         print(json.dumps(response.data, indent=2))
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)  # We have only one car
+        self.assertEqual(len(response.data['results']), 1)  # We have only one car
 
     def test_create_booking_unauthenticated(self):
         url = reverse('create-booking')
@@ -239,6 +242,7 @@ class ConfirmBookingAPITest(BaseBookingAPITest):
         response = self.client.post(f'/api/bookings/confirm/{self.booking.id}/', format='json')
         print(json.dumps(response.data, indent=2))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], "Only vehicle owners can confirm bookings.")
 
     def test_confirm_non_existent_booking(self):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
@@ -248,6 +252,11 @@ class ConfirmBookingAPITest(BaseBookingAPITest):
 
 
 class RentedBookingAPITest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        # Only a confirmed booking can make this transition
+        Booking.objects.filter(id=self.booking.id).update(status='confirmed')
+
     def test_rent_booking_by_owner(self):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
         response = self.client.post(f'/api/bookings/delivered/{self.booking.id}/', format='json')
@@ -263,6 +272,11 @@ class RentedBookingAPITest(BaseBookingAPITest):
 
 
 class StartDrivingAPITest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        # Only a rented booking can make this transition
+        Booking.objects.filter(id=self.booking.id).update(status='rented')
+
     def test_start_driving_by_customer(self):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
         response = self.client.post(f'/api/bookings/start_driving/{self.booking.id}/', format='json')
@@ -275,9 +289,15 @@ class StartDrivingAPITest(BaseBookingAPITest):
         response = self.client.post(f'/api/bookings/start_driving/{self.booking.id}/', format='json')
         print(json.dumps(response.data, indent=2))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], "Only the booking user can start driving.")
 
 
 class ReturnCarAPITest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        # Only a driving booking can make this transition
+        Booking.objects.filter(id=self.booking.id).update(status='driving')
+
     def test_return_car_by_owner(self):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
         response = self.client.post(f'/api/bookings/return_car/{self.booking.id}/', format='json')
@@ -291,6 +311,139 @@ class ReturnCarAPITest(BaseBookingAPITest):
         print(json.dumps(response.data, indent=2))
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+class BookingStateMachineAPITest(BaseBookingAPITest):
+    def test_finished_booking_cannot_be_reopened(self):
+        Booking.objects.filter(id=self.booking.id).update(status='returned')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
+        response = self.client.post(f'/api/bookings/confirm/{self.booking.id}/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'returned')
+
+    def test_owner_of_another_vehicle_cannot_cancel(self):
+        other = User.objects.create_user(email='other-owner@mail.com', password='testpass', user_type='car_owner')
+        other.is_active = True
+        other.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        response = self.client.post(f'/api/bookings/cancel/{self.booking.id}/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(response.data['detail'], "You do not have permission to cancel this booking.")
+        response = self.client.post(f'/api/bookings/confirm/{self.booking.id}/', format='json')
+        self.assertEqual(response.data['detail'], "Only vehicle owner can confirm booking.")
+
+    def test_staff_can_make_any_legal_transition(self):
+        staff = User.objects.create_user(email='staff@mail.com', password='testpass', user_type='staff')
+        staff.is_active = True
+        staff.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(staff).access_token}')
+        for url, expected in [('confirm', 'confirmed'), ('delivered', 'rented'), ('start_driving', 'driving'),
+                              ('return_car', 'returned')]:
+            response = self.client.post(f'/api/bookings/{url}/{self.booking.id}/', format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(Booking.objects.get(id=self.booking.id).status, expected)
+
+    def test_repeated_transition_is_a_no_op(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
+        self.client.post(f'/api/bookings/confirm/{self.booking.id}/', format='json')
+        response = self.client.post(f'/api/bookings/confirm/{self.booking.id}/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(BookingStatusLog.objects.filter(booking=self.booking).count(), 1)
+
+
+class UpdateBookingStatusTest(BaseBookingAPITest):
+    def load(self):
+        return Booking.objects.select_related('vehicle').get(id=self.booking.id)
+
+    def test_stale_status_fails_without_writing(self):
+        stale = self.load()
+        update_booking_status(self.load(), 'canceled', user=self.owner)
+        with self.assertRaises(BookingStatusConflict):
+            update_booking_status(stale, 'confirmed', user=self.owner)
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'canceled')
+        self.assertFalse(BookingStatusLog.objects.filter(status='confirmed').exists())
+
+    def test_vehicle_written_only_when_availability_changes(self):
+        update_booking_status(self.load(), 'confirmed', user=self.owner)
+        confirmed_at = Vehicle.objects.get(id=self.vehicle.id).updated_at
+        self.assertFalse(Vehicle.objects.get(id=self.vehicle.id).is_available)
+
+        update_booking_status(self.load(), 'rented', user=self.owner)
+        update_booking_status(self.load(), 'driving', user=self.customer)
+        self.assertEqual(Vehicle.objects.get(id=self.vehicle.id).updated_at, confirmed_at)
+        self.assertEqual(list(BookingStatusLog.objects.order_by('id').values_list('status', flat=True)),
+                         ['confirmed', 'rented', 'driving'])
+
+    def test_conflict_response(self):
+        Booking.objects.filter(id=self.booking.id).update(status='canceled')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
+        with mock.patch.object(BaseBookingView, 'get_booking', return_value=self.load()) as get_booking:
+            get_booking.return_value.status = 'requested'
+            response = self.client.post(f'/api/bookings/confirm/{self.booking.id}/', format='json')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class BulkBookingTransitionAPITest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('booking-transitions')
+        start = timezone.now() + datetime.timedelta(days=5)
+        self.later = Booking.objects.create(
+            user=self.customer, vehicle=self.vehicle, start_time=start,
+            end_time=start + datetime.timedelta(hours=2), total_price=20.0,
+        )
+        self.overlapping = Booking.objects.create(
+            user=self.customer, vehicle=self.vehicle, start_time=start + datetime.timedelta(hours=1),
+            end_time=start + datetime.timedelta(hours=3), total_price=20.0,
+        )
+
+    def post(self, transitions, token=None):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token or self.owner_token}')
+        return self.client.post(self.url, {'transitions': [
+            {'booking_id': booking_id, 'status': new_status} for booking_id, new_status in transitions
+        ]}, format='json')
+
+    def test_applies_transitions_with_per_item_results(self):
+        response = self.post([(self.booking.id, 'confirmed'), (self.later.id, 'confirmed'), (999999, 'confirmed')])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['result'] for item in response.data['results']], ['applied', 'applied', 'error'])
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'confirmed')
+        self.assertEqual(Booking.objects.get(id=self.later.id).status, 'confirmed')
+        self.assertEqual(BookingStatusLog.objects.filter(status='confirmed').count(), 2)
+        self.assertFalse(Vehicle.objects.get(id=self.vehicle.id).is_available)
+
+    def test_overlap_within_batch_rejected(self):
+        response = self.post([(self.later.id, 'confirmed'), (self.overlapping.id, 'confirmed')])
+        self.assertEqual([item['result'] for item in response.data['results']], ['applied', 'error'])
+        self.assertEqual(Booking.objects.get(id=self.overlapping.id).status, 'requested')
+
+        # Canceling the first booking frees the window for the second in the same batch
+        response = self.post([(self.later.id, 'canceled'), (self.overlapping.id, 'confirmed'), (self.later.id, 'canceled')])
+        self.assertEqual([item['result'] for item in response.data['results']], ['applied', 'applied', 'unchanged'])
+        self.assertEqual(Booking.objects.get(id=self.overlapping.id).status, 'confirmed')
+        self.assertFalse(Vehicle.objects.get(id=self.vehicle.id).is_available)
+
+    def test_illegal_transition_reported(self):
+        response = self.post([(self.booking.id, 'returned'), (self.later.id, 'confirmed')])
+        self.assertEqual([item['result'] for item in response.data['results']], ['error', 'applied'])
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'requested')
+
+    def test_other_owners_bookings_not_found(self):
+        other = User.objects.create_user(email='other-owner@mail.com', password='testpass', user_type='car_owner')
+        other.is_active = True
+        other.save()
+        token = str(RefreshToken.for_user(other).access_token)
+        response = self.post([(self.booking.id, 'canceled')], token=token)
+        self.assertEqual(response.data['results'][0]['result'], 'error')
+        self.assertEqual(Booking.objects.get(id=self.booking.id).status, 'requested')
+
+    def test_customer_forbidden(self):
+        response = self.post([(self.booking.id, 'canceled')], token=self.customer_token)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_payload(self):
+        self.assertEqual(self.post([]).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.post([(self.booking.id, 'driving')]).status_code, status.HTTP_400_BAD_REQUEST)
+
+
 class BookingDetailAPITest(BaseBookingAPITest):
     def test_booking_details(self):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
@@ -302,4 +455,142 @@ class BookingDetailAPITest(BaseBookingAPITest):
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
         response = self.client.get(f'/api/bookings/2/', format='json')
         print(json.dumps(response.data, indent=2))
-        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
\ No newline at end of file
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+class AvailableCarsAPITest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        self.other_car = Car.objects.create(
+            owner=self.car_owner,
+            license_plate="FREE001",
+            passenger_capacity=5,
+            make=self.toyota,
+            model="Vios",
+            year=2021,
+            price_per_hour=12.00,
+        )
+        self.window_start = timezone.now() + datetime.timedelta(days=3)
+        self.window_end = self.window_start + datetime.timedelta(hours=4)
+
+    def search(self, start, end):
+        return self.client.get('/api/cars/available/', {
+            'start_time': start.isoformat(),
+            'end_time': end.isoformat(),
+        })
+
+    def test_active_overlapping_booking_excludes_vehicle(self):
+        Booking.objects.create(
+            user=self.customer,
+            vehicle=self.vehicle,
+            start_time=self.window_start + datetime.timedelta(hours=1),
+            end_time=self.window_end + datetime.timedelta(hours=1),
+            total_price=50.0,
+            status='confirmed',
+        )
+        response = self.search(self.window_start, self.window_end)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([car['license_plate'] for car in response.data['results']], ['FREE001'])
+
+    def test_inactive_or_adjacent_bookings_do_not_block(self):
+        Booking.objects.create(
+            user=self.customer,
+            vehicle=self.vehicle,
+            start_time=self.window_start,
+            end_time=self.window_end,
+            total_price=50.0,
+            status='requested',
+        )
+        Booking.objects.create(
+            user=self.customer,
+            vehicle=self.other_car,
+            start_time=self.window_end,
+            end_time=self.window_end + datetime.timedelta(hours=2),
+            total_price=50.0,
+            status='confirmed',
+        )
+        response = self.search(self.window_start, self.window_end)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_query_count_is_constant(self):
+        with self.assertNumQueries(1):
+            self.search(self.window_start, self.window_end)
+
+    def test_invalid_window(self):
+        response = self.search(self.window_end, self.window_start)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get('/api/cars/available/', {'start_time': 'tomorrow'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class NextFreeWindowAPITest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        self.window_start = timezone.now() + datetime.timedelta(days=3)
+        for hours, status_ in ((1, 'confirmed'), (5, 'rented'), (10, 'requested')):
+            Booking.objects.create(
+                user=self.customer,
+                vehicle=self.vehicle,
+                start_time=self.window_start + datetime.timedelta(hours=hours),
+                end_time=self.window_start + datetime.timedelta(hours=hours + 3),
+                total_price=30.0,
+                status=status_,
+            )
+
+    def next_free(self, hours, vehicle_id=None):
+        return self.client.get(f'/api/cars/{vehicle_id or self.vehicle.pk}/next-free/', {
+            'start_time': self.window_start.isoformat(),
+            'end_time': (self.window_start + datetime.timedelta(hours=hours)).isoformat(),
+        })
+
+    def test_earliest_window_the_vehicle_is_free_for(self):
+        response = self.next_free(1)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['start_time'], self.window_start)
+        # The one hour gap between the active bookings at 4-5 is too short; the requested one does not block
+        response = self.next_free(2)
+        self.assertEqual(response.data['start_time'], self.window_start + datetime.timedelta(hours=8))
+        self.assertEqual(response.data['end_time'], self.window_start + datetime.timedelta(hours=10))
+
+    def test_answered_from_the_occupancy_index(self):
+        with self.settings(BOOKING_OCCUPANCY_INDEX=True):
+            from overdrive.occupancy import get_occupancy_index
+            index = get_occupancy_index()
+            index.invalidate()
+            self.addCleanup(index.invalidate)
+            self.next_free(2)
+            with self.assertNumQueries(1):  # The vehicle's existence
+                response = self.next_free(2)
+        self.assertEqual(response.data['start_time'], self.window_start + datetime.timedelta(hours=8))
+
+    def test_invalid_window_or_vehicle(self):
+        self.assertEqual(self.next_free(-1).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.next_free(1, vehicle_id=999999).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookingDetailConditionalGetTest(BaseBookingAPITest):
+    def setUp(self):
+        super().setUp()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.customer_token}')
+        self.url = f'/api/bookings/{self.booking.id}/'
+
+    def test_if_none_match_returns_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_status_change_produces_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.booking.status = 'confirmed'
+        self.booking.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['status'], 'confirmed')
+
+    def test_vehicle_change_produces_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.car.price_per_hour = 99
+        self.car.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -1,13 +1,32 @@
 from django.urls import path
 from .views import CreateBookingAPI
-from .views import CancelBookingView, ConfirmBookingView, RentedBookingView, StartDrivingView, ReturnCarView, BookingDetailAPI
+from .views import BookingTransitionView, BookingDetailAPI
+from .views import AvailableCarsAPI, NextFreeWindowAPI, QuoteAPI, BulkBookingTransitionView, OwnerAnalyticsAPI
 
 urlpatterns = [
     path('api/bookings/', CreateBookingAPI.as_view(), name='create-booking'),
-    path('api/bookings/cancel/<int:booking_id>/', CancelBookingView.as_view(), name='cancel_booking'),
-    path('api/bookings/confirm/<int:booking_id>/', ConfirmBookingView.as_view(), name='confirm_booking'),
-    path('api/bookings/delivered/<int:booking_id>/', RentedBookingView.as_view(), name='car_delivered'),
-    path('api/bookings/start_driving/<int:booking_id>/', StartDrivingView.as_view(), name='start_driving'),
-    path('api/bookings/return_car/<int:booking_id>/', ReturnCarView.as_view(), name='return_car'),
+    path('api/bookings/cancel/<int:booking_id>/', BookingTransitionView.as_view(
+        target_status='canceled', message="Booking canceled successfully.",
+        forbidden_message="You do not have permission to cancel this booking."), name='cancel_booking'),
+    path('api/bookings/confirm/<int:booking_id>/', BookingTransitionView.as_view(
+        target_status='confirmed', message="Booking confirmed.",
+        forbidden_message="Only vehicle owners can confirm bookings.",
+        other_owner_message="Only vehicle owner can confirm booking."), name='confirm_booking'),
+    path('api/bookings/delivered/<int:booking_id>/', BookingTransitionView.as_view(
+        target_status='rented', message="Vehicle delivered to the customer.",
+        forbidden_message="Only vehicle owners can confirm delivery of vehicle to the customer.",
+        other_owner_message="Only vehicle owner can confirm delivery of vehicle to the customer."), name='car_delivered'),
+    path('api/bookings/start_driving/<int:booking_id>/', BookingTransitionView.as_view(
+        target_status='driving', message="Driving started.",
+        forbidden_message="Only the booking user can start driving."), name='start_driving'),
+    path('api/bookings/return_car/<int:booking_id>/', BookingTransitionView.as_view(
+        target_status='returned', message="Vehicle returned.",
+        forbidden_message="Only vehicle owners can return vehicles.",
+        other_owner_message="Only vehicle owner can return vehicles."), name='return_car'),
+    path('api/bookings/transitions/', BulkBookingTransitionView.as_view(), name='booking-transitions'),
     path('api/bookings/<int:booking_id>/', BookingDetailAPI.as_view(), name='booking-detail'),
+    path('api/cars/available/', AvailableCarsAPI.as_view(), name='car-available'),
+    path('api/cars/<int:vehicle_id>/next-free/', NextFreeWindowAPI.as_view(), name='car-next-free'),
+    path('api/quotes/', QuoteAPI.as_view(), name='quote-list'),
+    path('api/owners/me/analytics/', OwnerAnalyticsAPI.as_view(), name='owner-analytics'),
 ]
\ No newline at end of file
@@ -1,18 +1,181 @@
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from fleet_management.cache import bump_catalogue_version, bump_vehicle_versions
+from fleet_management.models import Vehicle
+from .locks import vehicle_lock, vehicle_locks
 from .models import Booking, BookingStatusLog
+from .occupancy import VehicleOccupancy, booking_changed, get_occupancy_index
+from .states import OWNER, get_transition, check_transition
+
+
+
+def overlapping_bookings(start_time, end_time):
+    # Active bookings whose [start_time, end_time) window intersects the given one
+    return Booking.objects.filter(
+        status__in=Booking.ACTIVE_STATUSES,
+        start_time__lt=end_time,
+        end_time__gt=start_time,
+    )
+
+
+def available_vehicles(queryset, start_time, end_time):
+    # Single anti-join: keep vehicles with no active booking in the window
+    busy = overlapping_bookings(start_time, end_time).filter(vehicle=OuterRef('pk'))
+    return queryset.filter(~Exists(busy))
+
+
+def next_free_start(vehicle_id, after, duration):
+    """
+    Earliest time >= after from which the vehicle is free for duration.
+
+    Answered by the occupancy index when it is enabled; otherwise the
+    vehicle's active bookings ending after `after` are walked in start order.
+    """
+    index = get_occupancy_index()
+    if index is not None:
+        return index.next_free(vehicle_id, after, duration)
+    candidate = after
+    for start, end in Booking.objects.filter(
+        vehicle_id=vehicle_id, status__in=Booking.ACTIVE_STATUSES, end_time__gt=after,
+    ).order_by('start_time').values_list('start_time', 'end_time').iterator():
+        if start >= candidate + duration:
+            break
+        candidate = max(candidate, end)
+    return candidate
+
+
+class BookingStatusConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = "The booking status was changed by another request."
+    default_code = 'status_conflict'
+
 
 def update_booking_status(booking, new_status, user=None):
-    if booking.status != new_status:
+    """
+    Move a booking to new_status with a compare-and-swap on its current status.
+
+    Expects booking.vehicle to be loaded already (select_related). The move
+    must be legal in overdrive.states; who may make it is checked by callers
+    with check_transition(). Only the status columns are written, and the
+    vehicle only when the transition changes its availability. If another
+    request changed the status since the booking was loaded,
+    BookingStatusConflict is raised and nothing is written.
+    """
+    if booking.status == new_status:
+        return
+    old_status = booking.status
+    transition = get_transition(old_status, new_status)
+    if transition is None:
+        raise ValidationError({"detail": f"A {old_status} booking cannot be marked as {new_status}."})
+    with vehicle_lock(booking.vehicle_id):
+        if transition.activates:
+            booking.clean()
+
+        now = timezone.now()
+        if not Booking.objects.filter(pk=booking.pk, status=old_status).update(status=new_status, updated_at=now):
+            raise BookingStatusConflict()
         booking.status = new_status
-        booking.save()
+        booking.updated_at = now
         BookingStatusLog.objects.create(
             booking=booking,
             status=new_status,
-            user=user
+            user=user,
+            created_at=now,
         )
-        # Update vehicle availability based on status
-        if new_status in ['canceled', 'returned']:
-            booking.vehicle.is_available = True
-        elif new_status == 'confirmed':
-            booking.vehicle.is_available = False
 
-        booking.vehicle.save()
+        # Update vehicle availability based on status; the filter turns a no-op into no write
+        is_available = transition.is_available
+        if is_available is not None and Vehicle.objects.filter(
+                pk=booking.vehicle_id).exclude(is_available=is_available).update(is_available=is_available, updated_at=now):
+            booking.vehicle.is_available = is_available
+            booking.vehicle.updated_at = now
+            bump_vehicle_versions([booking.vehicle_id])
+            bump_catalogue_version()
+        # update() sends no save signals
+        booking_changed(booking)
+
+
+def bulk_update_booking_status(transitions, user):
+    """
+    Apply (booking_id, new_status) pairs for bookings on the user's vehicles.
+
+    Ownership is checked with one query, the affected vehicles are locked
+    together, overlap checks run in memory against one query of the active
+    bookings on those vehicles, and bookings, status logs and vehicles are
+    each written with a single bulk statement. Like bulk_update(), this does
+    not send save signals, so cache versions and the occupancy index are
+    updated here. Returns one result dict per transition, in order.
+    """
+    owned = dict(Booking.objects.filter(
+        pk__in={booking_id for booking_id, _ in transitions}, vehicle__owner__user_id=user.id,
+    ).values_list('pk', 'vehicle_id'))
+
+    results = []
+    with vehicle_locks(owned.values()):
+        bookings = Booking.objects.select_related('vehicle').in_bulk(owned)
+        windows = [(booking.start_time, booking.end_time) for booking in bookings.values()]
+        occupancy = {vehicle_id: VehicleOccupancy() for vehicle_id in owned.values()}
+        if windows:
+            for booking_id, vehicle_id, start, end in Booking.objects.filter(
+                vehicle_id__in=occupancy, status__in=Booking.ACTIVE_STATUSES,
+                start_time__lt=max(end for _, end in windows), end_time__gt=min(start for start, _ in windows),
+            ).values_list('id', 'vehicle_id', 'start_time', 'end_time'):
+                occupancy[vehicle_id].set(booking_id, start, end)
+
+        now = timezone.now()
+        changed = {}
+        vehicles = {}
+        logs = []
+        for booking_id, new_status in transitions:
+            booking = bookings.get(booking_id)
+            if booking is None:
+                results.append({'booking_id': booking_id, 'status': new_status, 'result': 'error',
+                                'detail': "Booking not found."})
+                continue
+            try:
+                transition = check_transition(booking, new_status, {OWNER})
+            except (PermissionDenied, ValidationError) as e:
+                detail = e.detail.get('detail', e.detail) if isinstance(e.detail, dict) else e.detail
+                results.append({'booking_id': booking_id, 'status': new_status, 'result': 'error', 'detail': str(detail)})
+                continue
+            if transition is None:
+                results.append({'booking_id': booking_id, 'status': new_status, 'result': 'unchanged'})
+                continue
+
+            vehicle_occupancy = occupancy[booking.vehicle_id]
+            if transition.activates:
+                if not vehicle_occupancy.is_free(booking.start_time, booking.end_time):
+                    results.append({'booking_id': booking_id, 'status': new_status, 'result': 'error',
+                                    'detail': "This vehicle is already booked during this time."})
+                    continue
+                vehicle_occupancy.set(booking.pk, booking.start_time, booking.end_time)
+            elif new_status not in Booking.ACTIVE_STATUSES:
+                vehicle_occupancy.discard(booking.pk)
+
+            booking.status = new_status
+            booking.updated_at = now
+            changed[booking.pk] = booking
+            logs.append(BookingStatusLog(booking=booking, status=new_status, user=user, created_at=now))
+            # The last transition per vehicle decides its availability
+            if transition.is_available is not None:
+                vehicles[booking.vehicle_id] = (booking.vehicle, transition.is_available)
+            results.append({'booking_id': booking_id, 'status': new_status, 'result': 'applied'})
+
+        if changed:
+            Booking.objects.bulk_update(changed.values(), ['status', 'updated_at'])
+            BookingStatusLog.objects.bulk_create(logs)
+            updated_vehicles = []
+            for vehicle, is_available in vehicles.values():
+                if vehicle.is_available != is_available:
+                    vehicle.is_available = is_available
+                    vehicle.updated_at = now
+                    updated_vehicles.append(vehicle)
+            if updated_vehicles:
+                Vehicle.objects.bulk_update(updated_vehicles, ['is_available', 'updated_at'])
+                bump_vehicle_versions([vehicle.pk for vehicle in updated_vehicles])
+                bump_catalogue_version()
+            for booking in changed.values():
+                booking_changed(booking)
+    return results
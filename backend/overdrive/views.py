@@ -4,22 +4,32 @@ from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import ParseError, PermissionDenied
 from django.utils import timezone
-from decimal import Decimal
 from django.contrib.auth import get_user_model
 from rest_framework.exceptions import ValidationError
 from rest_framework.exceptions import APIException
 from django.shortcuts import get_object_or_404
 import json
 from django.core import serializers
+from django.utils.dateparse import parse_datetime
+from django.http import Http404
+from car_rental.conditional import make_etag, not_modified_response, set_validators
+from car_rental.principal import get_principal
 
 
 from fleet_management.models import Car, Vehicle
-from .serializers import BookingSerializer
+from .serializers import BookingSerializer, QuoteRequestSerializer, BulkBookingTransitionSerializer
+from .serializers import AnalyticsQuerySerializer
 from fleet_management.serializers import CarSerializer
-from .models import Booking
-from .utils import update_booking_status
+from fleet_management.pagination import CarCursorPagination
+from .models import ArchivedBooking, Booking
+from .utils import update_booking_status, bulk_update_booking_status, available_vehicles, next_free_start
+from .pricing import quote_price, quote_vehicles
+from .analytics import owner_analytics
+from .locks import vehicle_lock
+from .idempotency import idempotent
+from .states import booking_actors, check_transition
 
 User = get_user_model()
 
@@ -31,15 +41,14 @@ class CreateBookingAPI(generics.CreateAPIView):
     queryset = Booking.objects.all()
     serializer_class = BookingSerializer
 
-    def get_user_profile(self, email):
-        try:
-            return User.objects.get(email=email)
-        except User.DoesNotExist:
-            return None
+    @idempotent('create-booking')
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
 
     def perform_create(self, serializer):
         try:
-            vehicle = Vehicle.objects.get(id=self.request.data.get('vehicle_id'))
+            # The serializer has already loaded the vehicle and user from their ids
+            vehicle = serializer.validated_data['vehicle']
             start_time = self.request.data.get('start_time')
             end_time = self.request.data.get('end_time')
 
@@ -49,29 +58,26 @@ class CreateBookingAPI(generics.CreateAPIView):
             if isinstance(end_time, str):
                 end_time = timezone.datetime.fromisoformat(end_time)
 
-            # Check user profile
-            profile = self.get_user_profile(self.request.user)
-
-            if not profile:
-                raise PermissionDenied("User profile not found. Cannot create booking.")
             # Check if the user has permissions to book (e.g., only customers can book)
-            if profile.user_type != 'customer':
+            principal = get_principal(self.request)
+            if not principal.is_customer:
                 raise PermissionDenied("Only customers can create bookings.")
 
             # TODO: is this required?
-            user = User.objects.get(id=self.request.data.get('user_id'))
-            if user.email != self.request.user.email:
+            if serializer.validated_data['user'].pk != principal.id:
                 raise PermissionDenied("Only customers can create bookings. Invalid user.")
 
             # Calculate total price based on duration
-            duration = (end_time - start_time).total_seconds() / 3600  # hours
-            total_price = Decimal(duration) * vehicle.price_per_hour
+            if end_time <= start_time:
+                raise ValidationError("End time must be after start time.")
+            total_price = quote_price(vehicle.price_per_hour, start_time, end_time)
 
-            # Save the booking with initial status 'requested'
-            booking = serializer.save(user=self.request.user, vehicle=vehicle, start_time=start_time, end_time=end_time, total_price=total_price)
+            with vehicle_lock(vehicle.pk):
+                # Save the booking with initial status 'requested'
+                booking = serializer.save(user=self.request.user, vehicle=vehicle, start_time=start_time, end_time=end_time, total_price=total_price)
 
-            # Update the booking status to 'requested'
-            update_booking_status(booking, 'requested', user=self.request.user)
+                # Update the booking status to 'requested'
+                update_booking_status(booking, 'requested', user=self.request.user)
 
         except ValidationError as e:
             # Extract only the error message(s)
@@ -82,125 +88,168 @@ class CreateBookingAPI(generics.CreateAPIView):
 class BaseBookingView(APIView):
     permission_classes = [IsAuthenticated]
 
-    def get_user_profile(self, email):
-        try:
-            return User.objects.get(email=email)
-        except User.DoesNotExist:
-            return None
-
     def check_permissions(self, request):
         super().check_permissions(request)
 
+    def get_booking(self, booking_id):
+        # Booking, vehicle and owner in one query: everything a transition reads
+        return Booking.objects.select_related('vehicle__owner').get(id=booking_id)
 
-class CancelBookingView(BaseBookingView):
-    authentication_classes = [JWTAuthentication]
-    def post(self, request, booking_id):
-        try:
-            booking = Booking.objects.get(id=booking_id)
-            profile = self.get_user_profile(request.user)
-
-            if not profile:
-                return Response({"detail": "User profile not found."}, status=status.HTTP_403_FORBIDDEN)
-
-            if profile.is_car_owner() or booking.user == request.user:
-                update_booking_status(booking, 'canceled', user=request.user)
-                return Response({"message": "Booking canceled successfully."}, status=status.HTTP_200_OK)
-            else:
-                return Response({"detail": "You do not have permission to cancel this booking."}, status=status.HTTP_403_FORBIDDEN)
-        except Booking.DoesNotExist:
-            return Response({"detail": "Booking not found."}, status=status.HTTP_404_NOT_FOUND)
 
+class BookingTransitionView(BaseBookingView):
+    """
+    Move one booking to target_status, as allowed by overdrive.states.
 
-class ConfirmBookingView(BaseBookingView):
+    Each transition URL is this view with its own target_status, message and
+    the 403 messages its former per-status view gave.
+    """
     authentication_classes = [JWTAuthentication]
-    def post(self, request, booking_id):
-        try:
-            booking = Booking.objects.get(id=booking_id)
-            profile = self.get_user_profile(request.user)
-
-            if not profile or not profile.is_car_owner():
-                return Response({"detail": "Only vehicle owners can confirm bookings."}, status=status.HTTP_403_FORBIDDEN)
-
-            if booking.vehicle.owner.user != request.user:
-                return Response({"detail": "Only vehicle owner can confirm booking."}, status=status.HTTP_403_FORBIDDEN)
+    target_status = None
+    message = None
+    forbidden_message = None
+    other_owner_message = None  # For the owner of another vehicle, where it differs
 
-            update_booking_status(booking, 'confirmed', user=request.user)
-            return Response({"message": "Booking confirmed."}, status=status.HTTP_200_OK)
-        except Booking.DoesNotExist:
-            return Response({"detail": "Booking not found."}, status=status.HTTP_404_NOT_FOUND)
-
-
-class RentedBookingView(BaseBookingView):
-    authentication_classes = [JWTAuthentication]
     def post(self, request, booking_id):
         try:
-            booking = Booking.objects.get(id=booking_id)
-            profile = self.get_user_profile(request.user)
-
-            if not profile or not profile.is_car_owner():
-                return Response(
-                    {"detail": "Only vehicle owners can confirm delivery of vehicle to the customer."},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-
-            if booking.vehicle.owner.user != request.user:
-                return Response(
-                    {"detail": "Only vehicle owner can confirm delivery of vehicle to the customer."},
-                    status=status.HTTP_403_FORBIDDEN
-                )
-
-            update_booking_status(booking, 'rented', user=request.user)
-            return Response({"message": "Vehicle delivered to the customer."}, status=status.HTTP_200_OK)
+            booking = self.get_booking(booking_id)
         except Booking.DoesNotExist:
             return Response({"detail": "Booking not found."}, status=status.HTTP_404_NOT_FOUND)
 
+        principal = get_principal(request)
+        denied = (principal.is_car_owner and self.other_owner_message) or self.forbidden_message
+        check_transition(booking, self.target_status, booking_actors(booking, principal), denied=denied)
+        update_booking_status(booking, self.target_status, user=request.user)
+        return Response({"message": self.message}, status=status.HTTP_200_OK)
 
-class StartDrivingView(BaseBookingView):
+
+class BulkBookingTransitionView(BaseBookingView):
     authentication_classes = [JWTAuthentication]
-    def post(self, request, booking_id):
-        try:
-            booking = Booking.objects.get(id=booking_id)
 
-            if booking.user != request.user:
-                return Response({"detail": "Only the booking user can start driving."}, status=status.HTTP_403_FORBIDDEN)
+    def post(self, request):
+        if not get_principal(request).is_car_owner:
+            return Response({"detail": "Only vehicle owners can update bookings in bulk."}, status=status.HTTP_403_FORBIDDEN)
 
-            update_booking_status(booking, 'driving', user=request.user)
-            return Response({"message": "Driving started."}, status=status.HTTP_200_OK)
-        except Booking.DoesNotExist:
-            return Response({"detail": "Booking not found."}, status=status.HTTP_404_NOT_FOUND)
+        serializer = BulkBookingTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        transitions = [(item['booking_id'], item['status']) for item in serializer.validated_data['transitions']]
+        # Bookings on other owners' vehicles are reported as not found, like unknown ids
+        results = bulk_update_booking_status(transitions, request.user)
+        return Response({"results": results}, status=status.HTTP_200_OK)
 
 
-class ReturnCarView(BaseBookingView):
+# Public endpoint to get car details
+class BookingDetailAPI(APIView):
     authentication_classes = [JWTAuthentication]
-    def post(self, request, booking_id):
-        try:
-            booking = Booking.objects.get(id=booking_id)
-            profile = self.get_user_profile(request.user)
-
-            if not profile or not profile.is_car_owner():
-                return Response({"detail": "Only vehicle owners can return vehicles."}, status=status.HTTP_403_FORBIDDEN)
 
-            # data = serializers.serialize('json', [booking.vehicle])
-            # formatted_data = json.loads(data)
-            # print(formatted_data)
+    def get(self, request, booking_id):
+        # Answer conditional requests from one narrow query, before any serialization
+        # Finished bookings may have been archived; they keep their id, so fall back to the archive
+        for model in (Booking, ArchivedBooking):
+            versions = model.objects.filter(pk=booking_id).values_list(
+                'updated_at', 'vehicle_id', 'vehicle__updated_at', 'user_id').first()
+            if versions is not None:
+                break
+        else:
+            raise Http404
+        updated_at, vehicle_id, vehicle_updated_at, user_id = versions
+        etag = make_etag('booking', booking_id, updated_at.isoformat(), vehicle_id, vehicle_updated_at.isoformat(), user_id)
+        last_modified = max(updated_at, vehicle_updated_at)
+        not_modified = not_modified_response(request, etag, last_modified)
+        if not_modified is not None:
+            return not_modified
+
+        booking = get_object_or_404(BookingSerializer.setup_eager_loading(model.objects.all()), pk=booking_id)
+        serializer = BookingSerializer(booking, context={'request': request})
+        return set_validators(Response(serializer.data), etag, last_modified)
 
-            if booking.vehicle.owner.user != request.user:
-                return Response(
-                    {"detail": "Only vehicle owner can return vehicles."},
-                    status=status.HTTP_403_FORBIDDEN
-                )
 
-            update_booking_status(booking, 'returned', user=request.user)
-            return Response({"message": "Vehicle returned."}, status=status.HTTP_200_OK)
-        except Booking.DoesNotExist:
-            return Response({"detail": "Booking not found."}, status=status.HTTP_404_NOT_FOUND)
+# Public endpoint to list cars with no active booking in a time window
+class AvailableCarsAPI(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []  # No authentication required
+    pagination_class = CarCursorPagination
 
+    def parse_time(self, value):
+        parsed = parse_datetime(value) if value else None
+        if parsed and timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
 
-# Public endpoint to get car details
-class BookingDetailAPI(APIView):
+    def parse_window(self, request):
+        try:
+            start_time = self.parse_time(request.query_params.get('start_time'))
+            end_time = self.parse_time(request.query_params.get('end_time'))
+        except ValueError:
+            start_time = end_time = None
+
+        if not start_time or not end_time:
+            raise ParseError("start_time and end_time are required ISO 8601 datetimes.")
+        if end_time <= start_time:
+            raise ParseError("end_time must be after start_time.")
+        return start_time, end_time
+
+    def get(self, request):
+        start_time, end_time = self.parse_window(request)
+        cars = available_vehicles(CarSerializer.setup_eager_loading(Car.objects.all()), start_time, end_time)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(cars, request, view=self)
+        serializer = CarSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+
+# Public endpoint suggesting the earliest window of the same length a vehicle is free for
+class NextFreeWindowAPI(AvailableCarsAPI):
+    pagination_class = None
+
+    def get(self, request, vehicle_id):
+        start_time, end_time = self.parse_window(request)
+        if not Vehicle.objects.filter(pk=vehicle_id).exists():
+            raise Http404
+
+        duration = end_time - start_time
+        free_from = next_free_start(vehicle_id, start_time, duration)
+        return Response({'vehicle_id': vehicle_id, 'start_time': free_from, 'end_time': free_from + duration})
+
+
+# Public endpoint to price one rental window for many vehicles at once
+class QuoteAPI(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []  # No authentication required
+
+    def post(self, request):
+        serializer = QuoteRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        window, quotes, missing = quote_vehicles(data['vehicle_ids'], data['start_time'], data['end_time'])
+        # Decimals go out as strings, like DecimalField; a serializer per row costs more than the pricing
+        return Response({
+            'start_time': data['start_time'],
+            'end_time': data['end_time'],
+            'billable_hours': str(window.hours(window.billable_hours)),
+            'charged_hours': str(window.hours(window.charged_hours)),
+            'quotes': [
+                {
+                    'vehicle_id': quote['vehicle_id'],
+                    'price_per_hour': str(quote['price_per_hour']),
+                    'total_price': str(quote['total_price']),
+                }
+                for quote in quotes
+            ],
+            'missing': missing,
+        })
+
+
+# Utilization, revenue and idle time of the requesting owner's fleet
+class OwnerAnalyticsAPI(APIView):
     authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
 
-    def get(self, request, booking_id):
-        booking = get_object_or_404(Booking, pk=booking_id)
-        serializer = BookingSerializer(booking, context={'request': request})
-        return Response(serializer.data)
+    def get(self, request):
+        owner = get_principal(request).owner
+        if owner is None:
+            return Response({"detail": "User is not registered as an owner"}, status=status.HTTP_403_FORBIDDEN)
+        serializer = AnalyticsQuerySerializer(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return Response(owner_analytics(owner, serializer.validated_data['start_time'],
+                                        serializer.validated_data['end_time']))
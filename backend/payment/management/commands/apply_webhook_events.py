@@ -0,0 +1,21 @@
+import time
+from django.core.management.base import BaseCommand
+from payment.webhooks import apply_events, purge_events
+
+
+class Command(BaseCommand):
+    help = 'Apply received Stripe and PayPal webhook events to payments and bookings'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=int, default=None,
+                            help='Keep running and apply new events every this many seconds instead of once')
+
+    def handle(self, *args, **options):
+        while True:
+            applied = apply_events(batch_size=options['batch_size'])
+            purged = purge_events()
+            self.stdout.write(self.style.SUCCESS(f'Applied {applied} webhook events, purged {purged} old ones.'))
+            if options['interval'] is None:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,115 @@
+import json
+import threading
+import time
+import zlib
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+from fleet_management.models import Vehicle
+from overdrive.models import Booking
+from payment.models import BookingPayment
+from payment.reconciliation import reconcile
+from payment.services.paypal_service import paypal_tokens
+
+User = get_user_model()
+
+AMOUNT = '10.00'
+
+
+class FakePayPalHandler(BaseHTTPRequestHandler):
+    """Answers PayPal's token and order lookups; a mismatch_rate share of orders come back VOIDED."""
+    protocol_version = 'HTTP/1.1'  # Keep-alive, as the pooled client expects
+    disable_nagle_algorithm = True  # Headers and body go out in separate writes
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        self.respond({'access_token': 'bench', 'token_type': 'Bearer', 'scope': '', 'app_id': 'bench',
+                      'expires_in': 32400, 'nonce': 'bench'})
+
+    def do_GET(self):
+        order_id = self.path.rsplit('/', 1)[-1]
+        voided = zlib.crc32(order_id.encode()) % 10000 < self.server.mismatch_rate * 10000
+        time.sleep(self.server.latency)
+        self.respond({'id': order_id, 'status': 'VOIDED' if voided else 'COMPLETED',
+                      'purchase_units': [{'amount': {'currency_code': 'USD', 'value': AMOUNT}}]})
+
+    def respond(self, payload):
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Reconcile seeded PayPal payments against a local fake PayPal and time it'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=100000)
+        parser.add_argument('--threads', type=int, default=settings.RECONCILIATION['threads'])
+        parser.add_argument('--latency', type=float, default=0.01, help='Fake provider lookup time in seconds')
+        parser.add_argument('--rate', type=float, default=0, help='Lookups per second, 0 for no limit')
+        parser.add_argument('--mismatch-rate', type=float, default=0.01,
+                            help='Share of orders the fake provider reports as voided')
+        parser.add_argument('--sample', type=int, default=1000,
+                            help='Payments reconciled on one thread for the baseline')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            self.stdout.write(self.style.ERROR('The benchmark can only be run in DEBUG mode.'))
+            return
+        server = ThreadingHTTPServer(('127.0.0.1', 0), FakePayPalHandler)
+        server.daemon_threads = True
+        server.latency = options['latency']
+        server.mismatch_rate = options['mismatch_rate']
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        user, _ = User.objects.get_or_create(
+            email='bench@reconciliation.com', defaults={'user_type': 'customer', 'is_active': True})
+        vehicle = Vehicle.objects.create(name='Reconciliation bench', passenger_capacity=4, price_per_hour=10)
+        start = timezone.now() + timedelta(days=1)
+        booking = Booking.objects.create(user=user, vehicle=vehicle, start_time=start,
+                                         end_time=start + timedelta(hours=1), total_price=10, status='confirmed')
+        began = time.perf_counter()
+        BookingPayment.objects.bulk_create(
+            (BookingPayment(booking=booking, amount=AMOUNT, method='paypal', status='completed',
+                            transaction_id=f'BENCH-{i}') for i in range(options['payments'])),
+            batch_size=5000)
+        self.stdout.write(f'Seeded {options["payments"]} payments in {time.perf_counter() - began:.1f} s')
+
+        rates = {'paypal': options['rate']} if options['rate'] else {}
+        http = dict(settings.PAYMENT_HTTP, pool_size=options['threads'])
+        try:
+            with override_settings(PAYPAL_BASE_URL=f'http://127.0.0.1:{server.server_address[1]}', PAYMENT_HTTP=http):
+                paypal_tokens.clear()
+                payments = BookingPayment.objects.filter(booking=booking).order_by('pk')
+
+                sample = list(payments.values_list('pk', flat=True)[:options['sample']])
+                began = time.perf_counter()
+                reconcile(payments.filter(pk__in=sample), threads=1, rates=rates, apply=False)
+                single = time.perf_counter() - began
+                self.stdout.write(f'1 thread: {len(sample) / single:.0f} payments/s '
+                                  f'(~{single * options["payments"] / len(sample):.0f} s for {options["payments"]})')
+
+                began = time.perf_counter()
+                totals = reconcile(payments, threads=options['threads'], rates=rates)
+                elapsed = time.perf_counter() - began
+                self.stdout.write(f'{options["threads"]} threads: {totals["checked"]} payments in {elapsed:.1f} s, '
+                                  f'{totals["checked"] / elapsed:.0f} payments/s')
+                self.stdout.write(self.style.SUCCESS(
+                    f'{totals["reversed"]} completed payments reported as voided, '
+                    f'{totals["status"]} status discrepancies, {totals["corrected"]} corrected.'))
+        finally:
+            paypal_tokens.clear()
+            server.shutdown()
+            BookingPayment.objects.filter(booking=booking).delete()
+            booking.delete()
+            vehicle.delete()
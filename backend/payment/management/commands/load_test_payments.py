@@ -0,0 +1,99 @@
+import statistics
+import threading
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from fleet_management.models import Vehicle
+from overdrive.models import Booking
+from payment.models import BookingPayment
+from payment.worker import FINAL_STATUSES
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Send a burst of checkouts against the fake provider and time requests and settlement'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--payments', type=int, default=200)
+        parser.add_argument('--web-workers', type=int, default=8,
+                            help='Concurrent request threads, standing in for the WSGI worker pool')
+        parser.add_argument('--latency', type=float, default=0.5, help='Fake provider round trip in seconds')
+        parser.add_argument('--sync', action='store_true', help='Charge inside the request, as before PAYMENT_ASYNC')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG:
+            self.stdout.write(self.style.ERROR('The load test can only be run in DEBUG mode.'))
+            return
+        user, _ = User.objects.get_or_create(
+            email='loadtest@customer.com', defaults={'user_type': 'customer', 'is_active': True})
+        vehicle = Vehicle.objects.create(name='Load test', passenger_capacity=4, price_per_hour=10)
+        start = timezone.now() + timedelta(days=1)
+        booking = Booking.objects.create(user=user, vehicle=vehicle, start_time=start,
+                                         end_time=start + timedelta(hours=1), total_price=10)
+        token = str(RefreshToken.for_user(user).access_token)
+
+        remaining = iter(range(options['payments']))
+        lock = threading.Lock()
+        latencies = []
+        payment_ids = []
+
+        def web_worker():
+            client = APIClient(HTTP_HOST='localhost')
+            client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+            try:
+                while True:
+                    with lock:
+                        if next(remaining, None) is None:
+                            return
+                    began = time.perf_counter()
+                    response = client.post(f'/api/payment/{booking.id}/', {'amount': '10.00', 'method': 'fake'},
+                                           format='json')
+                    elapsed = time.perf_counter() - began
+                    with lock:
+                        latencies.append(elapsed)
+                        if response.status_code == 202:
+                            payment_ids.append(response.data['id'])
+            finally:
+                connections.close_all()
+
+        # The fake provider exists only for this run; it is never a configured payment method
+        fake_provider = {'latency': options['latency'], 'failure_rate': 0.0}
+        try:
+            with override_settings(PAYMENT_ASYNC=not options['sync'], PAYMENT_FAKE_PROVIDER=fake_provider,
+                                   PAYMENT_METHOD_CHOICES=settings.PAYMENT_METHOD_CHOICES + [('fake', 'Fake provider')],
+                                   ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'localhost']):
+                began = time.perf_counter()
+                threads = [threading.Thread(target=web_worker) for _ in range(options['web_workers'])]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                accepted = time.perf_counter() - began
+                while BookingPayment.objects.filter(pk__in=payment_ids).exclude(status__in=FINAL_STATUSES).exists():
+                    time.sleep(0.05)
+                settled = time.perf_counter() - began
+
+            latencies.sort()
+            mode = 'sync' if options['sync'] else f'async, {settings.PAYMENT_WORKER_THREADS} payment threads'
+            self.stdout.write(
+                f'{len(latencies)} checkouts ({mode}, {options["web_workers"]} web workers, '
+                f'{options["latency"]}s provider latency)')
+            self.stdout.write(
+                f'Request latency: median {statistics.median(latencies) * 1000:.0f} ms, '
+                f'p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.0f} ms, max {latencies[-1] * 1000:.0f} ms')
+            self.stdout.write(
+                f'All requests answered after {accepted:.2f} s, all payments settled after {settled:.2f} s')
+            completed = BookingPayment.objects.filter(pk__in=payment_ids, status='completed').count()
+            self.stdout.write(self.style.SUCCESS(f'{completed} of {len(payment_ids)} accepted payments completed.'))
+        finally:
+            BookingPayment.objects.filter(booking=booking).delete()
+            booking.delete()
+            vehicle.delete()
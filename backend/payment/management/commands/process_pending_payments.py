@@ -0,0 +1,28 @@
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payment.models import BookingPayment
+from payment.worker import run_in_worker
+
+
+class Command(BaseCommand):
+    help = 'Run payments left pending by a web process that stopped before its worker pool got to them'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=300, help='Seconds a payment must have been pending')
+        parser.add_argument('--threads', type=int, default=8)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=options['older_than'])
+        pending = list(BookingPayment.objects.filter(status='pending', updated_at__lt=cutoff).values_list('pk', flat=True))
+        # Each run claims its payment first, so one still queued in a live web process is not charged twice
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(run_in_worker, pending))
+        self.stdout.write(self.style.SUCCESS(f'Ran {len(pending)} pending payments.'))
+
+        # A payment stuck in processing may or may not have reached its provider; it needs a person to check
+        stuck = BookingPayment.objects.filter(status='processing', updated_at__lt=cutoff).count()
+        if stuck:
+            self.stdout.write(self.style.WARNING(
+                f'{stuck} payments have been processing since before {cutoff:%Y-%m-%d %H:%M}; check them with the provider.'))
@@ -0,0 +1,30 @@
+import csv
+from contextlib import nullcontext
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from payment.reconciliation import DISCREPANCY_KINDS, REPORT_FIELDS, reconcilable_payments, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Check open and recent payments against Stripe and PayPal and correct their statuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lookback-hours', type=int, default=settings.RECONCILIATION['lookback_hours'])
+        parser.add_argument('--threads', type=int, default=settings.RECONCILIATION['threads'])
+        parser.add_argument('--chunk-size', type=int, default=settings.RECONCILIATION['chunk_size'])
+        parser.add_argument('--report', help='Write every discrepancy to this CSV file')
+        parser.add_argument('--dry-run', action='store_true', help='Report discrepancies without correcting them')
+
+    def handle(self, *args, **options):
+        payments = reconcilable_payments(lookback_hours=options['lookback_hours'])
+        with (open(options['report'], 'w', newline='') if options['report'] else nullcontext()) as report_file:
+            report = None
+            if report_file is not None:
+                report = csv.writer(report_file)
+                report.writerow(REPORT_FIELDS)
+            totals = reconcile(payments, threads=options['threads'], chunk_size=options['chunk_size'],
+                               report=report, apply=not options['dry_run'])
+
+        discrepancies = ', '.join(f'{totals[kind]} {kind}' for kind in DISCREPANCY_KINDS)
+        self.stdout.write(f'Checked {totals["checked"]} payments: {discrepancies}.')
+        self.stdout.write(self.style.SUCCESS(f'Corrected {totals["corrected"]} payment statuses.'))
@@ -1,7 +1,7 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
-from overdrive.models import Booking
+from overdrive.models import ArchivedBooking, Booking
 
 class BookingPayment(models.Model):
     booking = models.ForeignKey(Booking, on_delete=models.CASCADE)
@@ -14,6 +14,100 @@ class BookingPayment(models.Model):
 
     class Meta:
         db_table = 'booking_payments'
+        indexes = [
+            # Provider webhooks find their payment by transaction id, see payment.webhooks
+            models.Index(fields=['transaction_id'], name='payment_transaction_idx'),
+        ]
 
     def __str__(self):
         return f"Payment for Booking {self.booking.id} - {self.status}"
+
+
+class ArchivedBookingPayment(models.Model):
+    """A BookingPayment moved to the archive along with its booking, see overdrive.archive."""
+    id = models.BigIntegerField(primary_key=True)
+    booking = models.ForeignKey(ArchivedBooking, on_delete=models.CASCADE)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    method = models.CharField(max_length=16, choices=settings.PAYMENT_METHOD_CHOICES)
+    transaction_id = models.CharField(max_length=100, blank=True, null=True)
+    status = models.CharField(max_length=32)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        db_table = 'booking_payments_archive'
+
+
+# The provider subtypes' own columns, archived next to their ArchivedBookingPayment under the same id
+
+class ArchivedStripeBookingPayment(models.Model):
+    bookingpayment_ptr = models.OneToOneField(ArchivedBookingPayment, on_delete=models.CASCADE, primary_key=True,
+                                              related_name='+')
+    client_secret = models.CharField(max_length=100, blank=True, null=True)
+    capture_method = models.CharField(max_length=100, blank=True, null=True)
+    confirmation_method = models.CharField(max_length=100, blank=True, null=True)
+
+    class Meta:
+        db_table = 'booking_payments_stripe_archive'
+
+
+class ArchivedPayPalBookingPayment(models.Model):
+    bookingpayment_ptr = models.OneToOneField(ArchivedBookingPayment, on_delete=models.CASCADE, primary_key=True,
+                                              related_name='+')
+    paypal_request_id = models.CharField(max_length=38, blank=True, null=True)
+    order_id = models.CharField(max_length=100, blank=True, null=True)
+    payer = models.JSONField(blank=True, null=True)
+    payment_source = models.JSONField(blank=True, null=True)
+    links = models.JSONField(blank=True, null=True)
+
+    class Meta:
+        db_table = 'booking_payments_paypal_archive'
+
+
+class ArchivedCashBookingPayment(models.Model):
+    bookingpayment_ptr = models.OneToOneField(ArchivedBookingPayment, on_delete=models.CASCADE, primary_key=True,
+                                              related_name='+')
+
+    class Meta:
+        db_table = 'booking_payments_cash_archive'
+
+
+class ArchivedGcashBookingPayment(models.Model):
+    bookingpayment_ptr = models.OneToOneField(ArchivedBookingPayment, on_delete=models.CASCADE, primary_key=True,
+                                              related_name='+')
+
+    class Meta:
+        db_table = 'booking_payments_gcash_archive'
+
+
+class WebhookEvent(models.Model):
+    """
+    A provider webhook event as received, waiting for payment.webhooks.apply_events.
+
+    The unique (provider, event_id) constraint is the deduplication: a
+    retried delivery is one INSERT that conflicts and is ignored.
+    """
+    PROVIDER_CHOICES = [('stripe', 'Stripe'), ('paypal', 'PayPal')]
+
+    provider = models.CharField(max_length=16, choices=PROVIDER_CHOICES)
+    event_id = models.CharField(max_length=255)
+    event_type = models.CharField(max_length=100)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    error = models.TextField(blank=True)  # Why an event changed nothing, e.g. no payment with its reference
+
+    class Meta:
+        db_table = 'payment_webhook_events'
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'event_id'], name='webhook_event_unique'),
+        ]
+        indexes = [
+            # The consumer's queue: only unprocessed events, in arrival order
+            models.Index(fields=['id'], condition=models.Q(processed_at__isnull=True), name='webhook_event_pending_idx'),
+            # Purging processed events
+            models.Index(fields=['processed_at'], name='webhook_event_processed_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.event_type} {self.event_id}"
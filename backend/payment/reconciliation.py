@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from .models import BookingPayment
+from .services import get_payment_service
+from .webhooks import confirm_paid_bookings
+from .worker import FINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+REPORT_FIELDS = ['payment_id', 'method', 'transaction_id', 'kind', 'status', 'provider_status', 'amount',
+                 'provider_amount', 'action']
+DISCREPANCY_KINDS = ('status', 'reversed', 'amount', 'unsettled', 'missing', 'error')
+
+
+class RateLimiter:
+    """A token bucket shared by threads: at most rate calls per second, in bursts of up to burst."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or max(1, int(rate))
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def reconcilable_payments(now=None, lookback_hours=None):
+    """Payments not yet completed or failed, and those updated within the lookback, that a provider can be asked about."""
+    now = now or timezone.now()
+    if lookback_hours is None:
+        lookback_hours = settings.RECONCILIATION['lookback_hours']
+    methods = [method for method, _ in settings.PAYMENT_METHOD_CHOICES
+               if hasattr(get_payment_service(method), 'lookup_payment')]
+    return BookingPayment.objects.filter(
+        ~Q(status__in=FINAL_STATUSES) | Q(updated_at__gte=now - timedelta(hours=lookback_hours)),
+        method__in=methods, transaction_id__isnull=False,
+    ).order_by('pk')
+
+
+def compare(payment, found):
+    """The (kind, corrected status) of a discrepancy between a payment and its provider's record, or None."""
+    if found is None:
+        return 'missing', None
+    if found['status'] is None:
+        # Still open at the provider; only a problem if we already call it settled
+        return ('unsettled', None) if payment['status'] in FINAL_STATUSES else None
+    if found['amount'] != payment['amount']:
+        return 'amount', None  # Which side is wrong is for a person to decide
+    if found['status'] != payment['status']:
+        if payment['status'] == 'completed':
+            # Never failed automatically, as with webhooks: its booking may already be confirmed or under way
+            return 'reversed', None
+        return 'status', found['status']
+    return None
+
+
+def reconcile(payments, threads=None, rates=None, chunk_size=None, report=None, apply=True):
+    """
+    Check payments against their providers and correct statuses in bulk.
+
+    payments is a BookingPayment queryset, streamed with iterator() in
+    chunks of chunk_size. Each chunk is looked up on a pool of threads, with
+    each provider's calls held to its rates entry (calls per second) by a
+    shared RateLimiter. Status corrections are collected while streaming,
+    since SQLite does not isolate an open cursor from writes on its
+    connection, and then written with one UPDATE per (old, new) status pair
+    and chunk. Each only matches payments still in the old status, so one
+    settled by a webhook meanwhile is left alone. Requested bookings whose
+    payment turned out completed are confirmed.
+    Like the webhook consumer (see apply_events), this never moves a
+    completed payment back to failed: a provider that voided or refunded it
+    is reported as 'reversed' for a person to settle with the booking.
+    Amount mismatches, unknown transactions and payments we consider settled
+    while the provider does not are reported but not changed either.
+
+    report, if given, is a csv.writer; one row of REPORT_FIELDS is written per
+    discrepancy. Returns a Counter of payments checked and discrepancies by kind.
+    """
+    options = settings.RECONCILIATION
+    threads = threads or options['threads']
+    chunk_size = chunk_size or options['chunk_size']
+    rates = options['rates'] if rates is None else rates
+    limiters = {method: RateLimiter(rate) for method, rate in rates.items() if rate}
+    services = {}
+    services_lock = threading.Lock()
+    totals = Counter()
+
+    def lookup(payment):
+        method = payment['method']
+        try:
+            with services_lock:
+                if method not in services:
+                    # One instance per provider, so PayPal's token is fetched once rather than by every thread
+                    services[method] = get_payment_service(method)()
+            if method in limiters:
+                limiters[method].acquire()
+            return services[method].lookup_payment(payment['transaction_id'])
+        except Exception as e:
+            logger.warning("Could not look up %s payment %s: %s", method, payment['id'], e)
+            return e
+
+    rows = payments.values('id', 'method', 'transaction_id', 'status', 'amount').iterator(chunk_size=chunk_size)
+    corrections = defaultdict(list)
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix='reconcile') as pool:
+        while chunk := list(islice(rows, chunk_size)):
+            for payment, found in zip(chunk, pool.map(lookup, chunk)):
+                totals['checked'] += 1
+                if isinstance(found, Exception):
+                    kind, status = 'error', None
+                    found = None
+                else:
+                    discrepancy = compare(payment, found)
+                    if discrepancy is None:
+                        continue
+                    kind, status = discrepancy
+                totals[kind] += 1
+                if status is not None and apply:
+                    corrections[payment['status'], status].append(payment['id'])
+                if report is not None:
+                    report.writerow([
+                        payment['id'], payment['method'], payment['transaction_id'], kind, payment['status'],
+                        found and found['provider_status'], payment['amount'], found and found['amount'],
+                        f"set {status}" if status is not None and apply else '',
+                    ])
+    totals['corrected'] = apply_corrections(corrections, chunk_size)
+    return totals
+
+
+def apply_corrections(corrections, chunk_size=1000):
+    """Write {(old status, new status): payment ids} and return how many payments changed."""
+    now = timezone.now()
+    corrected = 0
+    for (old_status, new_status), payment_ids in corrections.items():
+        for start in range(0, len(payment_ids), chunk_size):
+            chunk = payment_ids[start:start + chunk_size]
+            corrected += BookingPayment.objects.filter(pk__in=chunk, status=old_status).update(
+                status=new_status, updated_at=now)
+            if new_status == 'completed':
+                confirm_paid_bookings(set(BookingPayment.objects.filter(
+                    pk__in=chunk, status='completed').values_list('booking_id', flat=True)))
+    return corrected
@@ -3,6 +3,9 @@ from .models import BookingPayment
 from django.conf import settings
 
 class BookingPaymentSerializer(serializers.ModelSerializer):
+    # Checked against the settings on each request rather than the model's choices, which are fixed at import
+    method = serializers.CharField(max_length=16)
+
     class Meta:
         model = BookingPayment
         fields = ['id', 'booking', 'amount', 'method', 'transaction_id', 'status', 'created_at']
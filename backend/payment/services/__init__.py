@@ -2,6 +2,8 @@ from .gcash_service import GcashService
 from .paypal_service import PaypalService
 from .stripe_service import StripeService
 from .cash_service import CashService
+from .fake_service import FakeService
+from django.conf import settings
 
 def get_payment_service(method):
     services = {
@@ -10,4 +12,6 @@ def get_payment_service(method):
         'stripe': StripeService,
         'cash': CashService,
     }
+    if getattr(settings, 'PAYMENT_FAKE_PROVIDER', None):
+        services['fake'] = FakeService
     return services.get(method)
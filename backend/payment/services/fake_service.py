@@ -0,0 +1,23 @@
+import random
+import time
+import uuid
+from django.conf import settings
+
+
+class FakeService:
+    """
+    A stand-in provider for load testing: waits like a gateway round trip, then succeeds or fails.
+
+    Only offered as a payment method while settings.PAYMENT_FAKE_PROVIDER is
+    set, with 'latency' in seconds and the 'failure_rate' between 0 and 1;
+    load_test_payments sets it for the duration of its run.
+    """
+
+    def process_payment(self, payment):
+        options = settings.PAYMENT_FAKE_PROVIDER
+        time.sleep(options.get('latency', 0.5))
+        if random.random() < options.get('failure_rate', 0):
+            return False
+        payment.transaction_id = f"FAKE-{uuid.uuid4().hex}"
+        payment.save()
+        return True
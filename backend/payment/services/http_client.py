@@ -0,0 +1,83 @@
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+# Headers that make a POST safe to repeat: the provider applies a request id at most once
+IDEMPOTENCY_HEADERS = ('PayPal-Request-Id', 'Idempotency-Key')
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'])
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class ProviderClient:
+    """
+    A pooled HTTP client for payment provider APIs.
+
+    Connections are kept alive in a requests.Session, at most pool_size per
+    host, and every call gets connect and read timeouts. Calls that are safe
+    to repeat (idempotent methods, or a POST carrying one of
+    IDEMPOTENCY_HEADERS) are retried on connection errors, timeouts and
+    RETRY_STATUSES, up to retries times with full-jitter exponential
+    backoff; any other call is sent exactly once, since repeating it could
+    charge a customer twice.
+    """
+
+    def __init__(self, pool_size=10, connect_timeout=3.05, read_timeout=30, retries=2, backoff=0.5, max_backoff=5):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        # Retries are done here, where the request's idempotency is known, not by urllib3
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    @classmethod
+    def from_settings(cls):
+        return cls(**getattr(settings, 'PAYMENT_HTTP', {}))
+
+    def is_idempotent(self, method, headers):
+        return method.upper() in IDEMPOTENT_METHODS or any((headers or {}).get(name) for name in IDEMPOTENCY_HEADERS)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = 1 + (self.retries if self.is_idempotent(method, kwargs.get('headers')) else 0)
+        for attempt in range(1, attempts + 1):
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == attempts:
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES or attempt == attempts:
+                    return response
+                response.close()
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1))))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process's ProviderClient; forked workers get their own so they never share sockets."""
+    global _client, _client_pid
+    if _client is None or _client_pid != os.getpid():
+        with _client_lock:
+            if _client is None or _client_pid != os.getpid():
+                _client, _client_pid = ProviderClient.from_settings(), os.getpid()
+    return _client
@@ -1,6 +1,30 @@
-import requests
 import json
+from decimal import Decimal
 from django.conf import settings
+from .http_client import get_client
+from .token_provider import TokenProvider
+
+def fetch_access_token():
+    # This function fetches an access token for API calls
+    auth = (settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET)
+    headers = {"Accept": "application/json", 
+               "Accept-Language": "en_US", 
+               "Content-Type": "application/x-www-form-urlencoded"}
+    response = get_client().post(
+        f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
+        headers=headers,
+        auth=auth,
+        data={"grant_type": "client_credentials"}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+paypal_tokens = TokenProvider('paypal', fetch_access_token)
+
+# Order statuses that settle a payment; the others are still open
+SETTLED_STATUSES = {'COMPLETED': 'completed', 'VOIDED': 'failed'}
+
 
 class PaypalService:
     def __init__(self):
@@ -13,33 +37,31 @@ class PaypalService:
         self._get_access_token()
 
     def _get_access_token(self):
-        # This function fetches an access token for API calls
-        auth = (settings.PAYPAL_CLIENT_ID, settings.PAYPAL_SECRET)
-        headers = {"Accept": "application/json", 
-                   "Accept-Language": "en_US", 
-                   "Content-Type": "application/x-www-form-urlencoded"}
-        response = requests.post(
-            f"{settings.PAYPAL_BASE_URL}/v1/oauth2/token",
-            headers=headers,
-            auth=auth,
-            data={"grant_type": "client_credentials"}
-        )
-        response.raise_for_status()
-        response_data = response.json()
-        self.access_token = response_data['access_token']
-        self.token_type = response_data['token_type']
-        self.scope = response_data['scope']
-        self.app_id = response_data['app_id']
-        self.expires_in = response_data['expires_in']
-        self.nonce = response_data['nonce']
+        # The token is shared by every service instance, thread and worker until shortly before it expires
+        token = paypal_tokens.get()
+        self.access_token = token['access_token']
+        self.token_type = token['token_type']
+        self.scope = token['scope']
+        self.app_id = token['app_id']
+        self.expires_in = token['expires_in']
+        self.nonce = token['nonce']
 
-        return response_data['access_token']
+        return token['access_token']
+
+    def _request(self, method, url, headers, **kwargs):
+        # PayPal can revoke a token before it expires; a 401 drops it for every worker and the call is made once more
+        send = getattr(get_client(), method)
+        response = send(url, headers=dict(headers, Authorization=f"Bearer {self.access_token}"), **kwargs)
+        if response.status_code == 401:
+            paypal_tokens.clear()
+            self._get_access_token()
+            response = send(url, headers=dict(headers, Authorization=f"Bearer {self.access_token}"), **kwargs)
+        return response
 
     def checkout_orders(self, payment):
         headers = {
             "Content-Type": "application/json",
             'Accept': 'application/json',
-            "Authorization": f"Bearer {self.access_token}",
             "PayPal-Request-Id": payment.paypal_request_id,
         }
         data = {
@@ -55,7 +77,8 @@ class PaypalService:
             ]
         }
 
-        response = requests.post(
+        response = self._request(
+            'post',
             f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders",
             headers=headers,
             data=json.dumps(data)
@@ -73,7 +96,7 @@ class PaypalService:
         order_id = payment.order_id
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.access_token}"
+            "PayPal-Request-Id": payment.paypal_request_id,  # Makes the call safe for the client to retry
         }
 
         data = { 
@@ -96,7 +119,8 @@ class PaypalService:
         }
 
         
-        response = requests.post(
+        response = self._request(
+            'post',
             f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders/{order_id}/confirm-payment-source",
             headers=headers,
             data=json.dumps(data)
@@ -108,9 +132,9 @@ class PaypalService:
         headers = {
             "Content-Type": "application/json",
             "PayPal-Request-Id": payment.paypal_request_id,
-            "Authorization": f"Bearer {self.access_token}"
         }
-        response = requests.post(
+        response = self._request(
+            'post',
             f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders/{order_id}/capture",
             headers=headers
         )
@@ -125,3 +149,40 @@ class PaypalService:
         else:
             print(f"Error capturing PayPal payment: {response.text}")
             return False, response.json()
+
+    def verify_webhook_signature(self, headers, event):
+        # PayPal checks the transmission signature against its certificate and our webhook id
+        data = {
+            "auth_algo": headers.get("Paypal-Auth-Algo"),
+            "cert_url": headers.get("Paypal-Cert-Url"),
+            "transmission_id": headers.get("Paypal-Transmission-Id"),
+            "transmission_sig": headers.get("Paypal-Transmission-Sig"),
+            "transmission_time": headers.get("Paypal-Transmission-Time"),
+            "webhook_id": settings.PAYPAL_WEBHOOK_ID,
+            "webhook_event": event,
+        }
+        response = self._request(
+            'post',
+            f"{settings.PAYPAL_BASE_URL}/v1/notifications/verify-webhook-signature",
+            headers={"Content-Type": "application/json"},
+            data=json.dumps(data)
+        )
+        return response.status_code == 200 and response.json().get("verification_status") == "SUCCESS"
+
+    def lookup_payment(self, transaction_id):
+        # What PayPal has for the order, or None if it does not know it; other errors are raised
+        self._get_access_token()  # This instance may be shared by a long reconciliation run
+        response = self._request(
+            'get',
+            f"{settings.PAYPAL_BASE_URL}/v2/checkout/orders/{transaction_id}",
+            headers={"Accept": "application/json"}
+        )
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        order = response.json()
+        return {
+            'status': SETTLED_STATUSES.get(order['status']),
+            'provider_status': order['status'],
+            'amount': Decimal(order['purchase_units'][0]['amount']['value']),
+        }
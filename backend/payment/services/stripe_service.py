@@ -1,9 +1,33 @@
+import os
+from decimal import Decimal
 import stripe
 from django.conf import settings
+from .http_client import get_client
 
 stripe.api_key = settings.STRIPE_SECRET_KEY
 
+# PaymentIntent statuses that settle a payment; the others are still open
+SETTLED_STATUSES = {'succeeded': 'completed', 'canceled': 'failed'}
+
+_http_client_pid = None
+
+
+def use_pooled_client():
+    # The SDK's default client has an 80 s timeout and its own connections; send its calls through the
+    # process's ProviderClient session with PAYMENT_HTTP's timeouts instead. The SDK adds an idempotency
+    # key to the POSTs it retries.
+    global _http_client_pid
+    if _http_client_pid != os.getpid():
+        client = get_client()
+        stripe.default_http_client = stripe.RequestsClient(session=client.session, timeout=client.timeout)
+        stripe.max_network_retries = client.retries
+        _http_client_pid = os.getpid()
+
+
 class StripeService:
+    def __init__(self):
+        use_pooled_client()
+
     def process_payment(self, payment):
         try:
             # Create a PaymentIntent
@@ -47,3 +71,16 @@ class StripeService:
             # Handle Stripe errors
             return False
 
+    def lookup_payment(self, transaction_id):
+        # What Stripe has for the PaymentIntent, or None if it does not know it; other errors are raised
+        try:
+            intent = stripe.PaymentIntent.retrieve(transaction_id)
+        except stripe.error.InvalidRequestError as e:
+            if e.code == 'resource_missing':
+                return None
+            raise
+        return {
+            'status': SETTLED_STATUSES.get(intent['status']),
+            'provider_status': intent['status'],
+            'amount': Decimal(intent['amount']) / 100,
+        }
@@ -0,0 +1,121 @@
+import logging
+import threading
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+LEASE_SECONDS = 30  # How long one worker may hold the right to fetch before others fetch anyway
+WAIT_INTERVAL = 0.05
+RETRY_SECONDS = 5  # Pause between failed background refreshes
+
+
+class TokenProvider:
+    """
+    An OAuth access token shared by every thread and, through the Django cache, every worker.
+
+    fetch() calls the token endpoint and returns its JSON, which must carry
+    access_token and expires_in. A token is served until
+    OAUTH_TOKEN_EXPIRY_MARGIN seconds before it expires; once it is within
+    OAUTH_TOKEN_REFRESH_AHEAD seconds of that, callers keep getting it while
+    one background thread fetches its replacement, so requests only wait on
+    the token endpoint when no usable token exists at all. Fetches are
+    serialized by a thread lock within a process and a lease key in the cache
+    across processes, and whoever does not hold the lease waits for the token
+    the holder stores. The cache must be shared (Redis, Memcached, database)
+    for workers to share tokens; with LocMemCache each process keeps its own.
+    """
+
+    def __init__(self, name, fetch):
+        self.name = name
+        self.fetch = fetch
+        self._lock = threading.Lock()
+        self._token = None  # Process-local copy, saves a cache round trip per call
+        self._refresher = None
+        self._retry_at = 0
+
+    @property
+    def cache_key(self):
+        return f'oauth-token:{self.name}'
+
+    @property
+    def lease_key(self):
+        return f'oauth-token-lease:{self.name}'
+
+    def get(self):
+        """The current token's data: the token endpoint's JSON plus expires_at and refresh_at timestamps."""
+        now = time.time()
+        token = self._token
+        if not self._usable(token, now):
+            token = cache.get(self.cache_key)
+            if not self._usable(token, now):
+                token = self._refresh(token)
+        if now >= token['refresh_at']:
+            self._refresh_in_background(token)
+        self._token = token
+        return token
+
+    def clear(self):
+        """Forget the token here and in the cache, e.g. after the provider rejected it."""
+        self._token = None
+        cache.delete(self.cache_key)
+
+    def _usable(self, token, now):
+        return token is not None and now < token['expires_at']
+
+    def _is_newer(self, token, current):
+        return self._usable(token, time.time()) and (
+            current is None or token['access_token'] != current['access_token'])
+
+    def _refresh(self, current):
+        with self._lock:
+            # Another thread may have stored a new token while this one waited for the lock
+            token = cache.get(self.cache_key)
+            if self._is_newer(token, current):
+                self._token = token
+                return token
+
+            leased = False
+            deadline = time.time() + LEASE_SECONDS
+            while not (leased := cache.add(self.lease_key, True, LEASE_SECONDS)):
+                token = cache.get(self.cache_key)
+                if self._is_newer(token, current):
+                    self._token = token
+                    return token
+                if time.time() >= deadline:
+                    break  # The lease holder died or hangs; fetch without it
+                time.sleep(WAIT_INTERVAL)
+            try:
+                data = self.fetch()
+                now = time.time()
+                lifetime = data['expires_in']
+                # Short-lived tokens scale the margins down rather than being refreshed on every call
+                expires_at = now + lifetime - min(getattr(settings, 'OAUTH_TOKEN_EXPIRY_MARGIN', 60), lifetime / 10)
+                refresh_at = expires_at - min(getattr(settings, 'OAUTH_TOKEN_REFRESH_AHEAD', 300), lifetime / 4)
+                token = dict(data, expires_at=expires_at, refresh_at=refresh_at)
+                cache.set(self.cache_key, token, timeout=max(int(expires_at - now), 1))
+                self._token = token
+                return token
+            finally:
+                if leased:
+                    cache.delete(self.lease_key)
+
+    def _refresh_in_background(self, current):
+        if time.time() < self._retry_at or not self._lock.acquire(blocking=False):
+            return
+        try:
+            if self._refresher is None or not self._refresher.is_alive():
+                self._refresher = threading.Thread(
+                    target=self._background_refresh, args=(current,), name=f'{self.name}-token-refresh', daemon=True)
+                self._refresher.start()
+        finally:
+            self._lock.release()
+
+    def _background_refresh(self, current):
+        try:
+            self._refresh(current)
+        except Exception:
+            # The current token is still valid; callers only block once it expires
+            self._retry_at = time.time() + RETRY_SECONDS
+            logger.exception("Background refresh of the %s access token failed", self.name)
@@ -2,4 +2,9 @@ from .test_views import *
 from .test_cash_service import *
 from .test_gcash_service import *
 from .test_stripe_service import *
-from .test_paypal_service import *
\ No newline at end of file
+from .test_paypal_service import *
+from .test_token_provider import *
+from .test_http_client import *
+from .test_worker import *
+from .test_webhooks import *
+from .test_reconciliation import *
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
+import requests
+import stripe
+from django.test import SimpleTestCase, override_settings
+from payment.services import PaypalService, StripeService
+from payment.services import http_client, stripe_service
+from payment.services.http_client import ProviderClient
+from payment.services.paypal_service import paypal_tokens
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # Keep-alive
+
+    def do_GET(self):
+        self.respond()
+
+    def do_POST(self):
+        self.respond()
+
+    def respond(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        server.requests.append((self.command, self.path, dict(self.headers), body, self.client_address))
+        status, payload, delay = server.responses.pop(0) if server.responses else (200, {}, 0)
+        time.sleep(delay)
+        data = json.dumps(payload).encode()
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client timed out and went away
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeProviderMixin:
+    """Runs a local HTTP server that answers with queued (status, json, delay) responses."""
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeProviderHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.server.responses = []
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}'
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+    def respond_with(self, *responses):
+        self.server.responses.extend(responses)
+
+
+class ProviderClientTest(FakeProviderMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = ProviderClient(pool_size=2, connect_timeout=1, read_timeout=0.2, retries=2, backoff=0.001)
+        self.addCleanup(self.client.close)
+
+    def test_connections_are_kept_alive(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(f'{self.url}/ping').status_code, 200)
+        self.assertEqual(len({request[4] for request in self.server.requests}), 1)
+
+    def test_post_with_request_id_is_retried(self):
+        self.respond_with((503, {}, 0), (502, {}, 0), (201, {'id': 'order-1'}, 0))
+        response = self.client.post(f'{self.url}/v2/checkout/orders', headers={'PayPal-Request-Id': 'req-1'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([request[2]['PayPal-Request-Id'] for request in self.server.requests], ['req-1'] * 3)
+
+    def test_post_without_request_id_is_sent_once(self):
+        self.respond_with((503, {}, 0), (201, {}, 0))
+        response = self.client.post(f'{self.url}/v2/checkout/orders', json={'intent': 'CAPTURE'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_read_timeout(self):
+        self.respond_with((200, {}, 0.5))
+        with self.assertRaises(requests.Timeout):
+            self.client.post(f'{self.url}/slow')
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_idempotent_call_retries_after_timeout_and_gives_up(self):
+        self.respond_with((200, {}, 0.5), (200, {'ok': True}, 0))
+        self.assertEqual(self.client.get(f'{self.url}/slow').json(), {'ok': True})
+
+        self.respond_with(*[(503, {}, 0)] * 3)
+        self.assertEqual(self.client.get(f'{self.url}/down').status_code, 503)
+        self.assertEqual(len(self.server.requests), 2 + 3)
+
+    def test_connection_refused_is_retried_then_raised(self):
+        port = self.server.server_address[1]
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(requests.ConnectionError):
+            self.client.get(f'http://127.0.0.1:{port}/')
+
+    def test_one_client_per_process(self):
+        client = http_client.get_client()
+        self.assertIs(http_client.get_client(), client)
+        http_client._client_pid = -1  # As seen from a forked worker
+        self.assertIsNot(http_client.get_client(), client)
+
+
+class StripeHTTPClientTest(SimpleTestCase):
+    def test_stripe_calls_share_the_pooled_session(self):
+        with override_settings(PAYMENT_HTTP={'connect_timeout': 2, 'read_timeout': 7, 'retries': 1}):
+            http_client._client = stripe_service._http_client_pid = None
+            self.addCleanup(setattr, http_client, '_client', None)
+            self.addCleanup(setattr, stripe_service, '_http_client_pid', None)
+            StripeService()
+        self.assertIs(stripe.default_http_client._session, http_client.get_client().session)
+        self.assertEqual(stripe.default_http_client._timeout, (2, 7))
+        self.assertEqual(stripe.max_network_retries, 1)
+
+
+class PaypalServiceHTTPTest(FakeProviderMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        paypal_tokens.clear()
+        self.addCleanup(paypal_tokens.clear)
+        self.enterContext(override_settings(PAYPAL_BASE_URL=self.url))
+
+    def test_capture_retries_against_fake_provider(self):
+        self.respond_with(
+            (200, {'access_token': 'fake-token', 'token_type': 'Bearer', 'scope': 's', 'app_id': 'a',
+                   'expires_in': 32400, 'nonce': 'n'}, 0),
+            (503, {}, 0),
+            (201, {'status': 'COMPLETED', 'id': 'capture-1'}, 0),
+        )
+        payment = Mock(order_id='order-1', paypal_request_id='req-1')
+        success, capture = PaypalService().process_payment(payment)
+
+        self.assertTrue(success)
+        self.assertEqual(capture['id'], 'capture-1')
+        paths = [request[1] for request in self.server.requests]
+        self.assertEqual(paths, ['/v1/oauth2/token'] + ['/v2/checkout/orders/order-1/capture'] * 2)
+        self.assertEqual(self.server.requests[-1][2]['Authorization'], 'Bearer fake-token')
+
+    def test_revoked_token_is_replaced_and_the_call_repeated_once(self):
+        self.respond_with(
+            (200, {'access_token': 'revoked', 'token_type': 'Bearer', 'scope': 's', 'app_id': 'a',
+                   'expires_in': 32400, 'nonce': 'n'}, 0),
+            (401, {'error': 'invalid_token'}, 0),
+            (200, {'access_token': 'fresh', 'token_type': 'Bearer', 'scope': 's', 'app_id': 'a',
+                   'expires_in': 32400, 'nonce': 'n'}, 0),
+            (201, {'status': 'COMPLETED', 'id': 'capture-1'}, 0),
+        )
+        service = PaypalService()
+        success, _ = service.process_payment(Mock(order_id='order-1', paypal_request_id='req-1'))
+
+        self.assertTrue(success)
+        self.assertEqual([request[2]['Authorization'] for request in self.server.requests[1::2]],
+                         ['Bearer revoked', 'Bearer fresh'])
+        self.assertEqual(paypal_tokens.get()['access_token'], 'fresh')
+
+        self.respond_with((401, {}, 0), (200, {'access_token': 'also-revoked', 'token_type': 'Bearer', 'scope': 's',
+                                               'app_id': 'a', 'expires_in': 32400, 'nonce': 'n'}, 0), (401, {}, 0))
+        self.assertFalse(service.verify_webhook_signature({}, {'id': 'WH-1'}))
+        self.assertEqual(len(self.server.requests), 7)
+
+    def test_confirm_order_is_retried_and_replaces_a_revoked_token(self):
+        self.respond_with(
+            (200, {'access_token': 'revoked', 'token_type': 'Bearer', 'scope': 's', 'app_id': 'a',
+                   'expires_in': 32400, 'nonce': 'n'}, 0),
+            (503, {}, 0),
+            (401, {'error': 'invalid_token'}, 0),
+            (200, {'access_token': 'fresh', 'token_type': 'Bearer', 'scope': 's', 'app_id': 'a',
+                   'expires_in': 32400, 'nonce': 'n'}, 0),
+            (200, {'id': 'order-1', 'status': 'PAYER_ACTION_REQUIRED'}, 0),
+        )
+        self.assertTrue(PaypalService().confirm_order(Mock(order_id='order-1', paypal_request_id='req-1')))
+        confirms = [request[2] for request in self.server.requests if request[1].endswith('/confirm-payment-source')]
+        self.assertEqual([headers['Authorization'] for headers in confirms],
+                         ['Bearer revoked', 'Bearer revoked', 'Bearer fresh'])
+        self.assertEqual({headers['PayPal-Request-Id'] for headers in confirms}, {'req-1'})
@@ -5,6 +5,7 @@ import json
 from decimal import Decimal
 from django.contrib.auth import get_user_model
 from payment.services import PaypalService
+from payment.services.paypal_service import paypal_tokens
 from overdrive.models import Booking
 from payment.models import BookingPayment
 from payment.paypal_payment import PayPalBookingPayment
@@ -53,8 +54,11 @@ class PaypalServiceTestCase(TestCase):
             created_at=timezone.now()
         )
         self.paypal_service = PaypalService()
+        # Tokens are cached across service instances; each test below fetches its own mocked one
+        paypal_tokens.clear()
+        self.addCleanup(paypal_tokens.clear)
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_get_access_token_success(self, mock_post):
         # Mock successful token response
         mock_response = Mock()
@@ -80,7 +84,7 @@ class PaypalServiceTestCase(TestCase):
         self.assertEqual(service.expires_in, 3600)
         self.assertEqual(service.nonce, 'test_nonce')
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_get_access_token_failure(self, mock_post):
         # Mock failed token response
         mock_response = Mock()
@@ -93,7 +97,7 @@ class PaypalServiceTestCase(TestCase):
             PaypalService()
         self.assertIn("Bad Request", str(context.exception))
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_checkout_orders_success(self, mock_post):
         # Mock token response
         with patch.object(PaypalService, '_get_access_token', return_value='test_access_token'):
@@ -116,7 +120,7 @@ class PaypalServiceTestCase(TestCase):
             self.assertEqual(self.payment.transaction_id, 'test-order-id-456')
             mock_post.assert_called_once()
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_checkout_orders_failure(self, mock_post):
         # Mock token response
         with patch.object(PaypalService, '_get_access_token', return_value='test_access_token'):
@@ -135,7 +139,7 @@ class PaypalServiceTestCase(TestCase):
             self.assertIsNone(order_id)
             self.assertIsNone(self.payment.transaction_id)
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_confirm_order(self, mock_post):
         # Mock token response
         with patch.object(PaypalService, '_get_access_token', return_value='test_access_token'):
@@ -153,7 +157,7 @@ class PaypalServiceTestCase(TestCase):
             self.assertTrue(result)
             mock_post.assert_called_once()
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_process_payment_success(self, mock_post):
         # Mock token response
         with patch.object(PaypalService, '_get_access_token', return_value='test_access_token'):
@@ -176,7 +180,7 @@ class PaypalServiceTestCase(TestCase):
             self.assertEqual(capture_data['status'], 'COMPLETED')
             mock_post.assert_called_once()
 
-    @patch('payment.services.paypal_service.requests.post')
+    @patch('payment.services.http_client.ProviderClient.post')
     def test_process_payment_failure(self, mock_post):
         # Mock token response
         with patch.object(PaypalService, '_get_access_token', return_value='test_access_token'):
@@ -0,0 +1,168 @@
+import csv
+import datetime
+import os
+import tempfile
+import time
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from fleet_management.models import Car, Manufacturer, Owner, Vehicle
+from overdrive.models import Booking
+from payment.models import BookingPayment
+from payment.reconciliation import RateLimiter, apply_corrections, reconcilable_payments, reconcile
+from payment.services import PaypalService, StripeService
+from payment.services.paypal_service import paypal_tokens
+from .test_http_client import FakeProviderMixin
+
+User = get_user_model()
+
+
+def settled(status, amount='20.00', provider_status=None):
+    return {'status': status, 'provider_status': provider_status or status, 'amount': Decimal(amount)}
+
+
+class RateLimiterTest(SimpleTestCase):
+    def test_calls_are_spread_to_the_rate(self):
+        limiter = RateLimiter(rate=100, burst=1)
+        began = time.monotonic()
+        for _ in range(11):
+            limiter.acquire()
+        self.assertGreaterEqual(time.monotonic() - began, 0.09)
+
+    def test_burst_is_immediate(self):
+        limiter = RateLimiter(rate=1, burst=5)
+        began = time.monotonic()
+        for _ in range(5):
+            limiter.acquire()
+        self.assertLess(time.monotonic() - began, 0.5)
+
+
+class ReconcileTest(TestCase):
+    def setUp(self):
+        customer = User.objects.create_user(email='payer@reconcile.com', password='12345', is_active=True)
+        owner_user = User.objects.create_user(email='owner@reconcile.com', password='12345', is_active=True)
+        owner = Owner.objects.create(name="Reconcile Owner", user=owner_user)
+        manufacturer = Manufacturer.objects.create(name="Reconcile Make", country="Test Country")
+        car = Car.objects.create(owner=owner, license_plate="REC123", passenger_capacity=5, make=manufacturer,
+                                 model="Test Model", year=2020, price_per_hour=10)
+        start = timezone.now() + datetime.timedelta(days=1)
+        self.booking = Booking.objects.create(user=customer, vehicle=Vehicle.objects.get(id=car.id), total_price=20,
+                                              start_time=start, end_time=start + datetime.timedelta(hours=2))
+        self.provider = {}
+        lookup = patch.object(StripeService, 'lookup_payment', autospec=True,
+                              side_effect=lambda service, transaction_id: self.lookup(transaction_id))
+        lookup.start()
+        self.addCleanup(lookup.stop)
+
+    def lookup(self, transaction_id):
+        found = self.provider.get(transaction_id)
+        if isinstance(found, Exception):
+            raise found
+        return found
+
+    def pay(self, transaction_id, status='pending', method='stripe'):
+        return BookingPayment.objects.create(booking=self.booking, amount=20, method=method,
+                                             transaction_id=transaction_id, status=status)
+
+    def test_discrepancies_are_reported_and_statuses_corrected(self):
+        paid = self.pay('pi_paid', status='requires_payment_method')
+        declined = self.pay('pi_declined')
+        voided = self.pay('pi_voided', status='completed')
+        agrees = self.pay('pi_agrees', status='completed')
+        short = self.pay('pi_short', status='completed')
+        unsettled = self.pay('pi_unsettled', status='completed')
+        missing = self.pay('pi_missing')
+        broken = self.pay('pi_broken')
+        self.provider.update({
+            'pi_paid': settled('completed', provider_status='succeeded'),
+            'pi_declined': settled('failed', provider_status='canceled'),
+            'pi_voided': settled('failed', provider_status='canceled'),
+            'pi_agrees': settled('completed'),
+            'pi_short': settled('completed', amount='15.00'),
+            'pi_unsettled': settled(None, provider_status='requires_payment_method'),
+            'pi_broken': ConnectionError('provider down'),
+        })
+
+        out = StringIO()
+        with self.assertLogs('payment.reconciliation', 'WARNING'):
+            totals = reconcile(reconcilable_payments(), threads=3, chunk_size=2, rates={}, report=csv.writer(out))
+
+        self.assertEqual(totals['checked'], 8)
+        self.assertEqual([totals[kind] for kind in ('status', 'reversed', 'amount', 'unsettled', 'missing', 'error')],
+                         [2, 1, 1, 1, 1, 1])
+        self.assertEqual(totals['corrected'], 2)
+        statuses = dict(BookingPayment.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses[paid.pk], 'completed')
+        self.assertEqual(statuses[declined.pk], 'failed')
+        for payment in (voided, agrees, short, unsettled, missing, broken):
+            self.assertEqual(statuses[payment.pk], payment.status)
+        self.booking.refresh_from_db()
+        self.assertEqual(self.booking.status, 'confirmed')
+
+        rows = {row[0]: row for row in csv.reader(StringIO(out.getvalue()))}
+        self.assertEqual(len(rows), 7)
+        self.assertEqual(rows[str(paid.pk)][3:], ['status', 'requires_payment_method', 'succeeded', '20.00', '20.00',
+                                                 'set completed'])
+        self.assertEqual(rows[str(voided.pk)][3:], ['reversed', 'completed', 'canceled', '20.00', '20.00', ''])
+        self.assertEqual(rows[str(short.pk)][3], 'amount')
+        self.assertEqual(rows[str(missing.pk)][3:], ['missing', 'pending', '', '20.00', '', ''])
+
+    def test_payment_changed_meanwhile_is_not_overwritten(self):
+        payment = self.pay('pi_1')
+        # A webhook failed the payment after the lookup found it completed
+        BookingPayment.objects.filter(pk=payment.pk).update(status='failed')
+        self.assertEqual(apply_corrections({('pending', 'completed'): [payment.pk]}), 0)
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'failed')
+
+    def test_only_open_and_recent_payments_with_a_lookup(self):
+        old = self.pay('pi_old', status='completed')
+        old_open = self.pay('pi_old_open')
+        recent = self.pay('pi_recent', status='completed')
+        self.pay('cash', method='cash')
+        self.pay(None)
+        BookingPayment.objects.filter(pk__in=[old.pk, old_open.pk]).update(
+            updated_at=timezone.now() - datetime.timedelta(days=7))
+        self.assertEqual(list(reconcilable_payments(lookback_hours=48)), [old_open, recent])
+
+    def test_command(self):
+        self.pay('pi_paid')
+        self.provider['pi_paid'] = settled('completed')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.csv')
+            out = StringIO()
+            call_command('reconcile_payments', '--dry-run', '--report', path, stdout=out)
+            with open(path) as report:
+                self.assertEqual(len(list(csv.reader(report))), 2)
+        self.assertIn('Checked 1 payments: 1 status, 0 reversed, 0 amount', out.getvalue())
+        self.assertIn('Corrected 0 payment statuses.', out.getvalue())
+        self.assertEqual(BookingPayment.objects.get().status, 'pending')
+
+        call_command('reconcile_payments', stdout=out)
+        self.assertEqual(BookingPayment.objects.get().status, 'completed')
+
+
+class PaypalLookupTest(FakeProviderMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        paypal_tokens.clear()
+        self.addCleanup(paypal_tokens.clear)
+        self.enterContext(override_settings(PAYPAL_BASE_URL=self.url))
+        self.respond_with((200, {'access_token': 'fake-token', 'token_type': 'Bearer', 'scope': 's', 'app_id': 'a',
+                                 'expires_in': 32400, 'nonce': 'n'}, 0))
+
+    def test_order_lookup(self):
+        self.respond_with(
+            (200, {'id': 'order-1', 'status': 'COMPLETED',
+                   'purchase_units': [{'amount': {'currency_code': 'USD', 'value': '240.00'}}]}, 0),
+            (404, {'name': 'RESOURCE_NOT_FOUND'}, 0),
+        )
+        service = PaypalService()
+        self.assertEqual(service.lookup_payment('order-1'),
+                         {'status': 'completed', 'provider_status': 'COMPLETED', 'amount': Decimal('240.00')})
+        self.assertIsNone(service.lookup_payment('order-2'))
+        self.assertEqual(self.server.requests[1][:2], ('GET', '/v2/checkout/orders/order-1'))
+        self.assertEqual(self.server.requests[1][2]['Authorization'], 'Bearer fake-token')
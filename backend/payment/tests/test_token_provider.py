@@ -0,0 +1,114 @@
+import threading
+from unittest.mock import Mock, patch
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from payment.services import PaypalService
+from payment.services.paypal_service import paypal_tokens
+from payment.services.token_provider import TokenProvider
+
+
+def token_response(token, expires_in=3600):
+    response = Mock()
+    response.status_code = 200
+    response.json.return_value = {
+        'access_token': token, 'token_type': 'Bearer', 'scope': 'test_scope',
+        'app_id': 'test_app_id', 'expires_in': expires_in, 'nonce': 'test_nonce',
+    }
+    return response
+
+
+@override_settings(OAUTH_TOKEN_EXPIRY_MARGIN=60, OAUTH_TOKEN_REFRESH_AHEAD=300)
+class TokenProviderTest(SimpleTestCase):
+    def setUp(self):
+        self.fetch = Mock(side_effect=[{'access_token': f'token-{i}', 'expires_in': 3600} for i in range(1, 10)])
+        self.provider = TokenProvider('test', self.fetch)
+        self.addCleanup(self.provider.clear)
+        self.now = 1000000.0
+        clock = patch('payment.services.token_provider.time.time', side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_token_is_reused_until_refresh_time(self):
+        self.assertEqual(self.provider.get()['access_token'], 'token-1')
+        self.now += 3000
+        self.assertEqual(self.provider.get()['access_token'], 'token-1')
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_other_workers_share_the_cached_token(self):
+        self.provider.get()
+        other_worker = TokenProvider('test', self.fetch)
+        self.assertEqual(other_worker.get()['access_token'], 'token-1')
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_refreshes_in_background_before_expiry(self):
+        self.provider.get()
+        self.now += 3600 - 60 - 200  # Inside the refresh window, still valid
+        self.assertEqual(self.provider.get()['access_token'], 'token-1')
+        self.provider._refresher.join()
+        self.assertEqual(self.provider.get()['access_token'], 'token-2')
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_expired_token_is_fetched_in_the_foreground(self):
+        self.provider.get()
+        self.now += 3600 - 30
+        self.assertEqual(self.provider.get()['access_token'], 'token-2')
+
+    def test_failed_background_refresh_keeps_current_token(self):
+        self.provider.get()
+        self.fetch.side_effect = RuntimeError("token endpoint down")
+        self.now += 3600 - 60 - 200
+        with self.assertLogs('payment.services.token_provider', 'ERROR'):
+            self.assertEqual(self.provider.get()['access_token'], 'token-1')
+            self.provider._refresher.join()
+        self.assertEqual(self.provider.get()['access_token'], 'token-1')
+        self.assertEqual(self.fetch.call_count, 2)  # No new attempt before RETRY_SECONDS
+
+    def test_concurrent_callers_fetch_once(self):
+        barrier = threading.Barrier(8)
+        tokens = []
+
+        def call():
+            barrier.wait()
+            tokens.append(self.provider.get()['access_token'])
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(tokens, ['token-1'] * 8)
+        self.assertEqual(self.fetch.call_count, 1)
+
+    def test_waits_for_the_worker_holding_the_lease(self):
+        cache.add(self.provider.lease_key, True, 30)
+        self.addCleanup(cache.delete, self.provider.lease_key)
+
+        def other_worker_stores_token(seconds):
+            cache.set(self.provider.cache_key, {
+                'access_token': 'from-other-worker', 'expires_at': self.now + 100, 'refresh_at': self.now + 50})
+
+        with patch('payment.services.token_provider.time.sleep', side_effect=other_worker_stores_token):
+            self.assertEqual(self.provider.get()['access_token'], 'from-other-worker')
+        self.fetch.assert_not_called()
+
+    def test_background_refresh_keeps_a_token_another_worker_stored(self):
+        current = self.provider.get()
+        cache.set(self.provider.cache_key, {
+            'access_token': 'from-other-worker', 'expires_at': self.now + 3600, 'refresh_at': self.now + 3000})
+        self.provider._background_refresh(current)
+        self.assertEqual(self.provider._token['access_token'], 'from-other-worker')
+        self.assertEqual(self.fetch.call_count, 1)
+
+
+class PaypalServiceTokenTest(SimpleTestCase):
+    def setUp(self):
+        paypal_tokens.clear()
+        self.addCleanup(paypal_tokens.clear)
+
+    @patch('payment.services.http_client.ProviderClient.post', return_value=token_response('shared_token'))
+    def test_services_share_one_token_request(self, mock_post):
+        services = [PaypalService() for _ in range(3)]
+        mock_post.assert_called_once()
+        self.assertEqual({service.access_token for service in services}, {'shared_token'})
+        self.assertEqual(services[-1].expires_in, 3600)
+        self.assertEqual(services[-1].nonce, 'test_nonce')
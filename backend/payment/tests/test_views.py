@@ -1,4 +1,4 @@
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import get_user_model
@@ -46,11 +46,13 @@ class PaymentViewTestCase(TestCase):
             status='confirmed'
         )
 
+    @override_settings(PAYMENT_ASYNC=False)
+    @patch.object(PaypalService, '_get_access_token', return_value='test_access_token')
     @patch.object(GcashService, 'process_payment')
     @patch.object(PaypalService, 'process_payment')
     @patch.object(StripeService, 'process_payment')
     @patch.object(CashService, 'process_payment')
-    def test_process_payment_with_all_services(self, mock_cash_process, mock_stripe_process, mock_paypal_process, mock_gcash_process):
+    def test_process_payment_with_all_services(self, mock_cash_process, mock_stripe_process, mock_paypal_process, mock_gcash_process, mock_token):
         # Mocking the process_payment methods of all services to return True
         mock_gcash_process.return_value = True
         mock_paypal_process.return_value = True
@@ -76,13 +78,16 @@ class PaymentViewTestCase(TestCase):
                 'stripe': StripeService,
                 'cash': CashService
             }.get(m)):
-                response = self.client.post(f'/api/payment/{self.booking.id}/', {
-                    'amount': '240.00',
-                    'method': method
-                }, format='json')
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = self.client.post(f'/api/payment/{self.booking.id}/', {
+                        'amount': '240.00',
+                        'method': method
+                    }, format='json')
                 
-                self.assertEqual(response.status_code, 200)
-                self.assertEqual(response.data, {"status": "Payment processed successfully"})
+                # Accepted, then charged by the payment worker once the request commits
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(response.data['status'], 'pending')
+                self.assertEqual(BookingPayment.objects.get(pk=response.data['id']).status, 'completed')
 
                 # Check if the mock was called
                 if method == 'gcash':
@@ -108,3 +113,17 @@ class PaymentViewTestCase(TestCase):
         self.assertEqual(response.status_code, 400)
         self.assertIn('method', response.data)  # Check if 'method' is in the error details
         #self.assertEqual(response.data, {"status": "Invalid payment method"})
+
+    @patch.object(CashService, 'process_payment')
+    def test_payment_for_another_users_booking(self, mock_cash_process):
+        other = User.objects.create_user(email='otheruser@payment.com', password='12345')
+        other.is_active = True
+        other.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        response = self.client.post(f'/api/payment/{self.booking.id}/', {
+            'amount': '240.00',
+            'method': 'cash'
+        }, format='json')
+        self.assertEqual(response.status_code, 403)
+        self.assertFalse(BookingPayment.objects.exists())
+        mock_cash_process.assert_not_called()
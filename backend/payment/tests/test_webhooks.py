@@ -0,0 +1,197 @@
+import datetime
+import hashlib
+import hmac
+import json
+import time
+from io import StringIO
+from unittest.mock import patch
+import requests
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from fleet_management.models import Car, Manufacturer, Owner, Vehicle
+from overdrive.models import Booking, BookingStatusLog
+from payment import worker
+from payment.models import BookingPayment, WebhookEvent
+from payment.services import PaypalService, StripeService
+from payment.webhooks import apply_events, purge_events, record_event
+
+User = get_user_model()
+
+WEBHOOK_SECRET = 'whsec_test'
+
+
+def stripe_delivery(event, secret=WEBHOOK_SECRET, timestamp=None):
+    payload = json.dumps(event)
+    timestamp = int(timestamp or time.time())
+    signature = hmac.new(secret.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return payload, f't={timestamp},v1={signature}'
+
+
+def stripe_event(event_id, event_type, intent_id):
+    return {'id': event_id, 'type': event_type, 'data': {'object': {'id': intent_id, 'object': 'payment_intent'}}}
+
+
+def paypal_event(event_id, event_type, capture_id, order_id):
+    return {'id': event_id, 'event_type': event_type,
+            'resource': {'id': capture_id, 'supplementary_data': {'related_ids': {'order_id': order_id}}}}
+
+
+@override_settings(STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+class WebhookViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def post_stripe(self, event, **kwargs):
+        payload, signature = stripe_delivery(event, **kwargs)
+        return self.client.post('/api/payment/webhooks/stripe/', payload, content_type='application/json',
+                                HTTP_STRIPE_SIGNATURE=signature)
+
+    def test_stripe_event_is_stored_once(self):
+        event = stripe_event('evt_1', 'payment_intent.succeeded', 'pi_1')
+        for _ in range(3):
+            response = self.post_stripe(event)
+            self.assertEqual(response.status_code, 200)
+        stored = WebhookEvent.objects.get()
+        self.assertEqual((stored.provider, stored.event_id, stored.event_type), ('stripe', 'evt_1', 'payment_intent.succeeded'))
+        self.assertEqual(stored.payload, event)
+        self.assertIsNone(stored.processed_at)
+
+    def test_stripe_bad_signature_is_rejected(self):
+        event = stripe_event('evt_1', 'payment_intent.succeeded', 'pi_1')
+        self.assertEqual(self.post_stripe(event, secret='whsec_other').status_code, 400)
+        self.assertEqual(self.post_stripe(event, timestamp=time.time() - 3600).status_code, 400)
+        response = self.client.post('/api/payment/webhooks/stripe/', json.dumps(event), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(WebhookEvent.objects.exists())
+
+    @patch.object(PaypalService, '_get_access_token', return_value='token')
+    def test_paypal_event_is_verified_with_paypal(self, _):
+        event = paypal_event('WH-1', 'PAYMENT.CAPTURE.COMPLETED', 'capture-1', 'order-1')
+        with patch.object(PaypalService, 'verify_webhook_signature', return_value=True) as verify:
+            response = self.client.post('/api/payment/webhooks/paypal/', json.dumps(event), content_type='application/json',
+                                        HTTP_PAYPAL_TRANSMISSION_ID='t-1')
+        self.assertEqual(response.status_code, 200)
+        headers, verified_event = verify.call_args.args
+        self.assertEqual(headers['Paypal-Transmission-Id'], 't-1')
+        self.assertEqual(verified_event, event)
+        self.assertEqual(WebhookEvent.objects.get().event_id, 'WH-1')
+
+        with patch.object(PaypalService, 'verify_webhook_signature', return_value=False):
+            event['id'] = 'WH-2'
+            response = self.client.post('/api/payment/webhooks/paypal/', json.dumps(event), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        with patch.object(PaypalService, 'verify_webhook_signature', side_effect=requests.ConnectionError), \
+                self.assertLogs('payment.views', 'ERROR'):
+            response = self.client.post('/api/payment/webhooks/paypal/', json.dumps(event), content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+
+class ApplyWebhookEventsTest(TestCase):
+    def setUp(self):
+        self.customer = User.objects.create_user(email='payer@webhooks.com', password='12345', is_active=True)
+        owner_user = User.objects.create_user(email='owner@webhooks.com', password='12345', is_active=True)
+        owner = Owner.objects.create(name="Webhook Owner", user=owner_user)
+        manufacturer = Manufacturer.objects.create(name="Webhook Make", country="Test Country")
+        car = Car.objects.create(owner=owner, license_plate="WHK123", passenger_capacity=5, make=manufacturer,
+                                 model="Test Model", year=2020, price_per_hour=10)
+        self.vehicle = Vehicle.objects.get(id=car.id)
+        self.start = timezone.now() + datetime.timedelta(days=1)
+
+    def book(self, status='requested', hours=(0, 2)):
+        return Booking.objects.create(user=self.customer, vehicle=self.vehicle, status=status, total_price=20,
+                                      start_time=self.start + datetime.timedelta(hours=hours[0]),
+                                      end_time=self.start + datetime.timedelta(hours=hours[1]))
+
+    def pay(self, booking, method, transaction_id, status='pending'):
+        return BookingPayment.objects.create(booking=booking, amount=20, method=method, transaction_id=transaction_id,
+                                             status=status)
+
+    def record(self, provider, event):
+        record_event(provider, event['id'], event.get('type') or event['event_type'], event)
+
+    def test_stripe_success_completes_payment_and_confirms_booking(self):
+        booking = self.book()
+        payment = self.pay(booking, 'stripe', 'pi_1', status='requires_payment_method')
+        self.record('stripe', stripe_event('evt_1', 'payment_intent.succeeded', 'pi_1'))
+
+        self.assertEqual(apply_events(), 1)
+        payment.refresh_from_db()
+        booking.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+        self.assertEqual(booking.status, 'confirmed')
+        log = BookingStatusLog.objects.get(booking=booking)
+        self.assertEqual((log.status, log.user), ('confirmed', None))
+        event = WebhookEvent.objects.get()
+        self.assertIsNotNone(event.processed_at)
+        self.assertEqual(event.error, '')
+        self.assertEqual(apply_events(), 0)
+
+    def test_completed_payment_is_not_failed_by_a_later_event(self):
+        payment = self.pay(self.book(), 'stripe', 'pi_1')
+        self.record('stripe', stripe_event('evt_1', 'payment_intent.succeeded', 'pi_1'))
+        self.record('stripe', stripe_event('evt_2', 'payment_intent.payment_failed', 'pi_1'))
+        apply_events(batch_size=1)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'completed')
+
+    def test_paypal_capture_matches_order_id(self):
+        paid = self.pay(self.book(), 'paypal', 'order-1')
+        denied = self.pay(self.book(hours=(3, 4)), 'paypal', 'order-2')
+        self.record('paypal', paypal_event('WH-1', 'PAYMENT.CAPTURE.COMPLETED', 'capture-1', 'order-1'))
+        self.record('paypal', paypal_event('WH-2', 'PAYMENT.CAPTURE.DENIED', 'capture-2', 'order-2'))
+        self.assertEqual(apply_events(), 2)
+        self.assertEqual(BookingPayment.objects.get(pk=paid.pk).status, 'completed')
+        self.assertEqual(BookingPayment.objects.get(pk=denied.pk).status, 'failed')
+        self.assertEqual(Booking.objects.get(pk=denied.booking_id).status, 'requested')
+
+    def test_unmatched_and_ignored_events(self):
+        self.record('stripe', stripe_event('evt_1', 'payment_intent.succeeded', 'pi_unknown'))
+        self.record('stripe', stripe_event('evt_2', 'payment_intent.created', 'pi_unknown'))
+        self.record('stripe', {'id': 'evt_3', 'type': 'payment_intent.succeeded', 'data': {}})
+        self.assertEqual(apply_events(), 3)
+        errors = dict(WebhookEvent.objects.values_list('event_id', 'error'))
+        self.assertIn('pi_unknown', errors['evt_1'])
+        self.assertEqual(errors['evt_2'], '')
+        self.assertTrue(errors['evt_3'])
+        self.assertFalse(WebhookEvent.objects.filter(processed_at__isnull=True).exists())
+
+    def test_paid_booking_overlapping_an_active_one_stays_requested(self):
+        booking = self.book()
+        self.book(status='confirmed', hours=(1, 3))
+        payment = self.pay(booking, 'stripe', 'pi_1')
+        self.record('stripe', stripe_event('evt_1', 'payment_intent.succeeded', 'pi_1'))
+        with self.assertLogs('payment.webhooks', 'WARNING'):
+            apply_events()
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'completed')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'requested')
+
+    def test_command_applies_and_purges(self):
+        payment = self.pay(self.book(), 'stripe', 'pi_1')
+        self.record('stripe', stripe_event('evt_old', 'payment_intent.created', 'pi_0'))
+        WebhookEvent.objects.update(processed_at=timezone.now() - datetime.timedelta(days=60))
+        self.record('stripe', stripe_event('evt_1', 'payment_intent.succeeded', 'pi_1'))
+
+        out = StringIO()
+        call_command('apply_webhook_events', stdout=out)
+        self.assertIn('Applied 1 webhook events, purged 1 old ones.', out.getvalue())
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'completed')
+        self.assertEqual(list(WebhookEvent.objects.values_list('event_id', flat=True)), ['evt_1'])
+        self.assertEqual(purge_events(), 0)
+
+    def test_worker_leaves_stripe_intent_for_its_webhook(self):
+        payment = self.pay(self.book(), 'stripe', None)
+
+        def create_intent(service, payment):
+            payment.transaction_id = 'pi_1'
+            payment.status = 'requires_payment_method'
+            payment.save()
+            return True
+
+        with patch.object(StripeService, 'process_payment', autospec=True, side_effect=create_intent):
+            worker.run_payment(payment.id)
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'requires_payment_method')
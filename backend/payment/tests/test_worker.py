@@ -0,0 +1,171 @@
+import datetime
+from io import StringIO
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from fleet_management.models import Car, Manufacturer, Owner, Vehicle
+from overdrive.models import Booking
+from payment import worker
+from payment.models import BookingPayment
+from payment.services import CashService, PaypalService
+
+User = get_user_model()
+
+
+class PaymentFixtureMixin:
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='payer@worker.com', password='12345', is_active=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.user).access_token}')
+        owner_user = User.objects.create_user(email='owner@worker.com', password='12345', is_active=True)
+        owner = Owner.objects.create(name="Worker Owner", user=owner_user)
+        manufacturer = Manufacturer.objects.create(name="Worker Make", country="Test Country")
+        car = Car.objects.create(owner=owner, license_plate="WRK123", passenger_capacity=5, make=manufacturer,
+                                 model="Test Model", year=2020, price_per_hour=10)
+        self.booking = Booking.objects.create(user=self.user, vehicle=Vehicle.objects.get(id=car.id),
+                                              start_time="2023-10-01T12:00:00Z", end_time="2023-10-02T12:00:00Z",
+                                              total_price=240, status='confirmed')
+
+    def pay(self, method='cash'):
+        return self.client.post(f'/api/payment/{self.booking.id}/', {'amount': '240.00', 'method': method},
+                                format='json')
+
+
+@override_settings(PAYMENT_ASYNC=False)
+class PaymentWorkerTest(PaymentFixtureMixin, TestCase):
+    def test_payment_is_accepted_then_charged_after_commit(self):
+        with patch.object(CashService, 'process_payment', return_value=True) as process_payment:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.pay()
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.data['status'], 'pending')
+            self.assertEqual(response['Location'], response.data['status_url'])
+            self.assertTrue(response.data['status_url'].endswith(f"/api/payment/{response.data['id']}/status/"))
+            process_payment.assert_not_called()
+
+            for callback in callbacks:
+                callback()
+        process_payment.assert_called_once()
+        status_response = self.client.get(f"/api/payment/{response.data['id']}/status/")
+        self.assertEqual(status_response.status_code, 200)
+        self.assertEqual(status_response.data['status'], 'completed')
+
+    def test_invalid_method_is_rejected_without_a_payment(self):
+        with patch('payment.views.get_payment_service', return_value=None):
+            response = self.pay()
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(BookingPayment.objects.exists())
+
+    def test_outcome_does_not_overwrite_a_status_set_meanwhile(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+
+        def settled_by_webhook(payment):
+            BookingPayment.objects.filter(pk=payment.pk).update(status='completed')
+            raise RuntimeError('provider timed out')
+
+        with patch.object(CashService, 'process_payment', side_effect=settled_by_webhook), \
+                self.assertLogs('payment.worker', 'ERROR'):
+            worker.run_payment(payment.id)
+        self.assertEqual(BookingPayment.objects.get(pk=payment.pk).status, 'completed')
+
+    def test_fake_method_is_off_by_default(self):
+        response = self.pay(method='fake')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('method', response.data)
+        self.assertFalse(BookingPayment.objects.exists())
+
+    def test_provider_error_fails_the_payment(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+        with patch.object(CashService, 'process_payment', side_effect=RuntimeError('gateway down')), \
+                self.assertLogs('payment.worker', 'ERROR'):
+            worker.run_payment(payment.id)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+
+    def test_paypal_tuple_result(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='paypal')
+        with patch.object(PaypalService, '_get_access_token', return_value='token'), \
+                patch.object(PaypalService, 'process_payment', return_value=(False, None)):
+            worker.run_payment(payment.id)
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'failed')
+
+    def test_claimed_payment_is_not_charged_again(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash', status='processing')
+        with patch.object(CashService, 'process_payment') as process_payment:
+            worker.run_payment(payment.id)
+        process_payment.assert_not_called()
+
+    def test_status_wakes_when_payment_finishes(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+
+        def finish(timeout):
+            # Stands in for a pool thread finishing the payment while the request waits
+            with patch.object(CashService, 'process_payment', return_value=True):
+                worker.run_payment(payment.id)
+
+        with patch.object(worker._finished, 'wait', side_effect=finish) as wait:
+            response = self.client.get(f'/api/payment/{payment.id}/status/?wait=10')
+        self.assertEqual(response.data['status'], 'completed')
+        self.assertEqual(wait.call_count, 1)
+
+    @override_settings(PAYMENT_STATUS_MAX_WAIT=0.1)
+    def test_wait_is_capped(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+        response = self.client.get(f'/api/payment/{payment.id}/status/?wait=3600')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'pending')
+
+    def test_status_errors(self):
+        payment = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+        self.assertEqual(self.client.get(f'/api/payment/{payment.id}/status/?wait=soon').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/payment/{payment.id + 1}/status/').status_code, 404)
+
+        other = User.objects.create_user(email='other@worker.com', password='12345', is_active=True)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        self.assertEqual(self.client.get(f'/api/payment/{payment.id}/status/').status_code, 403)
+
+
+@override_settings(PAYMENT_ASYNC=True, PAYMENT_WORKER_THREADS=2)
+class PaymentWorkerPoolTest(PaymentFixtureMixin, TransactionTestCase):
+    def test_pool_charges_payment_and_long_poll_returns_it(self):
+        with patch.object(CashService, 'process_payment', return_value=True):
+            response = self.pay()
+            self.assertEqual(response.status_code, 202)
+            status_response = self.client.get(f"{response.data['status_url']}?wait=5")
+        self.assertEqual(status_response.data['status'], 'completed')
+
+    def test_one_pool_per_process(self):
+        pool = worker.get_pool()
+        self.assertIs(worker.get_pool(), pool)
+        worker._pool_pid = -1  # As seen from a forked worker
+        self.assertIsNot(worker.get_pool(), pool)
+
+    def test_process_pending_payments(self):
+        stale = timezone.now() - datetime.timedelta(minutes=10)
+        left = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+        stuck = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash', status='processing')
+        recent = BookingPayment.objects.create(booking=self.booking, amount=240, method='cash')
+        BookingPayment.objects.filter(pk__in=[left.pk, stuck.pk]).update(updated_at=stale)
+
+        out = StringIO()
+        with patch.object(CashService, 'process_payment', return_value=True):
+            call_command('process_pending_payments', '--threads', '1', stdout=out)
+        self.assertEqual(BookingPayment.objects.get(pk=left.pk).status, 'completed')
+        self.assertEqual(BookingPayment.objects.get(pk=stuck.pk).status, 'processing')
+        self.assertEqual(BookingPayment.objects.get(pk=recent.pk).status, 'pending')
+        self.assertIn('Ran 1 pending payments', out.getvalue())
+        self.assertIn('1 payments have been processing', out.getvalue())
+
+    @override_settings(DEBUG=True, ALLOWED_HOSTS=['192.168.1.11', 'testserver'])
+    def test_load_test_offers_the_fake_method_for_its_run(self):
+        out = StringIO()
+        call_command('load_test_payments', '--payments', '4', '--web-workers', '2', '--latency', '0', stdout=out)
+        self.assertIn('4 of 4 accepted payments completed.', out.getvalue())
+        self.assertFalse(BookingPayment.objects.filter(method='fake').exists())
+        self.assertFalse(Vehicle.objects.filter(name='Load test').exists())
+        self.assertEqual(self.pay(method='fake').status_code, 400)
@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import ProcessPaymentView
+from .views import ProcessPaymentView, PaymentStatusView, PayPalWebhookView, StripeWebhookView
 
 urlpatterns = [
     path('api/payment/<int:booking_id>/', ProcessPaymentView.as_view(), name='process_payment'),
+    path('api/payment/<int:payment_id>/status/', PaymentStatusView.as_view(), name='payment-status'),
+    path('api/payment/webhooks/stripe/', StripeWebhookView.as_view(), name='stripe-webhook'),
+    path('api/payment/webhooks/paypal/', PayPalWebhookView.as_view(), name='paypal-webhook'),
 ]
@@ -1,38 +1,124 @@
+import logging
+import requests
+from django.conf import settings
+from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.authentication import JWTAuthentication
+from car_rental.principal import get_principal
+from overdrive.idempotency import idempotent
 from .models import BookingPayment
 from .serializers import BookingPaymentSerializer
 from .services import get_payment_service
+from .webhooks import InvalidWebhook, parse_paypal_event, parse_stripe_event, record_event
+from .worker import enqueue_payment, wait_for_payment
+
+logger = logging.getLogger(__name__)
 
 class ProcessPaymentView(APIView):
     authentication_classes = [JWTAuthentication]
     permission_classes = [IsAuthenticated]
 
+    @idempotent('payment')
     def post(self, request, booking_id):
         payment_data = request.data
         payment_data['booking'] = booking_id  # Set the booking ID
 
         payment_serializer = BookingPaymentSerializer(data=payment_data)
         if payment_serializer.is_valid():
-            payment = payment_serializer.save()
-
-            # Get the appropriate payment service based on method
-            service = get_payment_service(payment.method)
-            if service:
-                # Here, make sure to instantiate the service if it's not already an instance
-                service_instance = service()
-                success = service_instance.process_payment(payment)
-                if success:
-                    payment.status = 'completed'
-                    payment.save()
-                    return Response({"status": "Payment processed successfully"}, status=status.HTTP_200_OK)
-                else:
-                    payment.status = 'failed'
-                    payment.save()
-                    return Response({"status": "Payment failed"}, status=status.HTTP_400_BAD_REQUEST)
-            else:
+            # The serializer has loaded the booking; only its customer or staff may pay for it
+            principal = get_principal(request)
+            booking = payment_serializer.validated_data['booking']
+            if booking.user_id != principal.id and not principal.is_staff_member:
+                return Response({"status": "You can only pay for your own bookings"}, status=status.HTTP_403_FORBIDDEN)
+            if get_payment_service(payment_serializer.validated_data['method']) is None:
                 return Response({"status": "Invalid payment method"}, status=status.HTTP_400_BAD_REQUEST)
+
+            # The provider round trip happens on the payment worker pool, not in this request
+            payment = payment_serializer.save(status='pending')
+            enqueue_payment(payment.id)
+            status_url = request.build_absolute_uri(reverse('payment-status', args=[payment.id]))
+            response = Response({"id": payment.id, "status": payment.status, "status_url": status_url},
+                                status=status.HTTP_202_ACCEPTED)
+            response['Location'] = status_url
+            return response
         return Response(payment_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class PaymentStatusView(APIView):
+    """
+    A payment's status; with ?wait=<seconds> the request long-polls until it is completed or failed.
+
+    Waiting is capped at PAYMENT_STATUS_MAX_WAIT so clients re-poll rather than
+    holding a web worker indefinitely.
+    """
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, payment_id):
+        try:
+            wait = float(request.query_params.get('wait', 0))
+        except ValueError:
+            return Response({"wait": "Must be a number of seconds."}, status=status.HTTP_400_BAD_REQUEST)
+        wait = min(max(wait, 0), getattr(settings, 'PAYMENT_STATUS_MAX_WAIT', 25))
+
+        payment = BookingPayment.objects.filter(pk=payment_id).select_related('booking').first()
+        if payment is None:
+            return Response({"detail": "Payment not found."}, status=status.HTTP_404_NOT_FOUND)
+        principal = get_principal(request)
+        if payment.booking.user_id != principal.id and not principal.is_staff_member:
+            return Response({"detail": "You can only view your own payments"}, status=status.HTTP_403_FORBIDDEN)
+
+        if wait:
+            payment = wait_for_payment(payment_id, wait) or payment
+        return Response(BookingPaymentSerializer(payment).data)
+
+
+class WebhookView(APIView):
+    """
+    Receive a provider's webhook: verify it, append it to the inbox and answer 200.
+
+    Nothing is applied here; apply_webhook_events does that in batches, so a
+    burst of deliveries or retries costs one INSERT each. Redelivered events
+    are answered 200 as well, and invalid ones 400 so the provider does not
+    keep retrying them.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    provider = None
+
+    def parse(self, request):
+        raise NotImplementedError
+
+    def post(self, request):
+        try:
+            event_id, event_type, payload = self.parse(request)
+        except InvalidWebhook as e:
+            logger.warning("Rejected %s webhook: %s", self.provider, e)
+            return Response({"detail": "Invalid webhook."}, status=status.HTTP_400_BAD_REQUEST)
+        record_event(self.provider, event_id, event_type, payload)
+        return Response({"received": True}, status=status.HTTP_200_OK)
+
+
+class StripeWebhookView(WebhookView):
+    provider = 'stripe'
+
+    def parse(self, request):
+        return parse_stripe_event(request.body, request.headers.get('Stripe-Signature'))
+
+
+class PayPalWebhookView(WebhookView):
+    provider = 'paypal'
+
+    def parse(self, request):
+        return parse_paypal_event(request.body, request.headers)
+
+    def post(self, request):
+        try:
+            return super().post(request)
+        except requests.RequestException:
+            # Verification needs PayPal's API; a 503 makes PayPal deliver the event again later
+            logger.exception("Could not verify a PayPal webhook")
+            return Response({"detail": "Try again later."}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,178 @@
+import json
+import logging
+from datetime import timedelta
+import stripe
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from overdrive.locks import vehicle_locks
+from overdrive.models import Booking
+from overdrive.states import SYSTEM, check_transition
+from overdrive.utils import BookingStatusConflict, update_booking_status
+from .models import BookingPayment, WebhookEvent
+from .services import PaypalService
+
+logger = logging.getLogger(__name__)
+
+# Per provider, the event types that settle a payment and the status they settle it on.
+# Other event types are stored and marked processed without effect.
+OUTCOMES = {
+    'stripe': {
+        'payment_intent.succeeded': 'completed',
+        'payment_intent.payment_failed': 'failed',
+        'payment_intent.canceled': 'failed',
+    },
+    'paypal': {
+        'PAYMENT.CAPTURE.COMPLETED': 'completed',
+        'PAYMENT.CAPTURE.DENIED': 'failed',
+        'PAYMENT.CAPTURE.DECLINED': 'failed',
+    },
+}
+PAID_BOOKING_STATUS = 'confirmed'
+
+
+class InvalidWebhook(Exception):
+    """A delivery whose signature or payload does not check out."""
+
+
+def parse_stripe_event(body, signature):
+    """The event in a Stripe delivery, once its Stripe-Signature header matches STRIPE_WEBHOOK_SECRET."""
+    if not settings.STRIPE_WEBHOOK_SECRET:
+        raise InvalidWebhook("STRIPE_WEBHOOK_SECRET is not set.")
+    try:
+        payload = body.decode('utf-8')
+        stripe.WebhookSignature.verify_header(payload, signature, settings.STRIPE_WEBHOOK_SECRET,
+                                              tolerance=getattr(settings, 'WEBHOOK_TOLERANCE', 300))
+        event = json.loads(payload)
+    except (stripe.SignatureVerificationError, ValueError) as e:
+        raise InvalidWebhook(str(e))
+    if not isinstance(event, dict) or not event.get('id') or not event.get('type'):
+        raise InvalidWebhook("Not a Stripe event.")
+    return event['id'], event['type'], event
+
+
+def parse_paypal_event(body, headers):
+    """
+    The event in a PayPal delivery, once PayPal has verified its transmission signature.
+
+    PayPal offers no shared-secret signature, so this costs one call to its
+    verification API; the access token and connection are the pooled ones.
+    """
+    try:
+        event = json.loads(body)
+    except ValueError as e:
+        raise InvalidWebhook(str(e))
+    if not isinstance(event, dict) or not event.get('id') or not event.get('event_type'):
+        raise InvalidWebhook("Not a PayPal event.")
+    if not PaypalService().verify_webhook_signature(headers, event):
+        raise InvalidWebhook("PayPal did not verify the signature.")
+    return event['id'], event['event_type'], event
+
+
+def record_event(provider, event_id, event_type, payload):
+    """Append an event to the inbox: one INSERT, ignored when the event was delivered before."""
+    WebhookEvent.objects.bulk_create(
+        [WebhookEvent(provider=provider, event_id=event_id, event_type=event_type, payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def event_references(provider, payload):
+    """The transaction ids the payment an event is about may be stored under."""
+    if provider == 'stripe':
+        return [payload['data']['object']['id']]  # The PaymentIntent, as StripeService stores it
+    resource = payload['resource']
+    order_id = resource.get('supplementary_data', {}).get('related_ids', {}).get('order_id')
+    # PaypalService.checkout_orders stores the order id; the capture's own id is tried as well
+    return [reference for reference in (order_id, resource.get('id')) if reference]
+
+
+def apply_events(batch_size=500):
+    """
+    Apply unprocessed webhook events in batches and return how many were processed.
+
+    A batch is claimed with SELECT ... FOR UPDATE SKIP LOCKED where the
+    database supports it, so several consumers can share the inbox. Its
+    payments are read with one query and written with one bulk UPDATE. A
+    completed payment is never moved back to failed, so redeliveries and
+    events arriving out of order settle it the same way; its booking stays
+    as it is. Nightly reconciliation keeps the same rule and reports such a
+    payment instead. Events that match no payment are marked processed with
+    an error for someone to look at.
+    """
+    processed = 0
+    while True:
+        with transaction.atomic():
+            events = list(WebhookEvent.objects.select_for_update(skip_locked=True).filter(
+                processed_at__isnull=True).order_by('id')[:batch_size])
+            if not events:
+                break
+            _apply_batch(events)
+        processed += len(events)
+    return processed
+
+
+def _apply_batch(events):
+    now = timezone.now()
+    settling = []
+    references = set()
+    for event in events:
+        outcome = OUTCOMES[event.provider].get(event.event_type)
+        if outcome is None:
+            continue
+        try:
+            event_refs = event_references(event.provider, event.payload)
+        except (KeyError, TypeError, AttributeError):
+            event.error = "The payload has no payment reference."
+            continue
+        settling.append((event, outcome, event_refs))
+        references.update(event_refs)
+
+    payments = {}
+    for payment in BookingPayment.objects.filter(transaction_id__in=references, method__in=list(OUTCOMES)):
+        payments[payment.method, payment.transaction_id] = payment
+
+    changed = {}
+    for event, outcome, event_refs in settling:
+        payment = next((payments[key] for key in ((event.provider, ref) for ref in event_refs) if key in payments), None)
+        if payment is None:
+            event.error = f"No {event.provider} payment with transaction id {', '.join(event_refs)}."
+        elif payment.status != outcome and payment.status != 'completed':
+            payment.status = outcome
+            payment.updated_at = now
+            changed[payment.pk] = payment
+    BookingPayment.objects.bulk_update(changed.values(), ['status', 'updated_at'])
+
+    confirm_paid_bookings({payment.booking_id for payment in changed.values() if payment.status == 'completed'})
+
+    for event in events:
+        event.processed_at = now
+    WebhookEvent.objects.bulk_update(events, ['processed_at', 'error'])
+
+
+def confirm_paid_bookings(booking_ids):
+    """
+    Confirm requested bookings whose online payment completed, as the system actor.
+
+    Their vehicles are locked together; a booking that now overlaps an active
+    one stays requested for its owner to resolve.
+    """
+    bookings = list(Booking.objects.select_related('vehicle').filter(pk__in=booking_ids, status='requested'))
+    if not bookings:
+        return
+    with vehicle_locks({booking.vehicle_id for booking in bookings}):
+        for booking in bookings:
+            try:
+                check_transition(booking, PAID_BOOKING_STATUS, {SYSTEM})
+                update_booking_status(booking, PAID_BOOKING_STATUS)
+            except (ValidationError, PermissionDenied, BookingStatusConflict) as e:
+                logger.warning("Paid booking %s was left %s: %s", booking.pk, booking.status, e.detail)
+
+
+def purge_events(now=None):
+    """Delete events processed more than WEBHOOK_EVENT_RETENTION seconds ago and return how many."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(seconds=getattr(settings, 'WEBHOOK_EVENT_RETENTION', 30 * 86400))
+    deleted, _ = WebhookEvent.objects.filter(processed_at__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,103 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+from .models import BookingPayment
+from .services import get_payment_service
+
+logger = logging.getLogger(__name__)
+
+# pending -> processing -> completed | failed
+FINAL_STATUSES = ('completed', 'failed')
+POLL_INTERVAL = 1.0  # Seconds between database checks while long-polling for another process's worker
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+_finished = threading.Condition()
+_finished_count = 0  # Lets a waiter tell whether a payment finished since it last looked
+
+
+def get_pool():
+    """The process's payment thread pool; forked workers start their own."""
+    global _pool, _pool_pid
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool = ThreadPoolExecutor(max_workers=getattr(settings, 'PAYMENT_WORKER_THREADS', 8),
+                                           thread_name_prefix='payment')
+                _pool_pid = os.getpid()
+    return _pool
+
+
+def enqueue_payment(payment_id):
+    """
+    Run a pending payment once the current transaction commits.
+
+    With PAYMENT_ASYNC it goes to the worker pool and the request returns at
+    once; otherwise it runs in the committing thread, which tests and the
+    load test's baseline rely on. Payments left pending by a process that
+    died are picked up by the process_pending_payments command.
+    """
+    if getattr(settings, 'PAYMENT_ASYNC', True):
+        transaction.on_commit(lambda: get_pool().submit(run_in_worker, payment_id))
+    else:
+        transaction.on_commit(lambda: run_payment(payment_id))
+
+
+def run_in_worker(payment_id):
+    try:
+        run_payment(payment_id)
+    finally:
+        # Pool threads outlive requests, so nothing else closes their connections
+        connections.close_all()
+
+
+def run_payment(payment_id):
+    """Claim a pending payment, charge it through its provider and record the outcome."""
+    global _finished_count
+    if not BookingPayment.objects.filter(pk=payment_id, status='pending').update(
+            status='processing', updated_at=timezone.now()):
+        return  # Another worker claimed it
+    payment = BookingPayment.objects.get(pk=payment_id)
+    service = get_payment_service(payment.method)
+    try:
+        result = service().process_payment(payment) if service else False
+    except Exception:
+        logger.exception("Payment %s failed in its provider", payment_id)
+        result = False
+    # PaypalService returns (success, capture data)
+    success = result[0] if isinstance(result, tuple) else result
+    # Only a payment still processing takes the outcome: a webhook or reconciliation may have settled it
+    # meanwhile, and a provider that left its own status, e.g. a Stripe intent awaiting the customer,
+    # leaves the payment to its webhook (payment.webhooks)
+    BookingPayment.objects.filter(pk=payment_id, status='processing').update(
+        status='completed' if success else 'failed', transaction_id=payment.transaction_id,
+        updated_at=timezone.now())
+    with _finished:
+        _finished_count += 1
+        _finished.notify_all()
+
+
+def wait_for_payment(payment_id, timeout):
+    """
+    The payment once it is completed or failed, or as it is after timeout seconds.
+
+    Waiters wake as soon as a worker in this process finishes a payment, and
+    check the database every POLL_INTERVAL for workers in other processes.
+    Returns None if the payment does not exist.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        seen = _finished_count
+        payment = BookingPayment.objects.filter(pk=payment_id).select_related('booking').first()
+        remaining = deadline - time.monotonic()
+        if payment is None or payment.status in FINAL_STATUSES or remaining <= 0:
+            return payment
+        with _finished:
+            if _finished_count == seen:
+                _finished.wait(min(remaining, POLL_INTERVAL))